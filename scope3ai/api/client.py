@@ -1,19 +1,82 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import threading
+import weakref
+from concurrent import futures
+from functools import partial
 from os import getenv
-from typing import Optional, TypeVar
+from time import monotonic, sleep
+from typing import Any, Callable, List, Optional, TypeVar, Union
 
 import httpx
 from pydantic import BaseModel
 
 from .commandsgen import ClientCommands
+from .concurrency import AdaptiveConcurrencyLimit
+from .compression import encode_json_body, resolve_encoding
 from .defaults import DEFAULT_API_URL
+from .endpoints import EndpointPool
+from .hedging import HedgingPolicy
+from .ratelimit import RateLimiter
+from .retry import CircuitBreaker, RetryPolicy, is_transient_error
 
 ClientType = TypeVar("ClientType", httpx.Client, httpx.AsyncClient)
 
+logger = logging.getLogger("scope3ai.api.client")
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
 
 class Scope3AIError(Exception):
     pass
 
 
+class CircuitOpenError(Scope3AIError):
+    """
+    Raised when a request is rejected because the circuit breaker is open.
+    """
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            f"The Scope3AI API is unhealthy, retry in {retry_after:.1f} seconds"
+        )
+        self.retry_after = retry_after
+
+
+def idempotency_key(json: Optional[dict]) -> Optional[str]:
+    """
+    Return the idempotency key of a request body with impact rows, derived
+    from their `request_id` so the retries and the replays of a batch share
+    the same key. None if a row has no `request_id`.
+    """
+    rows = json.get("rows") if isinstance(json, dict) else None
+    if not rows:
+        return None
+    request_ids = [row.get("request_id") for row in rows]
+    if not all(request_ids):
+        return None
+    return hashlib.sha256(",".join(request_ids).encode("utf-8")).hexdigest()
+
+
+def _run_in_thread(call: Callable[[], Any]) -> futures.Future:
+    # run a hedged request in a daemon thread, an executor would keep the
+    # interpreter waiting at exit for a request that is not needed anymore
+    future = futures.Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(call())
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name="scope3ai.Client.hedging", daemon=True).start()
+    return future
+
+
 class ClientBase:
     """
     Base client class for communicating with the Scope3AI HTTP API.
@@ -24,15 +87,70 @@ class ClientBase:
     Attributes:
         api_key (Optional[str]): API key for authentication, can be passed in or read from env var
         api_url (Optional[str]): URL for the API, defaults to production endpoint
+        retry_policy (Optional[RetryPolicy]): Policy to retry transient failures,
+            no retry if not set
+        circuit_breaker (Optional[CircuitBreaker]): Circuit breaker rejecting the
+            requests while the API is unhealthy, can be shared between clients
+        compression (Optional[str]): Content encoding of the request bodies,
+            "gzip" or "zstd" (if `zstandard` is installed), no compression if not set
+        compression_threshold (int): Minimum size in bytes of a request body
+            to be compressed
+        http2 (bool): Use HTTP/2 if the server supports it, requires the `h2` package
+        limits (Optional[httpx.Limits]): Connection pool limits
+        timeout (Optional[httpx.Timeout]): Connect, read, write and pool timeouts
+        transport (Optional[httpx.BaseTransport | httpx.AsyncBaseTransport]): Custom
+            httpx transport, matching the synchronous or asynchronous client
+        rate_limiter (Optional[RateLimiter]): Rate limiter delaying the requests,
+            can be shared between clients
+        concurrency_limit (Optional[AdaptiveConcurrencyLimit]): Adaptive limit fed
+            with the latency of every request, can be shared between clients
+        hedging (Optional[HedgingPolicy]): Policy of the hedged impact requests,
+            fed with the latency of every request, can be shared between clients
+        endpoints (Optional[EndpointPool]): Endpoints of the API the requests
+            are sent to, failing over between them, instead of `api_url`. Can
+            be shared between clients
     """
 
     def __init__(
         self,
         api_key: Optional[str] = None,
         api_url: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        compression: Optional[str] = None,
+        compression_threshold: int = 1024,
+        http2: bool = False,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        transport: Optional[
+            Union[httpx.BaseTransport, httpx.AsyncBaseTransport]
+        ] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency_limit: Optional[AdaptiveConcurrencyLimit] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        endpoints: Optional[EndpointPool] = None,
     ) -> None:
         self.api_key = api_key or getenv("SCOPE3AI_API_KEY")
+        if endpoints is not None:
+            api_url = endpoints.endpoints[0].url
         self.api_url = api_url or getenv("SCOPE3AI_API_URL") or DEFAULT_API_URL
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.compression = resolve_encoding(compression)
+        self.compression_threshold = compression_threshold
+        self.http2 = http2
+        self.limits = limits
+        self.timeout = timeout
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+        self.concurrency_limit = concurrency_limit
+        self.hedging = hedging
+        self.endpoints = endpoints
+        # monotonic time of the last request sent, if any
+        self.last_used: Optional[float] = None
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("h2 is not installed, using HTTP/1.1")
+            self.http2 = False
         if not self.api_key:
             raise Scope3AIError(
                 "The scope3 api_key option must be set either by "
@@ -59,6 +177,113 @@ class ClientBase:
     def create_client(self) -> ClientType:
         raise NotImplementedError
 
+    def _after_fork_in_child(self) -> None:
+        # the inherited connections are shared with the parent process, they
+        # are dropped without being closed and a new pool is created on use
+        if hasattr(self, "_client"):
+            del self._client
+
+    def _client_options(self) -> dict:
+        options = {
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+            "http2": self.http2,
+        }
+        if self.limits is not None:
+            options["limits"] = self.limits
+        if self.timeout is not None:
+            options["timeout"] = self.timeout
+        if self.transport is not None:
+            options["transport"] = self.transport
+        return options
+
+    def _build_request_kwargs(
+        self, params: Optional[dict] = None, json: Optional[dict] = None
+    ) -> dict:
+        kwargs = {}
+        if params:
+            kwargs["params"] = params
+        if json:
+            if isinstance(json, BaseModel):
+                json = json.model_dump(mode="json", exclude_unset=True)
+            if self.compression:
+                kwargs["content"], kwargs["headers"] = encode_json_body(
+                    json, self.compression, self.compression_threshold
+                )
+            else:
+                kwargs["json"] = json
+            key = idempotency_key(json)
+            if key:
+                kwargs.setdefault("headers", {})[IDEMPOTENCY_KEY_HEADER] = key
+        return kwargs
+
+    def _check_circuit(self) -> None:
+        if self.circuit_breaker and not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(self.circuit_breaker.retry_after())
+
+    def _release_circuit(self) -> None:
+        # the request was given up without an answer, for instance cancelled,
+        # it must not hold the circuit breaker probe
+        if self.circuit_breaker:
+            self.circuit_breaker.release()
+
+    def _reserve_rate(self, json: Optional[dict]) -> float:
+        # return the delay before the request can be sent
+        if not self.rate_limiter:
+            return 0.0
+        if isinstance(json, dict):
+            rows = json.get("rows")
+        else:
+            rows = getattr(json, "rows", None)
+        return self.rate_limiter.reserve(len(rows) if rows else 0)
+
+    def _select_endpoint(self, tried: set) -> str:
+        if self.endpoints is None:
+            return self.api_url
+        return self.endpoints.select(exclude=tried)
+
+    def _failover(self, base_url: str, exc: Exception, tried: set) -> bool:
+        # return True if the request is sent right away to another endpoint,
+        # without waiting for a retry
+        if self.endpoints is None or not is_transient_error(exc):
+            return False
+        self.endpoints.record_failure(base_url)
+        tried.add(base_url)
+        if not self.endpoints.can_failover(tried):
+            return False
+        logger.debug(f"Request to {base_url} failed ({exc!r}), failing over")
+        return True
+
+    def _on_success(self, started: float, base_url: Optional[str] = None) -> None:
+        if self.endpoints and base_url:
+            self.endpoints.record_success(base_url, monotonic() - started)
+        if self.concurrency_limit:
+            self.concurrency_limit.record(monotonic() - started)
+        if self.hedging:
+            self.hedging.record(monotonic() - started)
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
+
+    def _on_failure(
+        self, exc: Exception, attempt: int, started: float
+    ) -> Optional[float]:
+        # record the failure and return the delay before retrying, if any
+        if self.concurrency_limit:
+            self.concurrency_limit.record(
+                monotonic() - started, overloaded=is_transient_error(exc)
+            )
+        if self.circuit_breaker:
+            if is_transient_error(exc):
+                self.circuit_breaker.record_failure()
+            else:
+                # the API answered, it is healthy even if it rejected the request
+                self.circuit_breaker.record_success()
+        delay = None
+        if self.retry_policy:
+            delay = self.retry_policy.get_delay(attempt, exc)
+        if delay is not None:
+            logger.debug(f"Request failed ({exc!r}), retrying in {delay:.2f}s")
+        return delay
+
 
 class Client(ClientBase, ClientCommands):
     """
@@ -66,7 +291,42 @@ class Client(ClientBase, ClientCommands):
     """
 
     def create_client(self) -> httpx.Client:
-        return httpx.Client(headers={"Authorization": f"Bearer {self.api_key}"})
+        return httpx.Client(**self._client_options())
+
+    def get_impact(self, content, debug=None, with_response=True, hedge=False):
+        """
+        Get impact metrics for a task. With `hedge`, the request is sent again
+        if it is slow to answer, according to the hedging policy.
+        """
+        call = partial(
+            super().get_impact, content, debug=debug, with_response=with_response
+        )
+        if hedge and self.hedging:
+            return self._hedged(call)
+        return call()
+
+    def _hedged(self, call: Callable[[], Any]) -> Any:
+        # the requests run in daemon threads, the first answer is used and the
+        # other request is left to complete in background, without holding up
+        # the interpreter exit. Both requests carry the same idempotency key,
+        # as a retry does, so the API handles the later one as a duplicate
+        delay = self.hedging.delay()
+        if delay is None:
+            return call()
+        primary = _run_in_thread(call)
+        done, _ = futures.wait([primary], timeout=delay)
+        if done or not self.hedging.acquire():
+            return primary.result()
+        logger.debug(f"No answer after {delay:.3f}s, hedging the request")
+        pending = {primary, _run_in_thread(call)}
+        error = None
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
 
     def execute_request(
         self,
@@ -77,16 +337,40 @@ class Client(ClientBase, ClientCommands):
         response_model: Optional[BaseModel] = None,
         with_response: Optional[bool] = True,
     ):
-        full_url = self.api_url + url
-        kwargs = {}
-        if params:
-            kwargs["params"] = params
-        if json:
-            if isinstance(json, BaseModel):
-                json = json.model_dump(mode="json", exclude_unset=True)
-            kwargs["json"] = json
-        response = self.client.request(method, full_url, **kwargs)
-        response.raise_for_status()
+        kwargs = self._build_request_kwargs(params, json)
+        attempt = 0
+        # endpoints that failed since the last retry
+        tried = set()
+        failover = False
+        while True:
+            if not failover:
+                # a request failing over keeps its circuit breaker probe
+                self._check_circuit()
+            failover = False
+            try:
+                delay = self._reserve_rate(json)
+                if delay > 0:
+                    sleep(delay)
+                base_url = self._select_endpoint(tried)
+                started = self.last_used = monotonic()
+                response = self.client.request(method, base_url + url, **kwargs)
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                if self._failover(base_url, exc, tried):
+                    failover = True
+                    continue
+                delay = self._on_failure(exc, attempt, started)
+                if delay is None:
+                    raise
+                attempt += 1
+                tried.clear()
+                sleep(delay)
+                continue
+            except BaseException:
+                self._release_circuit()
+                raise
+            self._on_success(started, base_url)
+            break
         if not with_response:
             return
         if response_model:
@@ -94,13 +378,213 @@ class Client(ClientBase, ClientCommands):
         return response.json()
 
 
+class ConnectionWarmer:
+    """
+    Keep pooled connections of a synchronous client to the API open ahead of
+    the first requests, paying for the DNS resolution, the TCP and the TLS
+    handshakes in background.
+
+    The connections are opened right away with concurrent `/status` requests
+    to every endpoint, and opened again once the client was idle long enough
+    for them to expire after real requests: an idle process sends no request
+    until it is used again. The warm-up requests bypass the retries, the
+    circuit breaker and the rate limiter, and their failures are ignored.
+
+    Args:
+        client (Client): The client whose connections are kept open.
+        connections (int): Number of connections to open.
+        keepalive_expiry (float): Time in seconds an idle connection is kept
+            alive by the client.
+    """
+
+    def __init__(
+        self, client: "Client", connections: int, keepalive_expiry: float
+    ) -> None:
+        self.client = client
+        self.connections = connections
+        self.keepalive_expiry = keepalive_expiry
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="scope3ai.ConnectionWarmer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def warm_up(self) -> None:
+        """
+        Open the connections, one request per connection at the same time.
+        """
+        threads = [
+            threading.Thread(target=self._ping, args=(url,), daemon=True)
+            for url in self._urls()
+            for _ in range(self.connections)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _urls(self) -> List[str]:
+        endpoints = self.client.endpoints
+        if endpoints is None:
+            return [self.client.api_url]
+        return [endpoint.url for endpoint in endpoints.endpoints]
+
+    def _ping(self, url: str) -> None:
+        # not a use of the client, it does not delay the next warm-up
+        try:
+            self.client.client.get(url + "/status")
+        except httpx.HTTPError as exc:
+            logger.debug(f"Connection warm-up failed: {exc!r}")
+
+    def _run(self) -> None:
+        self.warm_up()
+        # last request warmed up after, None until the first one
+        warmed = None
+        while not self._stop_event.is_set():
+            last_used = self.client.last_used
+            if last_used is None or last_used == warmed:
+                # no request since the last warm-up
+                self._stop_event.wait(self.keepalive_expiry)
+                continue
+            idle = monotonic() - last_used
+            if idle >= self.keepalive_expiry:
+                self.warm_up()
+                warmed = last_used
+                continue
+            self._stop_event.wait(self.keepalive_expiry - idle)
+
+    def _after_fork_in_child(self) -> None:
+        # the warmer thread did not survive the fork, the child opens its own
+        # connections
+        running = self._thread is not None and not self._stop_event.is_set()
+        self._stop_event = threading.Event()
+        self._thread = None
+        if running:
+            self.start()
+
+
+async def _close_on_shutdown(client: httpx.AsyncClient, on_close: Callable[[], None]):
+    try:
+        yield
+    finally:
+        try:
+            await client.aclose()
+        finally:
+            on_close()
+
+
+def _closed_with_loop(client: httpx.AsyncClient, on_close: Callable[[], None]):
+    # an async generator started in the running loop is finalized by the
+    # loop on shutdown, while it can still close the connections
+    closer = _close_on_shutdown(client, on_close)
+    try:
+        closer.__anext__().send(None)
+    except StopIteration:
+        pass
+    return closer
+
+
 class AsyncClient(ClientBase, ClientCommands):
     """
     Asynchronous Client to the Scope3AI HTTP API
+
+    An httpx async client is bound to the event loop that first uses it, so a
+    pooled client is kept per running event loop, and closed with the loop
+    when it is shut down with `asyncio.run` or `loop.shutdown_asyncgens()`.
     """
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._clients_lock = threading.Lock()
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Obtain the httpx async client of the running event loop, created on
+        first use in that loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return super().client
+        with self._clients_lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                # the pools of the closed loops cannot be used anymore, they
+                # are closed on the shutdown of their loop, if shut down
+                for closed in [key for key in self._clients if key.is_closed()]:
+                    del self._clients[closed]
+                client = self.create_client()
+                closer = _closed_with_loop(client, partial(self._forget, loop))
+                entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
     def create_client(self):
-        return httpx.AsyncClient(headers={"Authorization": f"Bearer {self.api_key}"})
+        return httpx.AsyncClient(**self._client_options())
+
+    async def get_impact(self, content, debug=None, with_response=True, hedge=False):
+        """
+        Get impact metrics for a task. With `hedge`, the request is sent again
+        if it is slow to answer, according to the hedging policy.
+        """
+        call = partial(
+            super().get_impact, content, debug=debug, with_response=with_response
+        )
+        if hedge and self.hedging:
+            return await self._hedged(call)
+        return await call()
+
+    async def _hedged(self, call: Callable[[], Any]) -> Any:
+        # the first answer is used and the other request is cancelled
+        pending = {asyncio.ensure_future(call())}
+        try:
+            delay = self.hedging.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self.hedging.acquire():
+                    logger.debug(f"No answer after {delay:.3f}s, hedging the request")
+                    pending.add(asyncio.ensure_future(call()))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def aclose(self) -> None:
+        """
+        Close the connections of the running event loop.
+        """
+        with self._clients_lock:
+            entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            # closes the client
+            await entry[1].aclose()
+
+    def _forget(self, loop: asyncio.AbstractEventLoop) -> None:
+        # the closer holds the loop, its entry is removed once closed
+        with self._clients_lock:
+            self._clients.pop(loop, None)
+
+    def _after_fork_in_child(self) -> None:
+        super()._after_fork_in_child()
+        self._clients_lock = threading.Lock()
+        self._clients = weakref.WeakKeyDictionary()
 
     async def execute_request(
         self,
@@ -111,16 +595,40 @@ class AsyncClient(ClientBase, ClientCommands):
         response_model: Optional[BaseModel] = None,
         with_response: Optional[bool] = True,
     ):
-        full_url = self.api_url + url
-        kwargs = {}
-        if params:
-            kwargs["params"] = params
-        if json:
-            if isinstance(json, BaseModel):
-                json = json.model_dump(mode="json", exclude_unset=True)
-            kwargs["json"] = json
-        response = await self.client.request(method, full_url, **kwargs)
-        response.raise_for_status()
+        kwargs = self._build_request_kwargs(params, json)
+        attempt = 0
+        # endpoints that failed since the last retry
+        tried = set()
+        failover = False
+        while True:
+            if not failover:
+                # a request failing over keeps its circuit breaker probe
+                self._check_circuit()
+            failover = False
+            try:
+                delay = self._reserve_rate(json)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                base_url = self._select_endpoint(tried)
+                started = self.last_used = monotonic()
+                response = await self.client.request(method, base_url + url, **kwargs)
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                if self._failover(base_url, exc, tried):
+                    failover = True
+                    continue
+                delay = self._on_failure(exc, attempt, started)
+                if delay is None:
+                    raise
+                attempt += 1
+                tried.clear()
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._release_circuit()
+                raise
+            self._on_success(started, base_url)
+            break
         if not with_response:
             return
         if response_model:
@@ -0,0 +1,57 @@
+import gzip
+import importlib.util
+import json
+import logging
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger("scope3ai.api.compression")
+
+GZIP = "gzip"
+ZSTD = "zstd"
+ENCODINGS = [GZIP, ZSTD]
+
+
+def resolve_encoding(encoding: Optional[str]) -> Optional[str]:
+    """
+    Return the content encoding to use for the request bodies.
+
+    zstd requires the optional `zstandard` package, gzip is used instead
+    when it is not installed.
+    """
+    if not encoding:
+        return None
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown compression: {encoding}")
+    if encoding == ZSTD and importlib.util.find_spec("zstandard") is None:
+        logger.warning("zstandard is not installed, using gzip compression")
+        return GZIP
+    return encoding
+
+
+def encode_json_body(
+    payload: Any,
+    encoding: Optional[str] = None,
+    threshold: int = 0,
+) -> Tuple[bytes, dict]:
+    """
+    Serialize a JSON payload as compact bytes, compressed with `encoding`
+    if the body is at least `threshold` bytes long.
+
+    Returns:
+        Tuple[bytes, dict]: The body and the headers describing it.
+    """
+    body = json.dumps(
+        payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+    ).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if encoding is None or len(body) < threshold:
+        return body, headers
+    if encoding == ZSTD:
+        import zstandard
+
+        body = zstandard.ZstdCompressor().compress(body)
+    else:
+        # mtime is fixed so identical payloads give identical bodies
+        body = gzip.compress(body, compresslevel=6, mtime=0)
+    headers["Content-Encoding"] = encoding
+    return body, headers
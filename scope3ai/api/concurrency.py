@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from time import monotonic
+from typing import Optional
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Limit of the concurrent requests to the Scope3AI HTTP API, adapted to the
+    observed latency with an additive increase, multiplicative decrease (AIMD)
+    policy.
+
+    The baseline is the lowest latency observed, slowly drifting up so it
+    follows a lasting change of the API latency. While the latency stays
+    within `tolerance` times the baseline, the limit grows by one every `limit`
+    requests. When the latency rises above it, or the API is overloaded, the
+    limit is multiplied by `decrease`, at most once per round trip.
+
+    Args:
+        max_limit (int): Maximum number of concurrent requests.
+        min_limit (int, optional): Minimum number of concurrent requests.
+            Defaults to 1.
+        initial_limit (int, optional): Initial number of concurrent requests.
+            Defaults to `min_limit`.
+        tolerance (float, optional): Latency increase, relative to the
+            baseline, considered as an overload. Defaults to 2.
+        decrease (float, optional): Factor applied to the limit on overload.
+            Defaults to 0.75.
+    """
+
+    # relative increase of the baseline latency per request
+    BASELINE_DRIFT = 0.01
+    # how often async waiters check for a free slot
+    POLL_INTERVAL = 0.01
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        tolerance: float = 2.0,
+        decrease: float = 0.75,
+    ) -> None:
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self._cond = threading.Condition()
+        self._limit = float(initial_limit or min_limit)
+        self._inflight = 0
+        self._baseline: Optional[float] = None
+        self._decreased_at = 0.0
+
+    @property
+    def limit(self) -> int:
+        """
+        Current maximum number of concurrent requests.
+        """
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def acquire(self) -> None:
+        """
+        Wait for a request slot.
+        """
+        with self._cond:
+            while self._inflight >= int(self._limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    async def aacquire(self) -> None:
+        """
+        Async version of AdaptiveConcurrencyLimit::acquire.
+        """
+        while not self._try_acquire():
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def _try_acquire(self) -> bool:
+        with self._cond:
+            if self._inflight >= int(self._limit):
+                return False
+            self._inflight += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify()
+
+    def record(self, latency: float, overloaded: bool = False) -> None:
+        """
+        Adjust the limit from the latency in seconds of a request, and whether
+        it failed because the API is overloaded or unreachable.
+        """
+        with self._cond:
+            if not overloaded:
+                if self._baseline is None:
+                    self._baseline = latency
+                else:
+                    drifted = self._baseline * (1 + self.BASELINE_DRIFT)
+                    self._baseline = min(latency, drifted)
+            if overloaded or latency > self._baseline * self.tolerance:
+                now = monotonic()
+                # the requests in flight during the overload all see it,
+                # only cut the limit once per round trip
+                if now - self._decreased_at >= latency:
+                    self._decreased_at = now
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _before_fork(self) -> None:
+        self._cond.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._cond.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the requests in flight belong to the parent process
+        self._cond = threading.Condition()
+        self._inflight = 0
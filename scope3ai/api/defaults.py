@@ -1,2 +1,23 @@
 DEFAULT_API_URL = "https://aiapi.scope3.com"
 DEFAULT_APPLICATION_ID = "default"
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_BATCH_LINGER = 0.0
+DEFAULT_SUBMITTER = "thread"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_QUEUE_SIZE = 0
+DEFAULT_QUEUE_POLICY = "drop_newest"
+DEFAULT_QUEUE_TIMEOUT = 1.0
+DEFAULT_TENANT_QUEUE_SIZE = 0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 5
+DEFAULT_CIRCUIT_BREAKER_TIMEOUT = 30.0
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 5.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_COLLECTOR_SOCKET = "scope3ai.sock"
+DEFAULT_SHUTDOWN_TIMEOUT = 10.0
+DEFAULT_DEDUPE_SIZE = 10000
+DEFAULT_HEDGE_MAX_RATIO = 0.05
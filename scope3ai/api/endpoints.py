@@ -0,0 +1,155 @@
+import logging
+import threading
+from time import monotonic
+from typing import Collection, List, Optional
+
+logger = logging.getLogger("scope3ai.api.endpoints")
+
+
+class Endpoint:
+    """
+    Health and latency of one endpoint of the Scope3AI HTTP API.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        # moving average of the latency in seconds, None until measured
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_used = 0.0
+
+    def is_up(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class EndpointPool:
+    """
+    Endpoints of the Scope3AI HTTP API serving the same requests, for
+    instance the API in several regions or a local relay.
+
+    The requests are sent to the healthy endpoint with the lowest latency,
+    tracked as an exponentially weighted moving average (EWMA). An endpoint
+    failing with a transient error is marked down for `cooldown` seconds,
+    doubled on every consecutive failure up to `max_cooldown`, and the
+    requests fail over to the other endpoints meanwhile. Once the cooldown is
+    over, the endpoint is tried again, and it gets the requests back as soon
+    as it answers faster than the others. The endpoints not used for
+    `probe_interval` seconds get a request to refresh their latency.
+
+    Args:
+        urls (List[str]): The base URLs of the endpoints, in order of
+            preference when their latency is not known yet.
+        alpha (float, optional): Weight of a new latency in the moving average.
+            Defaults to 0.2.
+        cooldown (float, optional): Time in seconds an endpoint is marked down
+            after a failure. Defaults to 5.
+        max_cooldown (float, optional): Maximum time in seconds an endpoint is
+            marked down. Defaults to 60.
+        probe_interval (float, optional): Time in seconds after which an
+            unused endpoint gets a request. Defaults to 30.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        alpha: float = 0.2,
+        cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+        probe_interval: float = 30.0,
+    ) -> None:
+        if not urls:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._by_url = {endpoint.url: endpoint for endpoint in self.endpoints}
+
+    @property
+    def stats(self) -> dict:
+        """
+        Return whether every endpoint is `up`, and its `latency` in seconds.
+        """
+        now = monotonic()
+        return {
+            endpoint.url: {"up": endpoint.is_up(now), "latency": endpoint.latency}
+            for endpoint in self.endpoints
+        }
+
+    def select(self, exclude: Collection[str] = ()) -> str:
+        """
+        Return the URL of the endpoint to send the next request to, avoiding
+        the endpoints of `exclude` (already tried for this request) if any
+        other is left.
+        """
+        now = monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.url not in exclude]
+            if not candidates:
+                candidates = self.endpoints
+            up = [e for e in candidates if e.is_up(now)]
+            if not up:
+                # all down, try the one back the soonest
+                endpoint = min(candidates, key=lambda e: e.down_until)
+            else:
+                endpoint = next(
+                    (
+                        e
+                        for e in up
+                        if e.latency is None or now - e.last_used >= self.probe_interval
+                    ),
+                    None,
+                )
+                if endpoint is None:
+                    endpoint = min(up, key=lambda e: e.latency)
+            endpoint.last_used = now
+            return endpoint.url
+
+    def can_failover(self, exclude: Collection[str]) -> bool:
+        """
+        Return True if an endpoint up is left out of `exclude`.
+        """
+        now = monotonic()
+        with self._lock:
+            return any(e.is_up(now) for e in self.endpoints if e.url not in exclude)
+
+    def record_success(self, url: str, latency: float) -> None:
+        endpoint = self._by_url.get(url)
+        if endpoint is None:
+            return
+        with self._lock:
+            if endpoint.failures:
+                logger.info(f"API endpoint {url} is healthy again")
+            endpoint.failures = 0
+            endpoint.down_until = 0.0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.alpha * (latency - endpoint.latency)
+
+    def record_failure(self, url: str) -> None:
+        """
+        Mark an endpoint down after a transient failure.
+        """
+        endpoint = self._by_url.get(url)
+        if endpoint is None:
+            return
+        with self._lock:
+            backoff = 2 ** min(endpoint.failures, 16)
+            cooldown = min(self.max_cooldown, self.cooldown * backoff)
+            endpoint.failures += 1
+            endpoint.down_until = monotonic() + cooldown
+        logger.warning(f"API endpoint {url} is down, retrying in {cooldown:.1f}s")
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the health of the endpoints stays valid in the child
+        self._lock = threading.Lock()
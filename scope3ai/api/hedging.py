@@ -0,0 +1,90 @@
+import bisect
+import threading
+from collections import deque
+from typing import Optional
+
+
+class HedgingPolicy:
+    """
+    Policy of the hedged requests to the Scope3AI HTTP API: a request not
+    answered after the `percentile` of the recent latencies is sent again,
+    and the first response is used.
+
+    The hedged requests are capped to `max_ratio` of the requests: every
+    request adds `max_ratio` to a budget, and every hedged request takes one
+    from it, so the extra load stays bounded even when the API slows down.
+
+    Args:
+        percentile (float, optional): Percentile of the recent latencies,
+            between 0 and 1, after which a request is hedged. Defaults to 0.95.
+        max_ratio (float, optional): Maximum ratio of hedged requests.
+            Defaults to 0.05.
+        window (int, optional): Number of recent latencies considered.
+            Defaults to 1000.
+        min_samples (int, optional): Number of latencies needed before hedging.
+            Defaults to 20.
+    """
+
+    # number of hedged requests that can be sent in a burst
+    MAX_BUDGET = 10.0
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        max_ratio: float = 0.05,
+        window: int = 1000,
+        min_samples: int = 20,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("The hedging percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._sorted = []
+        self._budget = 0.0
+        self.hedged = 0
+
+    def record(self, latency: float) -> None:
+        """
+        Record the latency in seconds of a successful request.
+        """
+        with self._lock:
+            if len(self._latencies) == self._latencies.maxlen:
+                oldest = self._latencies[0]
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._latencies.append(latency)
+            bisect.insort(self._sorted, latency)
+            self._budget = min(self.MAX_BUDGET, self._budget + self.max_ratio)
+
+    def delay(self) -> Optional[float]:
+        """
+        Return the time in seconds after which a request is hedged, None if
+        not enough latencies were recorded yet.
+        """
+        with self._lock:
+            if len(self._sorted) < self.min_samples:
+                return None
+            index = min(len(self._sorted) - 1, int(self.percentile * len(self._sorted)))
+            return self._sorted[index]
+
+    def acquire(self) -> bool:
+        """
+        Take a hedged request from the budget, return False if it is spent.
+        """
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            self.hedged += 1
+            return True
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        self._lock = threading.Lock()
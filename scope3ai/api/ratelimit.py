@@ -0,0 +1,117 @@
+import threading
+from time import monotonic
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, up to `capacity` tokens.
+
+    Tokens are reserved ahead of time: a reservation always succeeds and
+    returns how long the caller must wait for the tokens to be available,
+    the bucket going into debt meanwhile.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float, optional): Maximum number of tokens, the size of the
+            allowed bursts. Defaults to one second of tokens.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("The rate of a token bucket must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def retry_after(self, amount: float = 1) -> float:
+        """
+        Return the time in seconds before `amount` tokens are available.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def reserve(self, amount: float = 1) -> float:
+        """
+        Take `amount` tokens and return the time in seconds to wait before
+        using them.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter of the Scope3AI HTTP API, limiting both the
+    requests and the impact rows sent per second. It is thread-safe and
+    can be shared between clients.
+
+    Args:
+        requests_per_second (float, optional): Maximum number of requests per
+            second, no limit if not set.
+        rows_per_second (float, optional): Maximum number of impact rows per
+            second, no limit if not set.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        rows_per_second: Optional[float] = None,
+    ) -> None:
+        self.requests = (
+            TokenBucket(requests_per_second) if requests_per_second else None
+        )
+        self.rows = TokenBucket(rows_per_second) if rows_per_second else None
+
+    def retry_after(self) -> float:
+        """
+        Return the time in seconds before the next request can be sent.
+        """
+        delay = 0.0
+        if self.requests:
+            delay = self.requests.retry_after(1)
+        if self.rows:
+            delay = max(delay, self.rows.retry_after(1))
+        return delay
+
+    def reserve(self, rows: int = 0) -> float:
+        """
+        Reserve a request sending `rows` impact rows, and return the time in
+        seconds to wait before sending it.
+        """
+        delay = 0.0
+        if self.requests:
+            delay = self.requests.reserve(1)
+        if self.rows and rows:
+            delay = max(delay, self.rows.reserve(rows))
+        return delay
+
+    def _buckets(self) -> list:
+        return [bucket for bucket in (self.requests, self.rows) if bucket]
+
+    def _before_fork(self) -> None:
+        for bucket in self._buckets():
+            bucket._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        for bucket in self._buckets():
+            bucket._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        for bucket in self._buckets():
+            bucket._lock = threading.Lock()
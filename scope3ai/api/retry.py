@@ -0,0 +1,211 @@
+import logging
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("scope3ai.api.retry")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# the content of the request is invalid, for instance one of its rows
+REJECTED_STATUS_CODES = {400, 422}
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """
+    Return True if the error is worth retrying: server errors, rate limiting
+    and network errors.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, httpx.TransportError)
+
+
+def is_rejected_request(exc: Exception) -> bool:
+    """
+    Return True if the API rejected the content of the request, which fails
+    again unless the content changes.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in REJECTED_STATUS_CODES
+    return False
+
+
+class RetryPolicy:
+    """
+    Retry policy for transient failures of the Scope3AI HTTP API.
+
+    Server errors (5xx), rate limiting (429) and network errors are retried
+    with a capped exponential backoff and full jitter. A `Retry-After`
+    header sent by the API takes precedence over the computed backoff.
+
+    Args:
+        max_retries (int, optional): Maximum number of retries after the first
+            attempt. Defaults to 3.
+        backoff_base (float, optional): Backoff in seconds before the first
+            retry, doubled on every attempt. Defaults to 0.5.
+        backoff_max (float, optional): Maximum backoff in seconds, also applied
+            to `Retry-After`. Defaults to 30.
+        jitter (bool, optional): Pick a random backoff between 0 and the
+            computed value. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        jitter: bool = True,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+
+    def get_delay(self, attempt: int, exc: Exception) -> Optional[float]:
+        """
+        Return the delay in seconds before retrying the failed `attempt`
+        (starting at 0), or None if the request must not be retried.
+        """
+        if attempt >= self.max_retries or not is_transient_error(exc):
+            return None
+        retry_after = get_retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+def get_retry_after(exc: Exception) -> Optional[float]:
+    """
+    Return the delay requested by the `Retry-After` header of a failed
+    response, either in seconds or as an HTTP date.
+    """
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker protecting the Scope3AI HTTP API.
+
+    After `failure_threshold` consecutive transient failures the circuit
+    opens and requests are rejected without being sent. Once `reset_timeout`
+    seconds elapsed, a single probe request is let through: its success
+    closes the circuit, its failure opens it again. A probe given up without
+    an answer must be released, and a probe not answered after another
+    `reset_timeout` seconds is considered lost, another one is let through.
+
+    Args:
+        failure_threshold (int, optional): Number of consecutive failures
+            opening the circuit. Defaults to 5.
+        reset_timeout (float, optional): Time in seconds before probing an open
+            circuit. Defaults to 30.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # how often waiters check for the result of an in-flight probe
+    PROBE_POLL_INTERVAL = 0.05
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def retry_after(self) -> float:
+        """
+        Return the time in seconds before a request can be sent, 0 if it
+        can be sent now.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return 0.0
+            now = monotonic()
+            if self._state == self.HALF_OPEN:
+                if now - self._probe_started >= self.reset_timeout:
+                    # the probe is lost, the next request is the new probe
+                    return 0.0
+                return self.PROBE_POLL_INTERVAL
+            return max(0.0, self._opened_at + self.reset_timeout - now)
+
+    def allow_request(self) -> bool:
+        """
+        Return True if a request can be sent now. When the circuit is open
+        and the reset timeout elapsed, the caller becomes the probe.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = monotonic()
+            if self._state == self.HALF_OPEN:
+                if now - self._probe_started < self.reset_timeout:
+                    return False
+                logger.warning("Circuit breaker probe lost, sending another one")
+            elif now - self._opened_at < self.reset_timeout:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = monotonic()
+
+    def release(self) -> None:
+        """
+        Release the probe of a request given up without an answer, for
+        instance cancelled: it counts as a failure, the circuit opens again.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+                self._opened_at = monotonic()
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        self._lock = threading.Lock()
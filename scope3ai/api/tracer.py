@@ -1,8 +1,33 @@
-from typing import List, Optional
+import math
+from typing import List, Optional, Tuple
 from uuid import uuid4
 
+from pydantic import Field
+
 from .typesgen import ImpactResponse, ModeledRow
 
+# z-score of the 95% confidence intervals of the sampled impacts
+CONFIDENCE_Z = 1.96
+
+
+class TracerImpactResponse(ImpactResponse):
+    """
+    Aggregated impact of a tracer.
+
+    When rows were sampled, the totals are extrapolated from the sampled rows
+    and come with their 95% confidence interval.
+    """
+
+    total_energy_wh_interval: Optional[Tuple[float, float]] = Field(
+        None, description="95% confidence interval of `total_energy_wh`"
+    )
+    total_gco2e_interval: Optional[Tuple[float, float]] = Field(
+        None, description="95% confidence interval of `total_gco2e`"
+    )
+    total_mlh2o_interval: Optional[Tuple[float, float]] = Field(
+        None, description="95% confidence interval of `total_mlh2o`"
+    )
+
 
 # TODO Tracer is not BaseTracer?
 class Tracer:
@@ -25,6 +50,9 @@ class Tracer:
             Only available at tracer level. Defaults to None.
         trace_id (str, optional): Unique identifier for the trace.
             Auto-generated if not provided. Defaults to None.
+        sample_rate (float, optional): Fraction of the calls submitted within
+            the tracer. Overrides global `SCOPE3AI_SAMPLE_RATE` setting.
+            Defaults to None.
     """
 
     def __init__(
@@ -36,6 +64,7 @@ class Tracer:
         application_id: Optional[str] = None,
         session_id: Optional[str] = None,
         trace_id: Optional[str] = None,
+        sample_rate: Optional[float] = None,
     ) -> None:
         from scope3ai.lib import Scope3AI
 
@@ -45,49 +74,62 @@ class Tracer:
         self.keep_traces = keep_traces
         self.children: List[Tracer] = []
         self.rows: List[ModeledRow] = []
+        # sampling weight of each row, the inverse of its sampling probability
+        self.weights: List[float] = []
         self.traces = []  # type: List[Scope3AIContext]
 
         self.client_id = client_id
         self.project_id = project_id
         self.application_id = application_id
         self.session_id = session_id
+        self.sample_rate = sample_rate
 
-    def impact(self, timeout: Optional[int] = None) -> ImpactResponse:
+    def impact(self, timeout: Optional[int] = None) -> TracerImpactResponse:
         """
         Return an aggregated impact response for the current tracer and its children.
 
         As the impact is computed asynchronously, this method will wait for the
         impact response to be available before returning it.
         """
-        for trace in self.traces:
+        # the traces are unlinked concurrently once their impact is set
+        for trace in self.traces[:]:
             trace.wait_impact(timeout)
         return self._impact()
 
-    async def aimpact(self, timeout: Optional[int] = None) -> ImpactResponse:
+    async def aimpact(self, timeout: Optional[int] = None) -> TracerImpactResponse:
         """
         Async version of Tracer::impact.
         """
-        for trace in self.traces:
+        for trace in self.traces[:]:
             await trace.await_impact(timeout)
         return self._impact()
 
-    def _impact(self) -> ImpactResponse:
+    def _impact(self) -> TracerImpactResponse:
         """
         Return an aggregated impact response for the current tracer and its children.
+
+        The totals of sampled rows are extrapolated with the Horvitz-Thompson
+        estimator, each row counting for its sampling weight.
         """
         all_rows = self.get_all_rows()
-        return ImpactResponse(
+        weights = self.get_all_weights()
+        energy = _estimate(all_rows, weights, "usage_energy_wh")
+        gco2e = _estimate(all_rows, weights, "usage_emissions_gco2e")
+        mlh2o = _estimate(all_rows, weights, "usage_water_ml")
+        return TracerImpactResponse(
             rows=all_rows,
-            total_energy_wh=sum([row.total_impact.usage_energy_wh for row in all_rows]),
-            total_gco2e=sum(
-                [row.total_impact.usage_emissions_gco2e for row in all_rows]
-            ),
-            total_mlh2o=sum([row.total_impact.usage_water_ml for row in all_rows]),
+            total_energy_wh=energy[0],
+            total_gco2e=gco2e[0],
+            total_mlh2o=mlh2o[0],
             has_errors=any([row.error is not None for row in all_rows]),
+            total_energy_wh_interval=energy[1],
+            total_gco2e_interval=gco2e[1],
+            total_mlh2o_interval=mlh2o[1],
         )
 
-    def add_impact(self, impact: ModeledRow) -> None:
+    def add_impact(self, impact: ModeledRow, weight: float = 1.0) -> None:
         self.rows.append(impact)
+        self.weights.append(weight)
 
     def get_all_rows(self) -> List[ModeledRow]:
         all_rows = self.rows[:]
@@ -95,6 +137,12 @@ class Tracer:
             all_rows.extend(child.get_all_rows())
         return all_rows
 
+    def get_all_weights(self) -> List[float]:
+        all_weights = self.weights[:]
+        for child in self.children:
+            all_weights.extend(child.get_all_weights())
+        return all_weights
+
     def _link_parent(self, parent: Optional["Tracer"]) -> None:
         if parent and (self not in parent.children):
             parent.children.append(self)
@@ -111,3 +159,24 @@ class Tracer:
             return
         if trace in self.traces:
             self.traces.remove(trace)
+
+
+def _estimate(
+    rows: List[ModeledRow], weights: List[float], metric: str
+) -> Tuple[float, Optional[Tuple[float, float]]]:
+    # total of a metric and its confidence interval if some rows were sampled
+    total = 0.0
+    variance = 0.0
+    sampled = False
+    # a row added concurrently may not have its weight yet
+    weights = weights + [1.0] * (len(rows) - len(weights))
+    for row, weight in zip(rows, weights):
+        value = getattr(row.total_impact, metric)
+        total += weight * value
+        # variance of a row kept with probability 1 / weight (Poisson sampling)
+        variance += weight * (weight - 1) * value**2
+        sampled = sampled or weight != 1
+    if not sampled:
+        return total, None
+    margin = CONFIDENCE_Z * math.sqrt(variance)
+    return total, (max(0.0, total - margin), total + margin)
@@ -1,7 +1,7 @@
 import asyncio
 import threading
 from time import monotonic
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 
 from pydantic import BaseModel, Field, PrivateAttr
 
@@ -54,36 +54,122 @@ class Scope3AIContext(BaseModel):
             "response, or configure `scope3.sync_mode` to True"
         ),
     )
+    sample_weight: float = Field(
+        1.0,
+        description=(
+            "The number of calls the impact request stands for, "
+            "the inverse of the sampling rate"
+        ),
+    )
 
     # non serializable fields
     _tracer: Optional[Tracer] = PrivateAttr(None)
     _impact_sync_ev: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _callbacks_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _callbacks: List[Callable[["Scope3AIContext"], None]] = PrivateAttr(
+        default_factory=list
+    )
+    # priority lane of the background worker
+    _on_wait: Optional[Callable[["Scope3AIContext"], None]] = PrivateAttr(None)
+    _promoted: bool = PrivateAttr(False)
+    _claimed: bool = PrivateAttr(False)
+    # copied to the secondary exporters
+    _exported: bool = PrivateAttr(False)
+    # monotonic times of the stages reached in the submission pipeline
+    _timestamps: Dict[str, float] = PrivateAttr(default_factory=dict)
+
+    @property
+    def timestamps(self) -> Dict[str, float]:
+        """
+        Monotonic times (`time.monotonic`) of the stages reached by the row:
+        "started" (the instrumented call, derived from its
+        `request_duration_ms`), "built", "enqueued", "dequeued", "sent",
+        "received" and "resolved".
+        """
+        return dict(self._timestamps)
 
     def set_impact(self, impact: ModeledRow):
+        self._timestamps["resolved"] = monotonic()
         self.impact = impact
-        self._impact_sync_ev.set()
+        with self._callbacks_lock:
+            self._impact_sync_ev.set()
+            callbacks, self._callbacks = self._callbacks, []
         if self._tracer:
-            self._tracer.add_impact(impact)
+            self._tracer.add_impact(impact, self.sample_weight)
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback: Callable[["Scope3AIContext"], None]):
+        """
+        Call `callback` with the context once the impact is set, right away
+        if it is already set.
+        """
+        with self._callbacks_lock:
+            if not self._impact_sync_ev.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_error(self, message: str, code: Optional[str] = None):
+        """
+        Resolve the context with an error and an empty impact, so that
+        anything waiting for the impact is released.
+        """
+        metrics = ImpactMetrics(
+            usage_energy_wh=0,
+            usage_emissions_gco2e=0,
+            usage_water_ml=0,
+            embodied_emissions_gco2e=0,
+            embodied_water_ml=0,
+        )
+        self.set_impact(
+            ModeledRow(
+                total_impact=metrics,
+                error=Error(code=code, message=message),
+            )
+        )
+
+    def _promote(self) -> None:
+        # someone waits for the impact, it overtakes the queued rows
+        if self._promoted or self._on_wait is None:
+            return
+        if self._impact_sync_ev.is_set():
+            return
+        self._promoted = True
+        self._on_wait(self)
 
     def wait_impact(self, timeout: Optional[float] = None):
+        self._promote()
         self._impact_sync_ev.wait(timeout)
         if not self._impact_sync_ev.is_set():
             raise TimeoutError()
         return self.impact
 
     async def await_impact(self, timeout: Optional[float] = None):
-        # check if the impact is already set, with polling.
-        # XXX i have not be able to have a proper async interface
-        # without complexify the code.
-        start_time = monotonic()
-        while not self._impact_sync_ev.is_set():
-            elapsed_time = monotonic() - start_time
-            if timeout is not None and elapsed_time >= timeout:
-                raise asyncio.TimeoutError()
-            await asyncio.sleep(0.1)
+        self._promote()
+        if self._impact_sync_ev.is_set():
+            return self.impact
+        # the impact can be set from any thread, the loop is woken up then
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def wake_up(ctx: "Scope3AIContext") -> None:
+            try:
+                loop.call_soon_threadsafe(_set_done, done)
+            except RuntimeError:
+                # the loop is closed, nobody waits anymore
+                pass
+
+        self.add_done_callback(wake_up)
+        await asyncio.wait_for(done, timeout)
         return self.impact
 
 
+def _set_done(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
 __all__ = [
     "Scope3AIContext",
     "StatusResponse",
@@ -1,8 +1,102 @@
+import inspect
+from contextlib import contextmanager
+from functools import wraps
+from typing import Iterator
+
 from wrapt import wrap_function_wrapper
 
 from scope3ai.constants import CLIENTS
 
 
+@contextmanager
+def weighted(weight: float) -> Iterator[None]:
+    """
+    Submit the impact rows with the sample weight `weight`, the inverse of the
+    sampling rate of the call they come from.
+    """
+    from scope3ai.lib import Scope3AI
+
+    token = Scope3AI._sample_weight.set(weight)
+    try:
+        yield
+    finally:
+        Scope3AI._sample_weight.reset(token)
+
+
+def _weighted_result(result, weight: float):
+    # the rows of the coroutines and streams returned by a sampled call are
+    # submitted once they run, so keep its weight set meanwhile
+    if inspect.iscoroutine(result):
+        return _weighted_coroutine(result, weight)
+    if inspect.isgenerator(result):
+        return _weighted_generator(result, weight)
+    if inspect.isasyncgen(result):
+        return _weighted_async_generator(result, weight)
+    return result
+
+
+async def _weighted_coroutine(coro, weight: float):
+    with weighted(weight):
+        result = await coro
+    return _weighted_result(result, weight)
+
+
+def _weighted_generator(gen, weight: float):
+    # set for every step only, the generator is resumed by its consumer
+    try:
+        while True:
+            with weighted(weight):
+                try:
+                    item = next(gen)
+                except StopIteration as e:
+                    return e.value
+            yield item
+    finally:
+        gen.close()
+
+
+async def _weighted_async_generator(gen, weight: float):
+    try:
+        while True:
+            with weighted(weight):
+                try:
+                    item = await gen.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield item
+    finally:
+        await gen.aclose()
+
+
+def sampled(wrapper):
+    """
+    Apply `wrapper` to the sampled calls only, the other calls go straight to
+    the wrapped function and are not instrumented at all.
+
+    The impact rows of a sampled call are submitted with the weight decided
+    here, the inverse of the sampling rate, including the rows of the
+    coroutine or stream it returns. The rows submitted out of a sampled call
+    keep the weight 1.
+    """
+
+    @wraps(wrapper)
+    def sampled_wrapper(wrapped, instance, args, kwargs):
+        from scope3ai.lib import Scope3AI
+
+        scope3ai = Scope3AI._instance
+        if scope3ai is None:
+            return wrapper(wrapped, instance, args, kwargs)
+        sample_rate = scope3ai._get_sample_rate()
+        if not scope3ai._should_sample(sample_rate):
+            return wrapped(*args, **kwargs)
+        weight = 1 / sample_rate
+        with weighted(weight):
+            result = wrapper(wrapped, instance, args, kwargs)
+        return _weighted_result(result, weight)
+
+    return sampled_wrapper
+
+
 # TODO Tracer is not BaseTracer?
 class BaseTracer:
     wrapper_methods = []
@@ -13,5 +107,5 @@ class BaseTracer:
             wrap_function_wrapper(
                 wrapper["module"],
                 wrapper["name"],
-                wrapper["wrapper"],
+                sampled(wrapper["wrapper"]),
             )
@@ -0,0 +1,305 @@
+"""
+Local collector: many processes ship their impact rows over a Unix domain
+socket to a single process submitting them to the Scope3AI API.
+
+The protocol is newline-delimited JSON. Each line sent to the collector is
+an `ImpactRow` with a `request_id`, and for each row the collector answers
+with `{"request_id": ..., "impact": ModeledRow}` once the row is submitted.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .api.types import ImpactRow, ModeledRow, Scope3AIContext
+
+logger = logging.getLogger("scope3ai.collector")
+
+
+class CollectorClient:
+    """
+    Connection of an SDK process to the collector.
+
+    Rows are written to the socket by `send`, and a reader thread resolves
+    the contexts with the impacts sent back by the collector.
+
+    Args:
+        path (str): Path of the collector Unix socket.
+        on_reply (Callable): Called with the context and the impact of every
+            row answered by the collector.
+        on_error (Callable): Called with the contexts and the error of the rows
+            that will not be answered, for instance if the connection is lost.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        on_reply: Callable[[Scope3AIContext, ModeledRow], None],
+        on_error: Callable[[List[Scope3AIContext], Exception], None],
+    ) -> None:
+        self.path = path
+        self._on_reply = on_reply
+        self._on_error = on_error
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._pending: Dict[str, Scope3AIContext] = {}
+
+    def send(self, contexts: List[Scope3AIContext]) -> None:
+        """
+        Write the rows of the contexts to the collector in a single write.
+
+        Raises:
+            OSError: If the collector cannot be reached, the contexts are not
+                registered and no reply will be received for them.
+        """
+        data = b"".join(
+            ctx.request.model_dump_json(exclude_unset=True).encode("utf-8") + b"\n"
+            for ctx in contexts
+        )
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            for ctx in contexts:
+                self._pending[ctx.request.request_id] = ctx
+            try:
+                self._sock.sendall(data)
+            except OSError:
+                for ctx in contexts:
+                    self._pending.pop(ctx.request.request_id, None)
+                self._disconnect(self._sock)
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._disconnect(self._sock)
+
+    def _connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        threading.Thread(
+            target=self._read,
+            args=(sock,),
+            name="scope3ai.CollectorClient",
+            daemon=True,
+        ).start()
+
+    def _disconnect(self, sock: socket.socket) -> None:
+        # must be called with the lock held
+        if self._sock is sock:
+            self._sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _read(self, sock: socket.socket) -> None:
+        try:
+            with sock.makefile("rb") as fd:
+                for line in fd:
+                    self._dispatch(line)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._disconnect(sock)
+            # the rows sent on this connection will never be answered
+            contexts = list(self._pending.values())
+            self._pending.clear()
+        if contexts:
+            self._on_error(contexts, ConnectionError("Lost connection to collector"))
+
+    def _dispatch(self, line: bytes) -> None:
+        try:
+            reply = json.loads(line)
+            impact = ModeledRow.model_validate(reply["impact"])
+        except (ValueError, KeyError):
+            logger.warning("Skipping invalid reply from the collector")
+            return
+        with self._lock:
+            ctx = self._pending.pop(reply.get("request_id"), None)
+        if ctx is not None:
+            self._on_reply(ctx, impact)
+
+    def _after_fork_in_child(self) -> None:
+        # the connection and its reader thread belong to the parent process
+        self._lock = threading.Lock()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._pending = {}
+
+
+class _CollectorHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        write_lock = threading.Lock()
+
+        def reply(ctx: Scope3AIContext) -> None:
+            line = json.dumps(
+                {
+                    "request_id": ctx.request.request_id,
+                    "impact": ctx.impact.model_dump(mode="json", exclude_unset=True),
+                },
+                separators=(",", ":"),
+            )
+            try:
+                with write_lock:
+                    self.wfile.write(line.encode("utf-8") + b"\n")
+            except (OSError, ValueError):
+                # the process went away, nobody waits for this impact
+                pass
+
+        for line in self.rfile:
+            try:
+                row = ImpactRow.model_validate_json(line)
+            except ValueError:
+                logger.warning("Skipping invalid row sent to the collector")
+                continue
+            if row.request_id is None:
+                logger.warning("Skipping row without request_id sent to the collector")
+                continue
+            ctx = Scope3AIContext(request=row)
+            ctx.add_done_callback(reply)
+            self.server.submit(ctx)
+
+
+class Collector(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Collector server, listening on a Unix socket.
+
+    Every row received is wrapped in a `Scope3AIContext` and handed to
+    `submit`, the impact is sent back to the process once the context is
+    resolved.
+
+    Args:
+        path (str): Path of the Unix socket to listen on. A stale socket file
+            is replaced, but not the socket of a running collector. The socket
+            can only be connected to by the user running the collector.
+        submit (Callable): Called with the context of every row received.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, submit: Callable[[Scope3AIContext], None]) -> None:
+        self.path = path
+        self.submit = submit
+        if os.path.exists(path):
+            if _is_listening(path):
+                raise OSError(f"A collector is already listening on {path}")
+            os.unlink(path)
+        super().__init__(path, _CollectorHandler)
+        os.chmod(path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _is_listening(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def default_socket_path() -> str:
+    """
+    Return the default path of the collector socket, in the runtime directory
+    of the user (`XDG_RUNTIME_DIR`), or else in a directory of the temporary
+    directory private to the user, created if needed.
+
+    Raises:
+        OSError: If the directory exists but is not private to the user, as
+            another user could listen on the socket in place of the collector.
+    """
+    from .api.defaults import DEFAULT_COLLECTOR_SOCKET
+
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"scope3ai-{os.getuid()}")
+        os.makedirs(runtime_dir, mode=0o700, exist_ok=True)
+        info = os.lstat(runtime_dir)
+        if (
+            not stat.S_ISDIR(info.st_mode)
+            or info.st_uid != os.getuid()
+            or info.st_mode & 0o077
+        ):
+            raise OSError(f"{runtime_dir} is not a directory private to the user")
+    return os.path.join(runtime_dir, DEFAULT_COLLECTOR_SOCKET)
+
+
+def run_collector(path: str, **init_options) -> None:
+    """
+    Run a collector on `path` until interrupted, submitting the rows with a
+    Scope3AI instance initialized with `init_options`.
+    """
+    from .lib import Scope3AI
+
+    # the collector submits the rows itself, SCOPE3AI_COLLECTOR is commonly set
+    # to its own socket and would send them back to it
+    init_options["collector"] = False
+    scope3 = Scope3AI.init(provider_clients=[], **init_options)
+    server = Collector(path, scope3._enqueue)
+
+    def stop(signum, frame):
+        # shutdown waits for serve_forever, it must run in another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    logger.info(f"Collector listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scope3.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="scope3ai")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collector = commands.add_parser(
+        "collector",
+        help="Submit the impact rows of the local processes to the Scope3AI API",
+        description=(
+            "Listen on a Unix socket for the impact rows of the processes "
+            "initialized with the `collector` option, and submit them in "
+            "batches. The API is configured with the SCOPE3AI_* environment "
+            "variables."
+        ),
+    )
+    collector.add_argument(
+        "--socket",
+        default=os.getenv("SCOPE3AI_COLLECTOR"),
+        help=(
+            "Path of the Unix socket (default: SCOPE3AI_COLLECTOR, or "
+            "scope3ai.sock in XDG_RUNTIME_DIR, or in a directory private to "
+            "the user in the temporary directory)"
+        ),
+    )
+    collector.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args = parser.parse_args(argv)
+
+    if args.command == "collector":
+        path = args.socket or default_socket_path()
+        run_collector(path, enable_debug_logging=args.debug)
@@ -0,0 +1,244 @@
+"""
+Exporters of the impact rows: the Scope3AI HTTP API, where their impact is
+computed, and copies written to a file, to the standard output or kept in
+memory.
+"""
+
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import IO, List, Optional
+
+from .api.client import AsyncClient, Client
+from .api.types import ImpactRequest, ImpactRow, ModeledRow
+
+logger = logging.getLogger("scope3ai.exporters")
+
+
+class Exporter:
+    """
+    Base class of the exporters of the impact rows.
+
+    The rows are exported in batches with `export`, called from the background
+    worker, or `aexport` from an event loop. An exporter computing the impact
+    of the rows returns them, in the same order as the rows, the others
+    return None.
+    """
+
+    def export(self, rows: List[ImpactRow]) -> Optional[List[ModeledRow]]:
+        raise NotImplementedError
+
+    async def aexport(self, rows: List[ImpactRow]) -> Optional[List[ModeledRow]]:
+        return self.export(rows)
+
+    def flush(self) -> None:
+        """
+        Write the rows buffered by the exporter, if any.
+        """
+
+    def close(self) -> None:
+        self.flush()
+
+    def _before_fork(self) -> None:
+        pass
+
+    def _after_fork_in_parent(self) -> None:
+        pass
+
+    def _after_fork_in_child(self) -> None:
+        pass
+
+
+class ApiExporter(Exporter):
+    """
+    Submit the impact rows to the Scope3AI HTTP API and return their impact.
+
+    Args:
+        client (Client): The client of the API.
+        async_client (AsyncClient, optional): The async client of the API used
+            by `aexport`.
+    """
+
+    def __init__(self, client: Client, async_client: Optional[AsyncClient] = None):
+        self.client = client
+        self.async_client = async_client
+
+    def export(self, rows: List[ImpactRow], hedge: bool = False) -> List[ModeledRow]:
+        response = self.client.get_impact(
+            content=ImpactRequest(rows=rows), with_response=True, hedge=hedge
+        )
+        return response.rows
+
+    async def aexport(
+        self, rows: List[ImpactRow], hedge: bool = False
+    ) -> List[ModeledRow]:
+        assert self.async_client is not None
+        response = await self.async_client.get_impact(
+            content=ImpactRequest(rows=rows), with_response=True, hedge=hedge
+        )
+        return response.rows
+
+
+def _dump_rows(rows: List[ImpactRow]) -> str:
+    return "".join(row.model_dump_json(exclude_unset=True) + "\n" for row in rows)
+
+
+class FileExporter(Exporter):
+    """
+    Append the impact rows to a newline-delimited JSON file, to be shipped
+    in bulk later.
+
+    The rows are buffered in memory and written by whole lines once
+    `buffer_size` bytes are reached, on `flush` and on `close`. Once the file
+    is larger than `max_bytes`, it is renamed with the suffix ".1", the
+    previous ".1" file to ".2" and so on, up to `backup_count` files. A
+    forked process writes to its own file, named after its pid.
+
+    Args:
+        path (str): Path of the file, its directory is created if needed.
+        max_bytes (int, optional): Size in bytes above which the file is
+            rotated, 0 to never rotate it. Defaults to 100 MiB.
+        backup_count (int, optional): Number of rotated files kept.
+            Defaults to 5.
+        buffer_size (int, optional): Size in bytes of the rows buffered before
+            being written. Defaults to 64 KiB.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 100 * 1024 * 1024,
+        backup_count: int = 5,
+        buffer_size: int = 64 * 1024,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._fd: Optional[IO[bytes]] = None
+
+    def export(self, rows: List[ImpactRow]) -> None:
+        data = _dump_rows(rows).encode("utf-8")
+        with self._lock:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_size:
+                self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write()
+            if self._fd is not None:
+                self._fd.close()
+                self._fd = None
+
+    def _write(self) -> None:
+        # must be called with the lock held
+        if not self._buffer:
+            return
+        if self._fd is None:
+            # unbuffered, so every write appends whole lines
+            self._fd = self.path.open("ab", buffering=0)
+        self._fd.write(b"".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+        if self.max_bytes > 0 and self._fd.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._fd.close()
+        self._fd = None
+        if self.backup_count <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the buffered rows are written by the parent process
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self.path = self.path.with_name(
+            f"{self.path.stem}-{os.getpid()}{self.path.suffix}"
+        )
+
+
+class StdoutExporter(Exporter):
+    """
+    Write the impact rows to the standard output as newline-delimited JSON.
+
+    Args:
+        stream (IO[str], optional): Stream written instead of the standard
+            output.
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None) -> None:
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, rows: List[ImpactRow]) -> None:
+        stream = self.stream or sys.stdout
+        data = _dump_rows(rows)
+        with self._lock:
+            stream.write(data)
+            stream.flush()
+
+    def _after_fork_in_child(self) -> None:
+        self._lock = threading.Lock()
+
+
+class MemoryExporter(Exporter):
+    """
+    Keep the impact rows in memory, in `rows`, for tests and benchmarks
+    without a network.
+
+    Args:
+        impact (ModeledRow, optional): Impact returned for every row, so that
+            the contexts are resolved as with the API. Defaults to None.
+    """
+
+    def __init__(self, impact: Optional[ModeledRow] = None) -> None:
+        self.impact = impact
+        self.rows: List[ImpactRow] = []
+        self._lock = threading.Lock()
+
+    def export(self, rows: List[ImpactRow]) -> Optional[List[ModeledRow]]:
+        with self._lock:
+            self.rows.extend(rows)
+        if self.impact is None:
+            return None
+        return [self.impact] * len(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.rows = []
+
+    def _after_fork_in_child(self) -> None:
+        self._lock = threading.Lock()
+
+
+# exporters selected by name, with the `exporters` option of Scope3AI.init
+EXPORTERS = ["api", "file", "stdout", "memory"]
@@ -0,0 +1,144 @@
+"""
+Latency histograms of the stages of the submission pipeline, aggregated from
+the timestamps recorded on every `Scope3AIContext`.
+"""
+
+import bisect
+import threading
+from typing import Dict, Optional, Tuple
+
+from .api.types import Scope3AIContext
+
+# stages of the submission pipeline, between two timestamps of a context
+STAGES: Dict[str, Tuple[str, str]] = {
+    # the instrumented call, and the building of its row
+    "call": ("started", "built"),
+    # waiting in the background queue
+    "queue": ("enqueued", "dequeued"),
+    # waiting for the batch to be sent: linger, gate, copy exporters
+    "batch": ("dequeued", "sent"),
+    # the request to the API, including the retries and the response parsing
+    "request": ("sent", "received"),
+    # resolving the contexts of the batch
+    "dispatch": ("received", "resolved"),
+    # from the row built to its impact set
+    "pipeline": ("built", "resolved"),
+}
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    float("inf"),
+)
+
+
+def stage_durations(ctx: Scope3AIContext) -> Dict[str, float]:
+    """
+    Return the duration in seconds of the stages reached by a context.
+    """
+    durations = {}
+    for stage, (start, end) in STAGES.items():
+        started = ctx._timestamps.get(start)
+        ended = ctx._timestamps.get(end)
+        if started is not None and ended is not None:
+            durations[stage] = ended - started
+    return durations
+
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        # upper bound of the bucket of the quantile, the max for the last one
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+
+class LatencyHistograms:
+    """
+    Histograms of the time spent by the impact rows in every stage of the
+    submission pipeline (`STAGES`), in seconds, with buckets of fixed bounds
+    (`BUCKETS`).
+
+    A context is recorded once resolved, its stages with both timestamps
+    known are added to the histograms.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms = {stage: _Histogram() for stage in STAGES}
+
+    def record(self, ctx: Scope3AIContext) -> None:
+        durations = stage_durations(ctx)
+        with self._lock:
+            for stage, duration in durations.items():
+                self._histograms[stage].add(max(0.0, duration))
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Return for every stage the `count`, `sum` and `max` of the durations,
+        their estimated `p50` and `p99`, and the `buckets` as a list of
+        (upper bound, count) pairs.
+        """
+        with self._lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "max": histogram.max,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": list(zip(BUCKETS, histogram.counts)),
+                }
+                for stage, histogram in self._histograms.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {stage: _Histogram() for stage in STAGES}
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the child reports its own latencies
+        self._lock = threading.Lock()
+        self._histograms = {stage: _Histogram() for stage in STAGES}
@@ -1,20 +1,76 @@
+import asyncio
 import atexit
 import importlib.util
 import logging
+import os
+import random
+import threading
+import weakref
 from contextlib import contextmanager
 from contextvars import ContextVar
 from datetime import datetime, timezone
-from functools import partial
 from os import getenv
-from typing import List, Optional
+from time import monotonic
+from typing import Dict, List, Optional, Tuple, Union
 from uuid import uuid4
 
-from .api.client import AsyncClient, Client
-from .api.defaults import DEFAULT_API_URL, DEFAULT_APPLICATION_ID
+import httpx
+from pydantic import ValidationError
+
+from .api.client import AsyncClient, CircuitOpenError, Client, ConnectionWarmer
+from .api.compression import ENCODINGS
+from .api.defaults import (
+    DEFAULT_API_URL,
+    DEFAULT_APPLICATION_ID,
+    DEFAULT_BATCH_LINGER,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+    DEFAULT_CIRCUIT_BREAKER_TIMEOUT,
+    DEFAULT_COMPRESSION_THRESHOLD,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_DEDUPE_SIZE,
+    DEFAULT_HEDGE_MAX_RATIO,
+    DEFAULT_KEEPALIVE_EXPIRY,
+    DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_QUEUE_POLICY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUEUE_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_SHUTDOWN_TIMEOUT,
+    DEFAULT_SUBMITTER,
+    DEFAULT_TENANT_QUEUE_SIZE,
+)
+from .api.concurrency import AdaptiveConcurrencyLimit
+from .api.endpoints import EndpointPool
+from .api.hedging import HedgingPolicy
+from .api.ratelimit import RateLimiter
+from .api.retry import CircuitBreaker, RetryPolicy, is_rejected_request
 from .api.tracer import Tracer
-from .api.types import ImpactRequest, ImpactResponse, ImpactRow, Scope3AIContext
+from .api.types import ImpactRow, ModeledRow, Scope3AIContext
+from .collector import CollectorClient
 from .constants import CLIENTS
-from .worker import BackgroundWorker
+from .exporters import (
+    EXPORTERS,
+    ApiExporter,
+    Exporter,
+    FileExporter,
+    MemoryExporter,
+    StdoutExporter,
+)
+from .latency import LatencyHistograms
+from .rollup import Rollup
+from .spool import AckedSet, Spool
+from .worker import (
+    POLICIES,
+    POLICY_SPILL,
+    AsyncBatchWorker,
+    BackgroundWorker,
+    BatchWorker,
+    EventLoopBatcher,
+)
 
 logger = logging.getLogger("scope3ai.lib")
 
@@ -97,15 +153,67 @@ _INSTRUMENTS = {
 # TODO what it means / why reinit is allowed here
 _RE_INIT_CLIENTS = [CLIENTS.RESPONSE.value]
 
+# engines available to submit the impact rows in background
+_SUBMITTERS = ["thread", "asyncio"]
+
 
 def generate_id() -> str:
     return uuid4().hex
 
 
+def _get_option(value, name: str, default, cast):
+    # option passed to init, then environment variable, then default value
+    if value is not None:
+        return value
+    env_value = getenv(name)
+    if not env_value:
+        return default
+    return cast(env_value)
+
+
+def _mark(contexts: List[Scope3AIContext], stage: str) -> None:
+    now = monotonic()
+    for ctx in contexts:
+        ctx._timestamps[stage] = now
+
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    # "tenant=weight,tenant=weight"
+    weights = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        tenant, _, weight = item.rpartition("=")
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
+def _check_row(row: ImpactRow) -> None:
+    # the tracers fill the rows field by field, without validation: check
+    # them against the API schema before they are batched with other rows
+    ImpactRow.model_validate(row.model_dump(exclude_unset=True, warnings=False))
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
 class Scope3AIError(Exception):
     pass
 
 
+def _check_sample_rate(sample_rate: float) -> None:
+    if not 0 < sample_rate <= 1:
+        raise Scope3AIError("The sample_rate option must be between 0 (excluded) and 1")
+
+
 class Scope3AI:
     """
     Scope3AI tracer class
@@ -116,6 +224,8 @@ class Scope3AI:
 
     _instance: Optional["Scope3AI"] = None
     _tracer: ContextVar[List[Tracer]] = ContextVar("tracer", default=[])
+    # weight of the rows of the instrumented call running, set when sampled
+    _sample_weight: ContextVar[float] = ContextVar("sample_weight", default=1.0)
     _worker: Optional[BackgroundWorker] = None
     _clients: List[str] = []
     _keep_tracers: bool = False
@@ -128,9 +238,61 @@ class Scope3AI:
     def __init__(self):
         self.api_key: Optional[str] = None
         self.api_url: Optional[str] = None
+        self.api_urls: Optional[List[str]] = None
+        self._endpoints: Optional[EndpointPool] = None
         self.sync_mode: bool = False
+        self.async_deferred: bool = False
+        # deferred async submission, one batcher per event loop
+        self._deferred: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.batch_size: int = DEFAULT_BATCH_SIZE
+        self.batch_linger: float = DEFAULT_BATCH_LINGER
+        self.submitter: str = DEFAULT_SUBMITTER
+        self.concurrency: int = DEFAULT_CONCURRENCY
+        self.adaptive_concurrency: bool = False
+        self._concurrency_limit: Optional[AdaptiveConcurrencyLimit] = None
+        self._claim_lock = threading.Lock()
+        self._closing = False
+        self.queue_size: int = DEFAULT_QUEUE_SIZE
+        self.queue_policy: str = DEFAULT_QUEUE_POLICY
+        self.queue_timeout: float = DEFAULT_QUEUE_TIMEOUT
+        self.fair_queueing: bool = False
+        self.tenant_weights: Dict[str, float] = {}
+        self.tenant_queue_size: int = DEFAULT_TENANT_QUEUE_SIZE
+        self.spool_path: Optional[str] = None
+        self.durable: bool = False
+        self.max_retries: int = DEFAULT_MAX_RETRIES
+        self.circuit_breaker_threshold: int = DEFAULT_CIRCUIT_BREAKER_THRESHOLD
+        self.circuit_breaker_timeout: float = DEFAULT_CIRCUIT_BREAKER_TIMEOUT
+        self._circuit_breaker: Optional[CircuitBreaker] = None
+        self.requests_per_second: Optional[float] = None
+        self.rows_per_second: Optional[float] = None
+        self._rate_limiter: Optional[RateLimiter] = None
+        self.hedge_percentile: Optional[float] = None
+        self.hedge_max_ratio: float = DEFAULT_HEDGE_MAX_RATIO
+        self._hedging: Optional[HedgingPolicy] = None
+        self.compression: Optional[str] = None
+        self.compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD
+        self.http2: bool = False
+        self.prewarm_connections: int = 0
+        self._warmer: Optional[ConnectionWarmer] = None
+        self.collector: Optional[str] = None
+        self.sample_rate: float = 1.0
+        self.shutdown_timeout: Optional[float] = DEFAULT_SHUTDOWN_TIMEOUT
+        self.rollup_window: Optional[float] = None
+        self._rollup: Optional[Rollup] = None
+        self.dedupe_size: int = DEFAULT_DEDUPE_SIZE
+        self._acked: Optional[AckedSet] = None
+        self._collector_client: Optional[CollectorClient] = None
+        self._spool: Optional[Spool] = None
         self._sync_client: Optional[Client] = None
         self._async_client: Optional[AsyncClient] = None
+        self.export_path: Optional[str] = None
+        self._exporters: List[Exporter] = []
+        # the exporter resolving the contexts, the others get copies
+        self._exporter: Optional[Exporter] = None
+        self._copy_exporters: List[Exporter] = []
+        self.latency_histograms: bool = False
+        self._latency: Optional[LatencyHistograms] = None
         self.environment: Optional[str] = None
         self.client_id: Optional[str] = None
         self.project_id: Optional[str] = None
@@ -141,7 +303,9 @@ class Scope3AI:
         cls,
         api_key: Optional[str] = None,
         api_url: Optional[str] = None,
+        api_urls: Optional[List[str]] = None,
         sync_mode: bool = False,
+        async_deferred: bool = False,
         enable_debug_logging: bool = False,
         # we have provider_clients and not clients naming here because client also has client_id which is not a [provider] client but a [scope3] client
         provider_clients: Optional[List[str]] = None,
@@ -150,6 +314,59 @@ class Scope3AI:
         client_id: Optional[str] = None,
         project_id: Optional[str] = None,
         application_id: Optional[str] = None,
+        # batching of the impact requests sent by the background worker
+        batch_size: Optional[int] = None,
+        batch_linger: Optional[float] = None,
+        submitter: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        adaptive_concurrency: bool = False,
+        # backpressure of the background queue
+        queue_size: Optional[int] = None,
+        queue_policy: Optional[str] = None,
+        queue_timeout: Optional[float] = None,
+        fair_queueing: bool = False,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        tenant_queue_size: Optional[int] = None,
+        spool_path: Optional[str] = None,
+        durable: bool = False,
+        # resilience of the API requests
+        max_retries: Optional[int] = None,
+        circuit_breaker_threshold: Optional[int] = None,
+        circuit_breaker_timeout: Optional[float] = None,
+        # rate limiting of the API requests
+        requests_per_second: Optional[float] = None,
+        rows_per_second: Optional[float] = None,
+        # hedging of the impact requests
+        hedge_percentile: Optional[float] = None,
+        hedge_max_ratio: Optional[float] = None,
+        # compression of the API request bodies
+        compression: Optional[str] = None,
+        compression_threshold: Optional[int] = None,
+        # http transport of the API clients
+        http2: bool = False,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+        prewarm_connections: Optional[int] = None,
+        # local collector
+        collector: Union[str, bool, None] = None,
+        # sampling
+        sample_rate: Optional[float] = None,
+        # shutdown
+        shutdown_timeout: Optional[float] = None,
+        # rollup of the impact rows
+        rollup_window: Optional[float] = None,
+        # deduplication of the impact rows
+        dedupe_size: Optional[int] = None,
+        # exporters of the impact rows
+        exporters: Optional[List[Union[str, Exporter]]] = None,
+        export_path: Optional[str] = None,
+        # latency of the submission pipeline
+        latency_histograms: bool = False,
     ) -> "Scope3AI":
         """
         Initialize the Scope3AI SDK with the provided configuration settings.
@@ -159,8 +376,19 @@ class Scope3AI:
                 environment variable. Required for authentication.
             api_url (str, optional): The base URL for the Scope3AI API. Can be set via
                 `SCOPE3AI_API_URL` environment variable. Defaults to standard API URL.
+            api_urls (List[str], optional): Base URLs of several API endpoints
+                serving the same requests, for instance in several regions, used
+                instead of `api_url`. The requests are sent to the healthy
+                endpoint with the lowest latency, and fail over to the others
+                when it fails. Can be set via `SCOPE3AI_API_URLS` environment
+                variable, comma separated. Defaults to None.
             sync_mode (bool, optional): If True, the SDK will operate synchronously. Can be
                 set via `SCOPE3AI_SYNC_MODE` environment variable. Defaults to False.
+            async_deferred (bool, optional): In sync mode, the async submissions
+                return right away, and the rows are submitted in batches by
+                background tasks of the event loop of the caller. The impact is
+                available once `await_impact` returns. Can be set via
+                `SCOPE3AI_ASYNC_DEFERRED` environment variable. Defaults to False.
             enable_debug_logging (bool, optional): Enable debug level logging. Can be set via
                 `SCOPE3AI_DEBUG_LOGGING` environment variable. Defaults to False.
             clients (List[str], optional): List of provider clients to instrument. If None,
@@ -173,6 +401,176 @@ class Scope3AI:
                 `SCOPE3AI_PROJECT_ID` environment variable.
             application_id (str, optional): Application identifier. Can be set via
                 `SCOPE3AI_APPLICATION_ID` environment variable. Defaults to "default".
+            batch_size (int, optional): Maximum number of impact rows sent in a single
+                request by the background worker (1 to 1000). Can be set via
+                `SCOPE3AI_BATCH_SIZE` environment variable. Defaults to 1000.
+            batch_linger (float, optional): Time in seconds the background worker waits
+                for more rows before sending a batch. Can be set via
+                `SCOPE3AI_BATCH_LINGER` environment variable. Defaults to 0, which
+                only coalesces rows that are already pending.
+            submitter (str, optional): Engine used to submit the impact rows in
+                background, either "thread" (one blocking request at a time) or
+                "asyncio" (concurrent requests from a dedicated event loop). Can be
+                set via `SCOPE3AI_SUBMITTER` environment variable. Defaults to "thread".
+            concurrency (int, optional): Maximum number of impact requests in flight
+                with the "asyncio" submitter. Can be set via `SCOPE3AI_CONCURRENCY`
+                environment variable. Defaults to 8.
+            adaptive_concurrency (bool, optional): Adapt the number of impact
+                requests in flight to the observed API latency, between 1 and
+                `concurrency`. Applies to the "asyncio" submitter and to the sync
+                mode. Can be set via `SCOPE3AI_ADAPTIVE_CONCURRENCY` environment
+                variable. Defaults to False.
+            queue_size (int, optional): Maximum number of impact rows waiting in the
+                background queue, 0 for unbounded. Can be set via `SCOPE3AI_QUEUE_SIZE`
+                environment variable. Defaults to 0.
+            queue_policy (str, optional): What to do with a new impact row when the
+                queue is full: "block" (wait up to `queue_timeout`, then drop),
+                "drop_newest", "drop_oldest" or "spill" (write it to the spool to be
+                submitted later). Dropped or spilled rows have their context resolved
+                with an error. Can be set via `SCOPE3AI_QUEUE_POLICY` environment
+                variable. Defaults to "drop_newest".
+            queue_timeout (float, optional): Time in seconds to wait for room in the
+                queue with the "block" policy. Can be set via `SCOPE3AI_QUEUE_TIMEOUT`
+                environment variable. Defaults to 1.
+            fair_queueing (bool, optional): Queue the impact rows of every tenant,
+                identified by the `client_id` and `project_id` of the rows, apart,
+                and submit them with weighted round-robin, so a busy tenant does
+                not delay the rows of the others. Not used in sync mode. Can be
+                set via `SCOPE3AI_FAIR_QUEUEING` environment variable. Defaults
+                to False.
+            tenant_weights (dict, optional): Weight of the tenants with fair
+                queueing, keyed by "client_id/project_id" or by client_id. A
+                tenant of weight 2 gets twice as many rows submitted as a tenant
+                of weight 1. Can be set via `SCOPE3AI_TENANT_WEIGHTS` environment
+                variable as "tenant=weight,tenant=weight". Defaults to 1 for all
+                the tenants.
+            tenant_queue_size (int, optional): Maximum number of impact rows of a
+                tenant waiting in the queue with fair queueing, 0 for unbounded.
+                The queue policy applies to the rows of a tenant over it, without
+                waiting with the "block" policy. Can be set via
+                `SCOPE3AI_TENANT_QUEUE_SIZE` environment variable. Defaults to 0.
+            spool_path (str, optional): Directory of the on-disk spool used by the
+                "spill" policy and the durable mode. Can be set via
+                `SCOPE3AI_SPOOL_PATH` environment variable.
+            durable (bool, optional): If True, every impact row is written to the
+                spool before being queued, and removed once acknowledged by the API.
+                Rows left unacknowledged, for instance when the process is killed,
+                are submitted again by the next process using the same spool. Can be
+                set via `SCOPE3AI_DURABLE` environment variable. Defaults to False.
+            max_retries (int, optional): Maximum number of retries of an API request
+                failing with a server error, a rate limiting or a network error, with
+                exponential backoff and jitter. Can be set via `SCOPE3AI_MAX_RETRIES`
+                environment variable. Defaults to 3.
+            circuit_breaker_threshold (int, optional): Number of consecutive failed
+                API requests after which no request is sent until the API is probed
+                healthy again, 0 to disable. Can be set via
+                `SCOPE3AI_CIRCUIT_BREAKER_THRESHOLD` environment variable. Defaults
+                to 5.
+            circuit_breaker_timeout (float, optional): Time in seconds before probing
+                the API once the circuit breaker is open. Can be set via
+                `SCOPE3AI_CIRCUIT_BREAKER_TIMEOUT` environment variable. Defaults to 30.
+            requests_per_second (float, optional): Maximum number of requests per
+                second sent to the API. While waiting, the background worker keeps
+                batching the impact rows. Can be set via
+                `SCOPE3AI_REQUESTS_PER_SECOND` environment variable. No limit by
+                default.
+            rows_per_second (float, optional): Maximum number of impact rows per
+                second sent to the API. Can be set via `SCOPE3AI_ROWS_PER_SECOND`
+                environment variable. No limit by default.
+            hedge_percentile (float, optional): Enable the hedging of the impact
+                requests of priority rows, and of rows whose impact is waited for:
+                a request not answered after this percentile (between 0 and 1) of
+                the recent latencies is sent again, and the first response is
+                used. Can be set via `SCOPE3AI_HEDGE_PERCENTILE` environment
+                variable. Defaults to None (disabled).
+            hedge_max_ratio (float, optional): Maximum ratio of hedged requests
+                over all the requests. Can be set via `SCOPE3AI_HEDGE_MAX_RATIO`
+                environment variable. Defaults to 0.05.
+            compression (str, optional): Compress the API request bodies with "gzip" or
+                "zstd" (requires the `zstandard` package, falls back to gzip). Can be
+                set via `SCOPE3AI_COMPRESSION` environment variable. Defaults to no
+                compression.
+            compression_threshold (int, optional): Minimum size in bytes of a request
+                body to be compressed. Can be set via `SCOPE3AI_COMPRESSION_THRESHOLD`
+                environment variable. Defaults to 1024.
+            http2 (bool, optional): Use HTTP/2 to multiplex the API requests over a
+                single connection, requires the `h2` package. Can be set via
+                `SCOPE3AI_HTTP2` environment variable. Defaults to False.
+            max_connections (int, optional): Maximum number of connections to the API
+                per client. Can be set via `SCOPE3AI_MAX_CONNECTIONS` environment
+                variable. Defaults to 100.
+            max_keepalive_connections (int, optional): Maximum number of idle
+                connections kept alive per client. Can be set via
+                `SCOPE3AI_MAX_KEEPALIVE_CONNECTIONS` environment variable. Defaults
+                to 20.
+            keepalive_expiry (float, optional): Time in seconds an idle connection is
+                kept alive. Can be set via `SCOPE3AI_KEEPALIVE_EXPIRY` environment
+                variable. Defaults to 5.
+            connect_timeout (float, optional): Timeout in seconds to establish a
+                connection to the API. Can be set via `SCOPE3AI_CONNECT_TIMEOUT`
+                environment variable. Defaults to 5.
+            read_timeout (float, optional): Timeout in seconds to read, write or wait
+                for a pooled connection. Can be set via `SCOPE3AI_READ_TIMEOUT`
+                environment variable. Defaults to 30.
+            transport (httpx.BaseTransport, optional): Custom httpx transport of the
+                synchronous client. Also used by the asynchronous clients if it is an
+                `httpx.AsyncBaseTransport` too, like `httpx.MockTransport`.
+            async_transport (httpx.AsyncBaseTransport, optional): Custom httpx
+                transport of the asynchronous clients.
+            prewarm_connections (int, optional): Number of connections to the API
+                opened in background at init, and opened again once they expired
+                while idle, so the first impact requests do not pay for the
+                connection setup. Used by the synchronous client, that is the
+                `thread` submitter and the sync mode, not with a collector. Can be
+                set via `SCOPE3AI_PREWARM_CONNECTIONS` environment variable.
+                Defaults to 0 (disabled).
+            collector (str, optional): Path of the Unix socket of a local collector
+                (started with `scope3ai collector`). The impact rows are sent to
+                the collector, which batches the rows of all the processes of the
+                host and submits them to the API. Not used in sync mode. Can be
+                set via `SCOPE3AI_COLLECTOR` environment variable. False submits
+                the rows directly even if the variable is set, as the collector
+                itself does.
+            sample_rate (float, optional): Fraction of the calls of the instrumented
+                clients that are submitted, between 0 (excluded) and 1. The calls
+                not sampled are not instrumented at all, and the tracer impacts are
+                extrapolated from the sampled ones. Can be overridden per tracer.
+                Can be set via `SCOPE3AI_SAMPLE_RATE` environment variable.
+                Defaults to 1.
+            shutdown_timeout (float, optional): Time in seconds given to the
+                background worker to submit the pending impact rows when the
+                process exits or `close()` is called, 0 to wait forever. The rows left are written to
+                the spool if any, otherwise they are lost. Can be set via
+                `SCOPE3AI_SHUTDOWN_TIMEOUT` environment variable. Defaults to 10.
+            rollup_window (float, optional): Time window in seconds over which the
+                impact rows with the same model, service and metadata are merged
+                into a single row before being submitted, summing their tokens,
+                audio durations, request durations and costs. The impact of the
+                merged row is shared between the calls once the window is over.
+                Not used in sync mode. Can be set via `SCOPE3AI_ROLLUP_WINDOW`
+                environment variable. Defaults to None (disabled).
+            dedupe_size (int, optional): Number of the most recently acknowledged
+                `request_id` remembered, the rows submitted again with one of them,
+                by a retry or a spool replay, are skipped. 0 to disable. Can be set
+                via `SCOPE3AI_DEDUPE_SIZE` environment variable. Defaults to 10000.
+            exporters (List[str | Exporter], optional): Where the impact rows are
+                exported, by name ("api", "file", "stdout", "memory") or as
+                `Exporter` instances. The rows are submitted to the API if "api"
+                is listed, and copied to the other exporters, otherwise the
+                first exporter resolves the contexts, with the impacts it
+                returns or an error of code "exported". Not used with a
+                collector, which exports the rows itself. Can be set via
+                `SCOPE3AI_EXPORTERS` environment variable, comma separated.
+                Defaults to ["api"].
+            export_path (str, optional): Path of the newline-delimited JSON file
+                written by the "file" exporter, rotated once it reaches 100 MiB.
+                Can be set via `SCOPE3AI_EXPORT_PATH` environment variable.
+            latency_histograms (bool, optional): Aggregate the time spent by the
+                impact rows in every stage of the submission pipeline (queue,
+                batch, request...) in histograms, reported by `stats()`. The
+                timestamps of the stages are recorded on every context anyway.
+                Can be set via `SCOPE3AI_LATENCY_HISTOGRAMS` environment
+                variable. Defaults to False.
 
         Returns:
             Scope3AI: The initialized Scope3AI instance.
@@ -185,7 +583,15 @@ class Scope3AI:
         cls._instance = self = Scope3AI()
         self.api_key = api_key or getenv("SCOPE3AI_API_KEY")
         self.api_url = api_url or getenv("SCOPE3AI_API_URL") or DEFAULT_API_URL
+        self.api_urls = _get_option(api_urls, "SCOPE3AI_API_URLS", None, _parse_list)
+        if self.api_urls:
+            self.api_url = self.api_urls[0]
+            if len(self.api_urls) > 1:
+                self._endpoints = EndpointPool(self.api_urls)
         self.sync_mode = sync_mode or bool(getenv("SCOPE3AI_SYNC_MODE", False))
+        self.async_deferred = async_deferred or bool(
+            getenv("SCOPE3AI_ASYNC_DEFERRED", False)
+        )
         if not self.api_key:
             raise Scope3AIError(
                 "The scope3 api_key option must be set either by "
@@ -209,6 +615,225 @@ class Scope3AI:
             or DEFAULT_APPLICATION_ID
         )
 
+        # batching
+        self.batch_size = _get_option(
+            batch_size, "SCOPE3AI_BATCH_SIZE", DEFAULT_BATCH_SIZE, int
+        )
+        self.batch_linger = _get_option(
+            batch_linger, "SCOPE3AI_BATCH_LINGER", DEFAULT_BATCH_LINGER, float
+        )
+        if not 1 <= self.batch_size <= DEFAULT_BATCH_SIZE:
+            raise Scope3AIError(
+                f"The batch_size option must be between 1 and {DEFAULT_BATCH_SIZE}"
+            )
+        self.submitter = _get_option(
+            submitter, "SCOPE3AI_SUBMITTER", DEFAULT_SUBMITTER, str
+        )
+        if self.submitter not in _SUBMITTERS:
+            raise Scope3AIError(
+                f"The submitter option must be one of {', '.join(_SUBMITTERS)}"
+            )
+        self.concurrency = _get_option(
+            concurrency, "SCOPE3AI_CONCURRENCY", DEFAULT_CONCURRENCY, int
+        )
+        self.adaptive_concurrency = adaptive_concurrency or bool(
+            getenv("SCOPE3AI_ADAPTIVE_CONCURRENCY", False)
+        )
+        if self.adaptive_concurrency:
+            self._concurrency_limit = AdaptiveConcurrencyLimit(
+                max_limit=self.concurrency
+            )
+
+        # backpressure
+        self.queue_size = _get_option(
+            queue_size, "SCOPE3AI_QUEUE_SIZE", DEFAULT_QUEUE_SIZE, int
+        )
+        self.queue_policy = _get_option(
+            queue_policy, "SCOPE3AI_QUEUE_POLICY", DEFAULT_QUEUE_POLICY, str
+        )
+        self.queue_timeout = _get_option(
+            queue_timeout, "SCOPE3AI_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT, float
+        )
+        self.fair_queueing = fair_queueing or bool(
+            getenv("SCOPE3AI_FAIR_QUEUEING", False)
+        )
+        self.tenant_weights = _get_option(
+            tenant_weights, "SCOPE3AI_TENANT_WEIGHTS", {}, _parse_weights
+        )
+        if any(weight <= 0 for weight in self.tenant_weights.values()):
+            raise Scope3AIError("The tenant_weights option must be positive")
+        self.tenant_queue_size = _get_option(
+            tenant_queue_size,
+            "SCOPE3AI_TENANT_QUEUE_SIZE",
+            DEFAULT_TENANT_QUEUE_SIZE,
+            int,
+        )
+        self.spool_path = spool_path or getenv("SCOPE3AI_SPOOL_PATH")
+        if self.queue_policy not in POLICIES:
+            raise Scope3AIError(
+                f"The queue_policy option must be one of {', '.join(POLICIES)}"
+            )
+        self.durable = durable or bool(getenv("SCOPE3AI_DURABLE", False))
+        if self.queue_policy == POLICY_SPILL and not self.spool_path:
+            raise Scope3AIError(
+                "The spill queue policy requires the spool_path option to be set"
+            )
+        if self.durable and not self.spool_path:
+            raise Scope3AIError(
+                "The durable mode requires the spool_path option to be set"
+            )
+
+        # resilience
+        self.max_retries = _get_option(
+            max_retries, "SCOPE3AI_MAX_RETRIES", DEFAULT_MAX_RETRIES, int
+        )
+        self.circuit_breaker_threshold = _get_option(
+            circuit_breaker_threshold,
+            "SCOPE3AI_CIRCUIT_BREAKER_THRESHOLD",
+            DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+            int,
+        )
+        self.circuit_breaker_timeout = _get_option(
+            circuit_breaker_timeout,
+            "SCOPE3AI_CIRCUIT_BREAKER_TIMEOUT",
+            DEFAULT_CIRCUIT_BREAKER_TIMEOUT,
+            float,
+        )
+        if self.circuit_breaker_threshold > 0:
+            self._circuit_breaker = CircuitBreaker(
+                failure_threshold=self.circuit_breaker_threshold,
+                reset_timeout=self.circuit_breaker_timeout,
+            )
+
+        # rate limiting
+        self.requests_per_second = _get_option(
+            requests_per_second, "SCOPE3AI_REQUESTS_PER_SECOND", None, float
+        )
+        self.rows_per_second = _get_option(
+            rows_per_second, "SCOPE3AI_ROWS_PER_SECOND", None, float
+        )
+        if self.requests_per_second or self.rows_per_second:
+            self._rate_limiter = RateLimiter(
+                requests_per_second=self.requests_per_second,
+                rows_per_second=self.rows_per_second,
+            )
+
+        # hedging
+        self.hedge_percentile = _get_option(
+            hedge_percentile, "SCOPE3AI_HEDGE_PERCENTILE", None, float
+        )
+        self.hedge_max_ratio = _get_option(
+            hedge_max_ratio,
+            "SCOPE3AI_HEDGE_MAX_RATIO",
+            DEFAULT_HEDGE_MAX_RATIO,
+            float,
+        )
+        if self.hedge_percentile is not None:
+            if not 0 < self.hedge_percentile < 1:
+                raise Scope3AIError(
+                    "The hedge_percentile option must be between 0 and 1 (excluded)"
+                )
+            self._hedging = HedgingPolicy(
+                percentile=self.hedge_percentile, max_ratio=self.hedge_max_ratio
+            )
+
+        # compression
+        self.compression = compression or getenv("SCOPE3AI_COMPRESSION")
+        if self.compression and self.compression not in ENCODINGS:
+            raise Scope3AIError(
+                f"The compression option must be one of {', '.join(ENCODINGS)}"
+            )
+        self.compression_threshold = _get_option(
+            compression_threshold,
+            "SCOPE3AI_COMPRESSION_THRESHOLD",
+            DEFAULT_COMPRESSION_THRESHOLD,
+            int,
+        )
+
+        # http transport
+        self.http2 = http2 or bool(getenv("SCOPE3AI_HTTP2", False))
+        limits = httpx.Limits(
+            max_connections=_get_option(
+                max_connections,
+                "SCOPE3AI_MAX_CONNECTIONS",
+                DEFAULT_MAX_CONNECTIONS,
+                int,
+            ),
+            max_keepalive_connections=_get_option(
+                max_keepalive_connections,
+                "SCOPE3AI_MAX_KEEPALIVE_CONNECTIONS",
+                DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                int,
+            ),
+            keepalive_expiry=_get_option(
+                keepalive_expiry,
+                "SCOPE3AI_KEEPALIVE_EXPIRY",
+                DEFAULT_KEEPALIVE_EXPIRY,
+                float,
+            ),
+        )
+        timeout = httpx.Timeout(
+            _get_option(
+                read_timeout, "SCOPE3AI_READ_TIMEOUT", DEFAULT_READ_TIMEOUT, float
+            ),
+            connect=_get_option(
+                connect_timeout,
+                "SCOPE3AI_CONNECT_TIMEOUT",
+                DEFAULT_CONNECT_TIMEOUT,
+                float,
+            ),
+        )
+        if async_transport is None and isinstance(transport, httpx.AsyncBaseTransport):
+            async_transport = transport
+
+        self.sample_rate = _get_option(sample_rate, "SCOPE3AI_SAMPLE_RATE", 1.0, float)
+        _check_sample_rate(self.sample_rate)
+
+        self.shutdown_timeout = _get_option(
+            shutdown_timeout,
+            "SCOPE3AI_SHUTDOWN_TIMEOUT",
+            DEFAULT_SHUTDOWN_TIMEOUT,
+            float,
+        )
+        if self.shutdown_timeout <= 0:
+            self.shutdown_timeout = None
+
+        self.rollup_window = _get_option(
+            rollup_window, "SCOPE3AI_ROLLUP_WINDOW", None, float
+        )
+        if self.rollup_window is not None:
+            if self.rollup_window <= 0:
+                raise Scope3AIError("The rollup_window option must be positive")
+            self._rollup = Rollup(self.rollup_window, self._enqueue)
+
+        self.dedupe_size = _get_option(
+            dedupe_size, "SCOPE3AI_DEDUPE_SIZE", DEFAULT_DEDUPE_SIZE, int
+        )
+        if self.dedupe_size > 0:
+            self._acked = AckedSet(self.dedupe_size)
+
+        self.latency_histograms = latency_histograms or bool(
+            getenv("SCOPE3AI_LATENCY_HISTOGRAMS", False)
+        )
+        if self.latency_histograms:
+            self._latency = LatencyHistograms()
+
+        if collector is False:
+            self.collector = None
+        else:
+            self.collector = collector or getenv("SCOPE3AI_COLLECTOR")
+        if self.collector:
+            self._collector_client = CollectorClient(
+                self.collector, self._on_collector_reply, self._fail_batch
+            )
+
+        if self.spool_path:
+            # a spilled segment must fit in the queue to be replayed
+            segment_size = self.batch_size
+            if self.queue_size > 0:
+                segment_size = min(segment_size, self.queue_size)
+            self._spool = Spool(self.spool_path, segment_size=segment_size)
+
         if enable_debug_logging:
             self._init_logging()
 
@@ -216,11 +841,42 @@ class Scope3AI:
         if clients is None:
             clients = list(_INSTRUMENTS.keys())
 
-        http_client_options = {"api_key": self.api_key, "api_url": self.api_url}
-        self._sync_client = Client(**http_client_options)
-        self._async_client = AsyncClient(**http_client_options)
+        http_client_options = {
+            "api_key": self.api_key,
+            "api_url": self.api_url,
+            "retry_policy": RetryPolicy(max_retries=self.max_retries),
+            # the circuit breaker is shared by all the clients
+            "circuit_breaker": self._circuit_breaker,
+            # and so are the rate limiter and the concurrency limit
+            "rate_limiter": self._rate_limiter,
+            "concurrency_limit": self._concurrency_limit,
+            "hedging": self._hedging,
+            # the health of the endpoints too
+            "endpoints": self._endpoints,
+            "compression": self.compression,
+            "compression_threshold": self.compression_threshold,
+            "http2": self.http2,
+            "limits": limits,
+            "timeout": timeout,
+        }
+        self._sync_client = Client(transport=transport, **http_client_options)
+        self._async_client = AsyncClient(
+            transport=async_transport, **http_client_options
+        )
+        self.prewarm_connections = _get_option(
+            prewarm_connections, "SCOPE3AI_PREWARM_CONNECTIONS", 0, int
+        )
+        if self.prewarm_connections > 0 and not self._collector_client:
+            self._warmer = ConnectionWarmer(
+                self._sync_client, self.prewarm_connections, limits.keepalive_expiry
+            )
+            self._warmer.start()
+        self._init_exporters(exporters, export_path)
         self._init_clients(clients)
         self._init_atexit()
+        if self._spool and self._spool.has_pending:
+            # submit the rows left in the spool by a previous process
+            self._ensure_worker()
         return cls._instance
 
     @classmethod
@@ -243,6 +899,7 @@ class Scope3AI:
     def submit_impact(
         self,
         impact_row: ImpactRow,
+        priority: bool = False,
     ) -> Scope3AIContext:
         """
         Submit an impact request to the Scope3 AI API.
@@ -253,45 +910,49 @@ class Scope3AI:
         Args:
             impact_row (ImpactRow): The impact request data
                 that needs to be submitted to the Scope3 AI API.
+            priority (bool, optional): Submit the row before the rows waiting in
+                the background queue, and never drop it. Rows are also promoted
+                once their impact is waited for. Defaults to False.
 
         Returns:
             Scope3AIContext: A context object containing the request data and
             the response from the API.
         """
 
-        def submit_impact(
-            impact_row: ImpactRow,
-            ctx: Scope3AIContext,
-        ) -> Optional[ImpactResponse]:
-            assert self._sync_client is not None
-            response = self._sync_client.get_impact(
-                content=ImpactRequest(rows=[impact_row]),
-                with_response=True,
-            )
-            ctx.set_impact(response.rows[0])
-            if ctx._tracer:
-                ctx._tracer._unlink_trace(ctx)
-            return response
-
         tracer = self.current_tracer
         self._fill_impact_row(impact_row, tracer, self.root_tracer)
-        ctx = Scope3AIContext(request=impact_row)
+        ctx = Scope3AIContext(
+            request=impact_row, sample_weight=self._sample_weight.get()
+        )
+        self._mark_built(ctx)
         ctx._tracer = tracer
         if tracer:
             tracer._link_trace(ctx)
 
         if self.sync_mode:
-            submit_impact(impact_row, ctx=ctx)
+            ctx._promoted = priority
+            if self._concurrency_limit:
+                self._concurrency_limit.acquire()
+            try:
+                self._submit_batch([ctx])
+            finally:
+                if self._concurrency_limit:
+                    self._concurrency_limit.release()
             return ctx
 
-        self._ensure_worker()
-        assert self._worker is not None
-        self._worker.submit(partial(submit_impact, impact_row=impact_row, ctx=ctx))
+        if self._rollup and not priority:
+            # an invalid row would fail the rolled up row of its window
+            if self._check_rows([ctx]):
+                self._rollup.add(ctx)
+            return ctx
+
+        self._enqueue(ctx, priority=priority)
         return ctx
 
     async def asubmit_impact(
         self,
         impact_row: ImpactRow,
+        priority: bool = False,
     ) -> Scope3AIContext:
         """
         Async version of Scope3AI::submit_impact.
@@ -301,26 +962,57 @@ class Scope3AI:
             # in non sync-mode, it uses the background worker,
             # and the background worker is not async (does not have to be).
             # so we just redirect the call to the sync version.
-            return self.submit_impact(impact_row)
+            return self.submit_impact(impact_row, priority=priority)
 
         tracer = self.current_tracer
         self._fill_impact_row(impact_row, tracer, self.root_tracer)
-        ctx = Scope3AIContext(request=impact_row)
+        ctx = Scope3AIContext(
+            request=impact_row, sample_weight=self._sample_weight.get()
+        )
+        self._mark_built(ctx)
         ctx._tracer = tracer
         if tracer:
             tracer._link_trace(ctx)
+        ctx._promoted = priority
 
-        assert self._async_client is not None
-        response = await self._async_client.get_impact(
-            content=ImpactRequest(rows=[impact_row]),
-            with_response=True,
-        )
-        ctx.set_impact(response.rows[0])
-        if tracer:
-            tracer._unlink_trace(ctx)
+        if self.async_deferred:
+            self._get_deferred().submit(ctx)
+            return ctx
 
+        await self._asubmit_limited([ctx])
         return ctx
 
+    async def _asubmit_limited(self, contexts: List[Scope3AIContext]) -> None:
+        if self._concurrency_limit:
+            await self._concurrency_limit.aacquire()
+        try:
+            await self._asubmit_batch(contexts)
+        finally:
+            if self._concurrency_limit:
+                self._concurrency_limit.release()
+
+    def _get_deferred(self) -> EventLoopBatcher:
+        loop = asyncio.get_running_loop()
+        batcher = self._deferred.get(loop)
+        if batcher is None:
+            batcher = self._deferred[loop] = EventLoopBatcher(
+                self._asubmit_limited,
+                batch_size=self.batch_size,
+                on_cancel=self._on_deferred_cancelled,
+            )
+        return batcher
+
+    def _on_deferred_cancelled(self, contexts: List[Scope3AIContext]) -> None:
+        # the event loop is shutting down (asyncio.run returned) before the
+        # rows were submitted, the background worker submits them instead; a
+        # batch cancelled in flight is sent again with the same request_id
+        for ctx in contexts:
+            if ctx._impact_sync_ev.is_set():
+                # resolved by a half of a bisected batch
+                continue
+            ctx._claimed = False
+            self._enqueue(ctx, priority=ctx._promoted)
+
     @property
     def root_tracer(self):
         """
@@ -357,6 +1049,7 @@ class Scope3AI:
         project_id: Optional[str] = None,
         application_id: Optional[str] = None,
         session_id: Optional[str] = None,
+        sample_rate: Optional[float] = None,
     ):
         root_tracer = self.root_tracer
         if not client_id:
@@ -369,12 +1062,17 @@ class Scope3AI:
             )
         if not session_id:
             session_id = root_tracer.session_id if root_tracer else None
+        if sample_rate is None:
+            sample_rate = root_tracer.sample_rate if root_tracer else None
+        else:
+            _check_sample_rate(sample_rate)
         tracer = Tracer(
             keep_traces=keep_traces,
             client_id=client_id,
             project_id=project_id,
             application_id=application_id,
             session_id=session_id,
+            sample_rate=sample_rate,
         )
         try:
             self._push_tracer(tracer)
@@ -382,9 +1080,100 @@ class Scope3AI:
         finally:
             self._pop_tracer(tracer)
 
+    def stats(self) -> dict:
+        """
+        Return the counters of the background submission.
+
+        Returns:
+            dict: The number of impact rows currently `queued`, `dropped`
+            because the queue was full, `spilled` to the spool, and
+            `spooled` on disk waiting for an acknowledgement. With adaptive
+            concurrency, the current `concurrency_limit` and the number of
+            requests `inflight`. With the rollup, the number of calls merged
+            (`rollup_calls`) and of merged rows submitted (`rollup_rows`).
+            With several API endpoints, whether each one is up and its
+            latency (`endpoints`). With the latency histograms, the time spent
+            in every stage of the submission pipeline (`latency`).
+        """
+        stats = {"queued": 0, "dropped": 0, "spilled": 0, "spooled": 0}
+        if self._concurrency_limit:
+            stats["concurrency_limit"] = self._concurrency_limit.limit
+            stats["inflight"] = self._concurrency_limit.inflight
+        if self._rollup:
+            stats.update(self._rollup.stats)
+        if self._endpoints:
+            stats["endpoints"] = self._endpoints.stats
+        if self._latency:
+            stats["latency"] = self._latency.snapshot()
+        if self._worker:
+            stats.update(self._worker.stats)
+        if self._spool:
+            stats["spooled"] = self._spool.pending
+        return stats
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the impact rows queued in background to be submitted.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds, wait
+                until all the rows are submitted if None.
+
+        Returns:
+            bool: True if all the rows were submitted before the timeout.
+        """
+        if self._rollup:
+            # the rows of the open windows are submitted right away
+            self._rollup.flush(force=True)
+        flushed = not self._worker or self._worker.flush(timeout)
+        self._flush_exporters()
+        return flushed
+
+    def _flush_exporters(self) -> None:
+        for exporter in self._exporters:
+            try:
+                exporter.flush()
+            except Exception:
+                logger.error(
+                    f"Failed flushing {type(exporter).__name__}", exc_info=True
+                )
+
+    async def aflush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Async version of Scope3AI::flush, waiting without blocking the event loop.
+        The deferred submissions of the running loop are waited for too.
+        """
+        batcher = self._deferred.get(asyncio.get_running_loop())
+        if batcher is not None:
+            started = monotonic()
+            try:
+                await asyncio.wait_for(batcher.flush(), timeout)
+            except asyncio.TimeoutError:
+                return False
+            if timeout is not None:
+                timeout = max(0.0, timeout - (monotonic() - started))
+        return await asyncio.to_thread(self.flush, timeout)
+
     def close(self):
+        """
+        Shut down the SDK, giving the background worker `shutdown_timeout`
+        seconds to submit the pending impact rows. The rows left are written
+        to the spool if any, and their contexts are resolved with an error.
+        """
+        self._closing = True
+        if self._warmer:
+            self._warmer.stop()
+        self._shutdown(self.shutdown_timeout)
+        if self._rollup:
+            self._rollup.close()
         if self._worker:
             self._worker.kill()
+        if self._collector_client:
+            self._collector_client.close()
+        if self._spool:
+            self._spool.close()
+        for exporter in self._exporters:
+            exporter.close()
         self.__class__._instance = None
 
     #
@@ -399,6 +1188,42 @@ class Scope3AI:
         self._tracer.get().remove(tracer)
         tracer._unlink_parent(self.current_tracer)
 
+    def _init_exporters(
+        self,
+        exporters: Optional[List[Union[str, Exporter]]],
+        export_path: Optional[str],
+    ) -> None:
+        exporters = _get_option(exporters, "SCOPE3AI_EXPORTERS", ["api"], _parse_list)
+        self.export_path = export_path or getenv("SCOPE3AI_EXPORT_PATH")
+        if not exporters:
+            raise Scope3AIError("The exporters option must not be empty")
+        self._exporters = [self._make_exporter(exporter) for exporter in exporters]
+        self._exporter = next(
+            (e for e in self._exporters if isinstance(e, ApiExporter)),
+            self._exporters[0],
+        )
+        self._copy_exporters = [e for e in self._exporters if e is not self._exporter]
+
+    def _make_exporter(self, exporter: Union[str, Exporter]) -> Exporter:
+        if isinstance(exporter, Exporter):
+            return exporter
+        if exporter not in EXPORTERS:
+            raise Scope3AIError(
+                f"The exporters option must contain {', '.join(EXPORTERS)} "
+                "or Exporter instances"
+            )
+        if exporter == "api":
+            return ApiExporter(self._sync_client, self._async_client)
+        if exporter == "file":
+            if not self.export_path:
+                raise Scope3AIError(
+                    "The file exporter requires the export_path option to be set"
+                )
+            return FileExporter(self.export_path)
+        if exporter == "stdout":
+            return StdoutExporter()
+        return MemoryExporter()
+
     def _init_clients(self, clients: List[str]) -> None:
         for client in clients:
             if client not in _INSTRUMENTS:
@@ -410,9 +1235,516 @@ class Scope3AI:
             init_func()
             self._clients.append(client)
 
+    def _get_sample_rate(self) -> float:
+        tracer = self.current_tracer
+        if tracer and tracer.sample_rate is not None:
+            return tracer.sample_rate
+        return self.sample_rate
+
+    def _should_sample(self, sample_rate: float) -> bool:
+        # decide if an instrumented call is traced
+        return sample_rate >= 1 or random.random() < sample_rate
+
+    def _gate(self) -> float:
+        # time to wait before the worker can send the next batch
+        delay = 0.0
+        if self._circuit_breaker:
+            delay = self._circuit_breaker.retry_after()
+        if self._rate_limiter:
+            delay = max(delay, self._rate_limiter.retry_after())
+        return delay
+
+    def _mark_built(self, ctx: Scope3AIContext) -> None:
+        now = monotonic()
+        ctx._timestamps["built"] = now
+        duration = ctx.request.request_duration_ms
+        if duration is not None:
+            # the instrumented call started its request duration earlier
+            ctx._timestamps["started"] = now - duration / 1000
+        if self._latency:
+            ctx.add_done_callback(self._latency.record)
+
+    def _enqueue(self, ctx: Scope3AIContext, priority: bool = False) -> None:
+        # hand a context to the background worker
+        ctx._timestamps["enqueued"] = monotonic()
+        if self.durable:
+            assert self._spool is not None
+            self._spool.append(ctx.request, lease=True)
+
+        self._ensure_worker()
+        assert self._worker is not None
+        ctx._on_wait = self._promote
+        ctx._promoted = priority
+        self._worker.submit(ctx, priority=priority)
+
+    def _promote(self, ctx: Scope3AIContext) -> None:
+        # the context stays in the regular lane too, the first copy taken
+        # by the worker claims it and the other one is skipped
+        if self._worker and not ctx._claimed:
+            self._worker.promote(ctx)
+
+    def _claim(self, contexts: List[Scope3AIContext]) -> List[Scope3AIContext]:
+        # return the contexts not processed yet, marking them as processed
+        claimed = []
+        duplicates = []
+        now = monotonic()
+        with self._claim_lock:
+            # both copies of a promoted context can be in the same batch
+            for ctx in contexts:
+                if ctx._claimed:
+                    continue
+                ctx._claimed = True
+                ctx._timestamps["dequeued"] = now
+                if self._acked is not None and ctx.request.request_id in self._acked:
+                    duplicates.append(ctx)
+                else:
+                    claimed.append(ctx)
+        if duplicates:
+            self._skip_duplicates(duplicates)
+        return claimed
+
+    def _skip_duplicates(self, contexts: List[Scope3AIContext]) -> None:
+        # rows already acknowledged, submitted again by a retry or a replay
+        logger.debug(f"Skipping {len(contexts)} impact row(s) already acknowledged")
+        if self._spool:
+            self._spool.ack([ctx.request.request_id for ctx in contexts])
+        for ctx in contexts:
+            ctx.set_error("The impact row was already submitted", code="duplicate")
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+
     def _ensure_worker(self) -> None:
+        if self._worker:
+            return
+        queue_options = {
+            "policy": self.queue_policy,
+            "timeout": self.queue_timeout,
+            "on_drop": self._on_dropped,
+            "on_spill": self._on_spilled,
+        }
+        if self.fair_queueing:
+            queue_options["tenant_key"] = self._tenant_of
+            queue_options["tenant_weight"] = self._tenant_weight
+            queue_options["tenant_size"] = self.tenant_queue_size
+        if self._circuit_breaker or self._rate_limiter:
+            # hold the batches while the circuit breaker is open or the rate
+            # limit is reached, they grow meanwhile
+            queue_options["gate"] = self._gate
+        if self._collector_client:
+            self._worker = BatchWorker(
+                self.queue_size,
+                self._send_to_collector,
+                batch_size=self.batch_size,
+                linger=self.batch_linger,
+                **queue_options,
+            )
+        elif self.submitter == "asyncio":
+            self._worker = AsyncBatchWorker(
+                self.queue_size,
+                self._asubmit_batch,
+                batch_size=self.batch_size,
+                linger=self.batch_linger,
+                concurrency=self.concurrency,
+                limit=self._concurrency_limit,
+                **queue_options,
+            )
+        else:
+            self._worker = BatchWorker(
+                self.queue_size,
+                self._submit_batch,
+                batch_size=self.batch_size,
+                linger=self.batch_linger,
+                **queue_options,
+            )
+        self._replay_spool()
+
+    def _tenant_of(self, ctx: Scope3AIContext) -> Tuple[Optional[str], ...]:
+        return (ctx.request.client_id, ctx.request.project_id)
+
+    def _tenant_weight(self, tenant: Tuple[Optional[str], ...]) -> float:
+        client_id, project_id = tenant
+        weight = self.tenant_weights.get(f"{client_id}/{project_id}")
+        if weight is None:
+            weight = self.tenant_weights.get(client_id, 1.0)
+        return weight
+
+    def _on_dropped(self, ctx: Scope3AIContext) -> bool:
+        # return False if the row is not lost, so it is not counted as dropped
+        if ctx._promoted and not self._closing:
+            # a copy of the context is in the priority lane
+            return False
+        if not self._claim([ctx]):
+            return False
+        if self.durable:
+            # the row is still in the spool, it will be replayed later
+            self._on_spilled(ctx)
+            return True
+        if self._closing:
+            # discarded by the worker killed on close
+            logger.warning("Background worker stopped, dropping impact row")
+            ctx.set_error(
+                "The impact row was not submitted before the shutdown",
+                code="shutdown",
+            )
+        else:
+            logger.warning("Submission queue is full, dropping impact row")
+            ctx.set_error(
+                "The impact row was dropped because the submission queue is full",
+                code="queue_full",
+            )
+        if ctx._tracer:
+            ctx._tracer._unlink_trace(ctx)
+        return True
+
+    def _on_spilled(self, ctx: Scope3AIContext) -> None:
+        assert self._spool is not None
+        ctx._claimed = True
+        if self.durable:
+            self._spool.release([ctx.request.request_id])
+        else:
+            self._spool.append(ctx.request)
+        ctx.set_error(
+            "The impact row was spilled to disk and will be submitted later",
+            code="spilled",
+        )
+        if ctx._tracer:
+            ctx._tracer._unlink_trace(ctx)
+
+    def _replay_spool(self) -> None:
+        # feed the spilled rows back to the worker while it has room for them
+        if not self._spool or not self._worker:
+            return
+        segment_size = self._spool.segment_size
+        while self._spool.has_pending and self._worker.has_room(segment_size):
+            rows = self._spool.replay(segment_size)
+            if not rows:
+                break
+            for row in rows:
+                self._worker.submit(Scope3AIContext(request=row))
+
+    def _submit_batch(self, contexts: List[Scope3AIContext]) -> None:
+        assert self._exporter is not None
+        contexts = self._check_rows(self._claim(contexts))
+        if not contexts:
+            return
+        self._export_copies(contexts)
+        self._send_batch(contexts)
+        self._replay_spool()
+
+    def _send_batch(
+        self,
+        contexts: List[Scope3AIContext],
+        rejected: Optional[List[Tuple[Scope3AIContext, Exception]]] = None,
+    ) -> None:
+        rows = [ctx.request for ctx in contexts]
+        _mark(contexts, "sent")
+        try:
+            if isinstance(self._exporter, ApiExporter):
+                # someone waits for these rows
+                impacts = self._exporter.export(
+                    rows, hedge=any(ctx._promoted for ctx in contexts)
+                )
+            else:
+                impacts = self._exporter.export(rows)
+        except Exception as exc:
+            if self._requeue_batch(contexts, exc):
+                return
+            # the rows rejected alone are collected for the whole batch
+            top = rejected is None
+            if top:
+                rejected = []
+            halves = self._bisect_batch(contexts, exc, rejected)
+            if halves is None:
+                self._fail_batch(contexts, exc)
+                raise
+            errors = []
+            for half in halves:
+                try:
+                    self._send_batch(half, rejected)
+                except Exception as error:
+                    errors.append(error)
+            if top and self._reject_rows(contexts, rejected):
+                raise
+            if errors:
+                raise errors[0]
+            return
+        _mark(contexts, "received")
+        self._resolve_batch(contexts, impacts)
+
+    async def _asubmit_batch(self, contexts: List[Scope3AIContext]) -> None:
+        assert self._exporter is not None
+        contexts = self._check_rows(self._claim(contexts))
+        if not contexts:
+            return
+        await self._aexport_copies(contexts)
+        await self._asend_batch(contexts)
+        self._replay_spool()
+
+    async def _asend_batch(
+        self,
+        contexts: List[Scope3AIContext],
+        rejected: Optional[List[Tuple[Scope3AIContext, Exception]]] = None,
+    ) -> None:
+        # the async client keeps a connection pool per event loop
+        rows = [ctx.request for ctx in contexts]
+        _mark(contexts, "sent")
+        try:
+            if isinstance(self._exporter, ApiExporter):
+                # someone waits for these rows
+                impacts = await self._exporter.aexport(
+                    rows, hedge=any(ctx._promoted for ctx in contexts)
+                )
+            else:
+                impacts = await self._exporter.aexport(rows)
+        except Exception as exc:
+            if self._requeue_batch(contexts, exc):
+                return
+            # the rows rejected alone are collected for the whole batch
+            top = rejected is None
+            if top:
+                rejected = []
+            halves = self._bisect_batch(contexts, exc, rejected)
+            if halves is None:
+                self._fail_batch(contexts, exc)
+                raise
+            errors = []
+            for half in halves:
+                try:
+                    await self._asend_batch(half, rejected)
+                except Exception as error:
+                    errors.append(error)
+            if top and self._reject_rows(contexts, rejected):
+                raise
+            if errors:
+                raise errors[0]
+            return
+        _mark(contexts, "received")
+        self._resolve_batch(contexts, impacts)
+
+    def _export_copies(self, contexts: List[Scope3AIContext]) -> None:
+        rows = self._rows_to_copy(contexts)
+        for exporter in self._copy_exporters if rows else []:
+            try:
+                exporter.export(rows)
+            except Exception:
+                logger.error(
+                    f"Failed exporting impact rows to {type(exporter).__name__}",
+                    exc_info=True,
+                )
+
+    async def _aexport_copies(self, contexts: List[Scope3AIContext]) -> None:
+        rows = self._rows_to_copy(contexts)
+        for exporter in self._copy_exporters if rows else []:
+            try:
+                await exporter.aexport(rows)
+            except Exception:
+                logger.error(
+                    f"Failed exporting impact rows to {type(exporter).__name__}",
+                    exc_info=True,
+                )
+
+    def _rows_to_copy(self, contexts: List[Scope3AIContext]) -> List[ImpactRow]:
+        # a row requeued or retried is copied once
+        if not self._copy_exporters:
+            return []
+        rows = []
+        for ctx in contexts:
+            if not ctx._exported:
+                ctx._exported = True
+                rows.append(ctx.request)
+        return rows
+
+    def _resolve_batch(
+        self, contexts: List[Scope3AIContext], impacts: Optional[List[ModeledRow]]
+    ) -> None:
+        if impacts is not None:
+            self._dispatch_impacts(contexts, impacts)
+            return
+        # the exporter does not compute the impacts
+        for ctx in contexts:
+            ctx.set_error(
+                "The impact row was exported without being submitted to the API",
+                code="exported",
+            )
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+        self._ack_rows(contexts)
+
+    def _send_to_collector(self, contexts: List[Scope3AIContext]) -> None:
+        assert self._collector_client is not None
+        contexts = self._check_rows(self._claim(contexts))
+        if not contexts:
+            return
+        try:
+            self._collector_client.send(contexts)
+        except OSError as exc:
+            self._fail_batch(contexts, exc)
+            raise
+
+    def _on_collector_reply(self, ctx: Scope3AIContext, impact: ModeledRow) -> None:
+        if impact.error is None:
+            self._dispatch_impacts([ctx], [impact])
+            self._replay_spool()
+            return
+        # the collector could not submit the row, it stays in our spool
+        if self._spool:
+            self._spool.release([ctx.request.request_id])
+        ctx.set_impact(impact)
+        if ctx._tracer:
+            ctx._tracer._unlink_trace(ctx)
+
+    def _dispatch_impacts(
+        self, contexts: List[Scope3AIContext], impacts: List[ModeledRow]
+    ) -> None:
+        # the API returns the modeled rows in the same order as the request rows
+        matched = contexts[: len(impacts)]
+        for ctx, impact in zip(matched, impacts):
+            ctx.set_impact(impact)
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+        self._ack_rows(matched)
+        if len(impacts) != len(contexts):
+            message = (
+                f"Impact response has {len(impacts)} row(s) "
+                f"for {len(contexts)} request row(s)"
+            )
+            logger.error(message)
+            # the rows without an impact stay in the spool to be replayed
+            self._fail_batch(contexts[len(impacts) :], Scope3AIError(message))
+
+    def _ack_rows(self, contexts: List[Scope3AIContext]) -> None:
+        request_ids = [ctx.request.request_id for ctx in contexts]
+        if self._acked is not None:
+            self._acked.add(request_ids)
+        if self._spool:
+            self._spool.ack(request_ids)
+
+    def _requeue_batch(self, contexts: List[Scope3AIContext], exc: Exception) -> bool:
+        # a batch rejected by the circuit breaker was not sent at all,
+        # it goes back to the worker queue to wait for the API to recover
+        if not isinstance(exc, CircuitOpenError) or self.sync_mode:
+            return False
         if not self._worker:
-            self._worker = BackgroundWorker(-1)
+            return False
+        logger.debug(f"Circuit breaker is open, requeuing {len(contexts)} row(s)")
+        for ctx in contexts:
+            ctx._claimed = False
+            self._worker.submit(ctx, priority=ctx._promoted)
+        return True
+
+    def _check_rows(self, contexts: List[Scope3AIContext]) -> List[Scope3AIContext]:
+        # return the contexts whose row is valid, quarantining the others
+        valid = []
+        for ctx in contexts:
+            try:
+                _check_row(ctx.request)
+            except ValidationError as exc:
+                self._quarantine([ctx], _format_validation_error(exc))
+            else:
+                valid.append(ctx)
+        return valid
+
+    def _bisect_batch(
+        self,
+        contexts: List[Scope3AIContext],
+        exc: Exception,
+        rejected: List[Tuple[Scope3AIContext, Exception]],
+    ) -> Optional[List[List[Scope3AIContext]]]:
+        # a batch rejected by the API for its content is split in two halves
+        # submitted again, until the invalid rows are isolated: an invalid row
+        # costs two requests per halving, and the valid rows are submitted
+        if not is_rejected_request(exc):
+            return None
+        if len(contexts) == 1:
+            rejected.append((contexts[0], exc))
+            return []
+        logger.debug(f"Impact request rejected, bisecting {len(contexts)} row(s)")
+        middle = len(contexts) // 2
+        return [contexts[:middle], contexts[middle:]]
+
+    def _reject_rows(
+        self,
+        contexts: List[Scope3AIContext],
+        rejected: List[Tuple[Scope3AIContext, Exception]],
+    ) -> bool:
+        # quarantine the rows rejected alone, unless every row of the batch
+        # was: the request is then invalid as a whole, not for its rows, and
+        # the batch fails. Return True if it failed
+        if len(contexts) > 1 and len(rejected) == len(contexts):
+            logger.warning(
+                f"Impact request rejected for each of its {len(contexts)} rows"
+            )
+            self._fail_batch(contexts, rejected[0][1])
+            return True
+        for ctx, exc in rejected:
+            self._quarantine([ctx], str(exc))
+        return False
+
+    def _quarantine(self, contexts: List[Scope3AIContext], reason: str) -> None:
+        # an invalid row is never submitted again, nor replayed from the spool
+        for ctx in contexts:
+            logger.warning(
+                f"Quarantining invalid impact row {ctx.request.request_id}: {reason}"
+            )
+        if self._spool:
+            self._spool.ack([ctx.request.request_id for ctx in contexts])
+        for ctx in contexts:
+            ctx.set_error(f"The impact row is invalid: {reason}", code="invalid_row")
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+
+    def _fail_batch(self, contexts: List[Scope3AIContext], exc: Exception) -> None:
+        # rows not acknowledged stay in the spool and will be replayed
+        if self._spool:
+            self._spool.release([ctx.request.request_id for ctx in contexts])
+        for ctx in contexts:
+            ctx.set_error(
+                f"Failed to submit the impact row: {exc}", code="submission_failed"
+            )
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+
+    def _fork_resources(self) -> list:
+        resources = (
+            self._spool,
+            self._circuit_breaker,
+            self._rate_limiter,
+            self._concurrency_limit,
+            self._rollup,
+            self._acked,
+            self._hedging,
+            self._endpoints,
+            self._latency,
+            *self._exporters,
+        )
+        return [resource for resource in resources if resource is not None]
+
+    def _before_fork(self) -> None:
+        for resource in self._fork_resources():
+            resource._before_fork()
+
+    def _after_fork_in_parent(self) -> None:
+        for resource in self._fork_resources():
+            resource._after_fork_in_parent()
+
+    def _after_fork_in_child(self) -> None:
+        # the worker thread did not survive the fork: the rows queued before
+        # the fork are submitted by the parent, the child starts a new worker
+        # on its first submission, with its own connections
+        self._worker = None
+        self._claim_lock = threading.Lock()
+        self._deferred = weakref.WeakKeyDictionary()
+        for resource in self._fork_resources():
+            resource._after_fork_in_child()
+        for client in (
+            self._sync_client,
+            self._async_client,
+            self._collector_client,
+        ):
+            if client is not None:
+                client._after_fork_in_child()
+        if self._warmer:
+            self._warmer._after_fork_in_child()
 
     def _init_logging(self) -> None:
         logging.basicConfig(
@@ -429,10 +1761,39 @@ class Scope3AI:
             scope3ai = Scope3AI._instance
             if not scope3ai:
                 return
-            if scope3ai._worker and scope3ai._worker._queue:
-                logging.debug("Waiting background informations to be processed")
-                scope3ai._worker._queue.join()
-                logging.debug("Shutting down Scope3AI")
+            logging.debug("Waiting background informations to be processed")
+            scope3ai._shutdown(scope3ai.shutdown_timeout)
+            logging.debug("Shutting down Scope3AI")
+
+    def _shutdown(self, timeout: Optional[float]) -> None:
+        # submit what can be within the deadline, keep or count the rest
+        if self._rollup:
+            self._rollup.flush(force=True)
+        if not self._worker or self._worker.flush(timeout):
+            self._flush_exporters()
+            return
+        contexts = self._claim(self._worker.drain())
+        if self._spool:
+            self._spool.persist(ctx.request for ctx in contexts)
+        for ctx in contexts:
+            ctx.set_error(
+                "The impact row was not submitted before the shutdown deadline",
+                code="shutdown",
+            )
+            if ctx._tracer:
+                ctx._tracer._unlink_trace(ctx)
+        inflight = self._worker._queue.unfinished_tasks
+        if self._spool:
+            logger.warning(
+                f"Shutdown deadline reached, {len(contexts)} impact row(s) "
+                f"written to the spool, {inflight} still in flight"
+            )
+        else:
+            logger.warning(
+                f"Shutdown deadline reached, {len(contexts)} impact row(s) "
+                f"lost, {inflight} still in flight"
+            )
+        self._flush_exporters()
 
     def _fill_impact_row(
         self,
@@ -452,7 +1813,10 @@ class Scope3AI:
                     setattr(row, field, value)
                     return
 
-        row.request_id = generate_id()
+        # the request_id is kept for the lifetime of the row, it identifies
+        # it across retries and replays
+        if row.request_id is None:
+            row.request_id = generate_id()
         if root_tracer:
             set_only_if(row, "trace_id", root_tracer.trace_id)
         if row.utc_datetime is None:
@@ -496,3 +1860,27 @@ class Scope3AI:
             "session_id",
             tracer.session_id if tracer else None,
         )
+
+
+def _before_fork() -> None:
+    if Scope3AI._instance is not None:
+        Scope3AI._instance._before_fork()
+
+
+def _after_fork_in_parent() -> None:
+    if Scope3AI._instance is not None:
+        Scope3AI._instance._after_fork_in_parent()
+
+
+def _after_fork_in_child() -> None:
+    if Scope3AI._instance is not None:
+        Scope3AI._instance._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    # allow pre-fork servers (gunicorn, uWSGI, celery) to init in the master
+    os.register_at_fork(
+        before=_before_fork,
+        after_in_parent=_after_fork_in_parent,
+        after_in_child=_after_fork_in_child,
+    )
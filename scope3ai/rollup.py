@@ -0,0 +1,268 @@
+"""
+Client-side rollup of the impact rows: the rows of the calls sharing the same
+dimensions (model, service, client, project...) within a time window are
+merged into a single row summing their usage, and submitted once the window
+is over.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from pydantic import ValidationError
+
+from .api.types import ImpactMetrics, ImpactRow, ModeledRow, Scope3AIContext
+
+logger = logging.getLogger("scope3ai.rollup")
+
+# usage summed over the calls of a rolled up row
+SUMMED_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "input_audio_seconds",
+    "output_audio_seconds",
+    "output_audio_tokens",
+    "output_video_frames",
+    "request_duration_ms",
+    "processing_duration_ms",
+    "request_cost",
+)
+# identifiers of a single call, not part of the dimensions of a rolled up row
+CALL_FIELDS = ("utc_datetime", "request_id", "trace_id", "session_id")
+# usage used to share the impact of a rolled up row between its calls
+SHARE_FIELDS = ("input_tokens", "output_tokens")
+
+
+def _field_max(name: str) -> Optional[float]:
+    for constraint in ImpactRow.model_fields[name].metadata:
+        le = getattr(constraint, "le", None)
+        if le is not None:
+            return le
+    return None
+
+
+# the API rejects a row whose usage is above these bounds
+FIELD_MAX = {name: _field_max(name) for name in SUMMED_FIELDS}
+
+
+class _Bucket:
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.members: List[Scope3AIContext] = []
+        self.totals: Dict[str, float] = {}
+
+    def fits(self, row: ImpactRow) -> bool:
+        for name, limit in FIELD_MAX.items():
+            value = getattr(row, name)
+            if value is None or limit is None:
+                continue
+            if self.totals.get(name, 0) + value > limit:
+                return False
+        return True
+
+    def add(self, ctx: Scope3AIContext) -> None:
+        self.members.append(ctx)
+        for name in SUMMED_FIELDS:
+            value = getattr(ctx.request, name)
+            if value is not None:
+                self.totals[name] = self.totals.get(name, 0) + value
+
+
+class Rollup:
+    """
+    Merge the impact rows sharing the same dimensions within windows of
+    `window` seconds, aligned on the epoch.
+
+    Each rolled up row is wrapped in a new context handed to `submit` once its
+    window is over. When its impact is received, the contexts of the merged
+    calls are resolved with a share of it, proportional to their tokens.
+
+    Args:
+        window (float): Duration of the windows in seconds.
+        submit (Callable): Called with the context of every rolled up row.
+        clock (Callable, optional): Return the current time as a timestamp,
+            deciding when the windows are over. Defaults to `time.time`.
+        background (bool, optional): Submit the windows from a background
+            thread once they are over, else only on `flush`. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        submit: Callable[[Scope3AIContext], None],
+        clock: Callable[[], float] = time.time,
+        background: bool = True,
+    ) -> None:
+        self.window = window
+        self._submit = submit
+        self._clock = clock
+        self._background = background
+        self._cond = threading.Condition()
+        self._buckets: Dict[Tuple[str, float], _Bucket] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.calls = 0
+        self.rows = 0
+
+    @property
+    def stats(self) -> dict:
+        return {"rollup_calls": self.calls, "rollup_rows": self.rows}
+
+    def add(self, ctx: Scope3AIContext) -> None:
+        """
+        Add the row of a context to the window of its `utc_datetime`.
+        """
+        row = ctx.request
+        timestamp = row.utc_datetime.timestamp() if row.utc_datetime else self._clock()
+        start = timestamp - timestamp % self.window
+        key = (_dimensions(row), start)
+        full = None
+        with self._cond:
+            self._ensure_thread()
+            bucket = self._buckets.get(key)
+            if bucket is not None and not bucket.fits(row):
+                # submit it early rather than going over the API bounds
+                full = self._buckets.pop(key)
+                bucket = None
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(start)
+                self._cond.notify()
+            bucket.add(ctx)
+            self.calls += 1
+        if full is not None:
+            self._emit_or_fail(full)
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Submit the rows of the windows that are over, or of all the windows if
+        `force` is True, and return the number of rows submitted.
+        """
+        now = self._clock()
+        with self._cond:
+            keys = [
+                key
+                for key, bucket in self._buckets.items()
+                if force or bucket.start + self.window <= now
+            ]
+            buckets = [self._buckets.pop(key) for key in keys]
+        for bucket in buckets:
+            self._emit_or_fail(bucket)
+        return len(buckets)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _ensure_thread(self) -> None:
+        # must be called with the condition held
+        if not self._background:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="scope3ai.Rollup", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if self._buckets:
+                    end = min(b.start for b in self._buckets.values()) + self.window
+                    self._cond.wait(max(0.0, end - self._clock()))
+                else:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                logger.error("Failed submitting rolled up rows", exc_info=True)
+
+    def _emit_or_fail(self, bucket: _Bucket) -> None:
+        # a bucket failing does not keep the others from being submitted
+        try:
+            self._emit(bucket)
+        except Exception as exc:
+            logger.error("Failed submitting a rolled up row", exc_info=True)
+            if isinstance(exc, ValidationError):
+                code = "invalid_row"
+            else:
+                code = "submission_failed"
+            for ctx in bucket.members:
+                ctx.set_error(
+                    f"Failed to submit the rolled up impact row: {exc}", code=code
+                )
+                if ctx._tracer:
+                    ctx._tracer._unlink_trace(ctx)
+
+    def _emit(self, bucket: _Bucket) -> None:
+        first = bucket.members[0].request
+        data = first.model_dump(
+            exclude_unset=True, exclude=set(CALL_FIELDS), warnings=False
+        )
+        data.update(bucket.totals)
+        data["utc_datetime"] = datetime.fromtimestamp(bucket.start, tz=timezone.utc)
+        data["request_id"] = uuid4().hex
+        ctx = Scope3AIContext(request=ImpactRow.model_validate(data))
+        members = bucket.members
+        ctx.add_done_callback(lambda rolled: _share_impact(rolled.impact, members))
+        self.rows += 1
+        logger.debug(f"Submitting a rolled up row of {len(members)} call(s)")
+        self._submit(ctx)
+
+    def _before_fork(self) -> None:
+        self._cond.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._cond.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the open windows are submitted by the parent process
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._thread = None
+
+
+def _dimensions(row: ImpactRow) -> str:
+    # the rows with the same dimensions are merged together
+    return row.model_dump_json(
+        exclude=set(SUMMED_FIELDS + CALL_FIELDS), exclude_none=True, warnings=False
+    )
+
+
+def _share_impact(impact: ModeledRow, members: List[Scope3AIContext]) -> None:
+    weights = [
+        sum(getattr(ctx.request, name) or 0 for name in SHARE_FIELDS) for ctx in members
+    ]
+    total = sum(weights)
+    for ctx, weight in zip(members, weights):
+        share = weight / total if total else 1 / len(members)
+        ctx.set_impact(_scale_impact(impact, share))
+        if ctx._tracer:
+            ctx._tracer._unlink_trace(ctx)
+
+
+def _scale_impact(impact: ModeledRow, share: float) -> ModeledRow:
+    if impact.error is not None:
+        return impact
+    update = {}
+    for name in (
+        "inference_impact",
+        "training_impact",
+        "fine_tuning_impact",
+        "total_impact",
+    ):
+        metrics = getattr(impact, name)
+        if metrics is not None:
+            update[name] = ImpactMetrics(
+                **{key: value * share for key, value in metrics}
+            )
+    return impact.model_copy(update=update)
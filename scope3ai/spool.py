@@ -0,0 +1,405 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from time import monotonic, time_ns
+from typing import IO, Dict, Iterable, List, Optional, Set
+from uuid import uuid4
+
+from .api.types import ImpactRow
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("scope3ai.spool")
+
+
+def _try_lock(fd: int) -> bool:
+    # non-blocking exclusive lock, released by the system when the process dies
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class Segment:
+    """
+    Bookkeeping of one spool segment file and its acknowledgement file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.ack_path = path.with_suffix(Spool.ACK_SUFFIX)
+        # "<time>-<owner>.ndjson"
+        self.owner = path.stem.partition("-")[2] or path.stem
+        self.rows = 0
+        self.leased = 0
+        self.acked: Set[str] = set()
+        self.sealed = False
+        self.ack_fd: Optional[IO[str]] = None
+
+    @property
+    def unleased(self) -> int:
+        return self.rows - len(self.acked) - self.leased
+
+    @property
+    def done(self) -> bool:
+        return self.sealed and len(self.acked) >= self.rows
+
+
+class Spool:
+    """
+    Append-only, segment-based on-disk log of impact rows.
+
+    Rows are appended as newline-delimited JSON to segment files of at most
+    `segment_size` rows. Rows handed to the submission pipeline are leased,
+    and once the API acknowledged them their `request_id` is appended to the
+    segment acknowledgement file. A segment is removed as soon as all its
+    rows are acknowledged. Rows that are neither leased nor acknowledged,
+    including the ones left by a previous process, are returned by `replay`.
+
+    Several processes can share the directory, forked workers for instance.
+    Every spool owns its segments through a lock file held while it is open,
+    released by the system if the process dies. The segments of an owner
+    gone are adopted by the first spool taking its lock, at init and then
+    every `adopt_interval` seconds, the segments of the live spools are never
+    replayed by another one.
+
+    Args:
+        path (str): Directory where the segment files are stored. Created if
+            it does not exist.
+        segment_size (int, optional): Maximum number of rows per segment.
+            Defaults to 1000.
+        adopt_interval (float, optional): Time in seconds between two
+            lookups of the segments left by the owners gone. Defaults to 60.
+    """
+
+    SUFFIX = ".ndjson"
+    ACK_SUFFIX = ".ack"
+    LOCK_SUFFIX = ".lock"
+
+    def __init__(
+        self, path: str, segment_size: int = 1000, adopt_interval: float = 60.0
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.adopt_interval = adopt_interval
+        self._lock = threading.Lock()
+        self._segments: Dict[Path, Segment] = {}
+        self._leases: Dict[str, Segment] = {}
+        self._current: Optional[Segment] = None
+        self._current_fd: Optional[IO[str]] = None
+        # lock file descriptors of the owners of the segments, this spool
+        # included
+        self._owners: Dict[str, int] = {}
+        self._owner = self._new_owner()
+        self._adopted_at = monotonic()
+        self._adopt()
+
+    @property
+    def has_pending(self) -> bool:
+        """
+        Return True if some rows are waiting to be replayed.
+        """
+        with self._lock:
+            if monotonic() - self._adopted_at >= self.adopt_interval:
+                self._adopted_at = monotonic()
+                self._adopt()
+            return any(segment.unleased > 0 for segment in self._segments.values())
+
+    @property
+    def pending(self) -> int:
+        """
+        Return the number of rows not acknowledged yet.
+        """
+        with self._lock:
+            return sum(
+                segment.rows - len(segment.acked) for segment in self._segments.values()
+            )
+
+    def append(self, row: ImpactRow, lease: bool = False) -> None:
+        """
+        Append a row to the current segment, opening a new one if needed.
+
+        Args:
+            row (ImpactRow): The row to store, it must have a `request_id`.
+            lease (bool, optional): Mark the row as already being processed,
+                so it is not returned by `replay`. Defaults to False.
+        """
+        assert row.request_id is not None
+        line = row.model_dump_json(exclude_unset=True) + "\n"
+        with self._lock:
+            if self._current is None or self._current.rows >= self.segment_size:
+                self._open_segment()
+            self._current_fd.write(line)
+            self._current_fd.flush()
+            self._current.rows += 1
+            if lease:
+                self._lease(row.request_id, self._current)
+
+    def replay(self, limit: int) -> List[ImpactRow]:
+        """
+        Lease and return up to `limit` rows that are neither leased nor
+        acknowledged, oldest first.
+        """
+        rows = []
+        with self._lock:
+            for segment in sorted(self._segments.values(), key=lambda s: s.path):
+                if len(rows) >= limit:
+                    break
+                if segment.unleased <= 0:
+                    continue
+                if segment is self._current:
+                    self._current_fd.flush()
+                for row in self._read_segment(segment.path):
+                    if len(rows) >= limit:
+                        break
+                    if row.request_id in segment.acked:
+                        continue
+                    if row.request_id in self._leases:
+                        continue
+                    self._lease(row.request_id, segment)
+                    rows.append(row)
+        return rows
+
+    def ack(self, request_ids: Iterable[str]) -> None:
+        """
+        Acknowledge leased rows, removing the segments fully acknowledged.
+        """
+        with self._lock:
+            touched = set()
+            for request_id in request_ids:
+                segment = self._leases.pop(request_id, None)
+                if segment is None:
+                    continue
+                segment.leased -= 1
+                segment.acked.add(request_id)
+                if segment.ack_fd is None:
+                    segment.ack_fd = segment.ack_path.open("a", encoding="utf-8")
+                segment.ack_fd.write(request_id + "\n")
+                touched.add(segment)
+            for segment in touched:
+                segment.ack_fd.flush()
+                if segment.done:
+                    self._remove_segment(segment)
+
+    def release(self, request_ids: Iterable[str]) -> None:
+        """
+        Release leased rows that were not acknowledged, so they can be replayed.
+        """
+        with self._lock:
+            for request_id in request_ids:
+                segment = self._leases.pop(request_id, None)
+                if segment is not None:
+                    segment.leased -= 1
+
+    def persist(self, rows: Iterable[ImpactRow]) -> None:
+        """
+        Keep rows that were not acknowledged for the next replay: the rows
+        already in the spool are released, the others are appended.
+        """
+        with self._lock:
+            appended = []
+            for row in rows:
+                segment = self._leases.pop(row.request_id, None)
+                if segment is not None:
+                    segment.leased -= 1
+                else:
+                    appended.append(row)
+        for row in appended:
+            self.append(row)
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal_current()
+            for segment in self._segments.values():
+                if segment.ack_fd is not None:
+                    segment.ack_fd.close()
+                    segment.ack_fd = None
+            # the segments left are adopted by the next spool
+            for owner in list(self._owners):
+                self._release_owner(owner)
+
+    def _before_fork(self) -> None:
+        # no row is half written while the process is forked
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the segments and leases belong to the parent process, the child
+        # starts its own segments. The buffers were flushed under the lock,
+        # so closing the inherited files does not write to them, and closing
+        # the inherited lock files keeps the locks of the parent.
+        if self._current_fd is not None:
+            self._current_fd.close()
+        for segment in self._segments.values():
+            if segment.ack_fd is not None:
+                segment.ack_fd.close()
+        for fd in self._owners.values():
+            os.close(fd)
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._leases = {}
+        self._current = None
+        self._current_fd = None
+        self._owners = {}
+        self._owner = self._new_owner()
+        self._adopted_at = monotonic()
+
+    def _new_owner(self) -> str:
+        # unique even when the pid of a process gone is reused
+        owner = f"{os.getpid()}.{uuid4().hex[:8]}"
+        if not self._claim_owner(owner):
+            raise OSError(f"Failed to lock the spool {self.path}")
+        return owner
+
+    def _claim_owner(self, owner: str) -> bool:
+        # take the lock of an owner, only possible if it is gone
+        lock_path = self.path / f"{owner}{self.LOCK_SUFFIX}"
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            locked = _try_lock(fd)
+            # the lock file may have been removed by its last owner meanwhile
+            if locked and os.fstat(fd).st_ino != os.stat(lock_path).st_ino:
+                locked = False
+        except OSError:
+            locked = False
+        if not locked:
+            os.close(fd)
+            return False
+        self._owners[owner] = fd
+        return True
+
+    def _has_segments(self, owner: str) -> bool:
+        return any(segment.owner == owner for segment in self._segments.values())
+
+    def _release_owner(self, owner: str) -> None:
+        fd = self._owners.pop(owner)
+        if not self._has_segments(owner):
+            # removed while locked, see _claim_owner
+            try:
+                (self.path / f"{owner}{self.LOCK_SUFFIX}").unlink(missing_ok=True)
+            except OSError:
+                pass
+        os.close(fd)
+
+    def _adopt(self) -> None:
+        # pick up the segments left by the owners gone, they are all sealed
+        paths = sorted(self.path.glob(f"*{self.SUFFIX}"))
+        owners = {Segment(path).owner for path in paths} - set(self._owners)
+        adopted = {owner for owner in owners if self._claim_owner(owner)}
+        for path in paths:
+            segment = Segment(path)
+            if segment.owner not in adopted:
+                continue
+            segment.sealed = True
+            segment.rows = len(self._read_segment(path))
+            if segment.ack_path.exists():
+                with segment.ack_path.open(encoding="utf-8") as fd:
+                    segment.acked = {line.strip() for line in fd if line.strip()}
+            self._segments[path] = segment
+            if segment.done:
+                self._remove_segment(segment)
+        for owner in adopted:
+            # all its segments were done, or removed meanwhile
+            if owner in self._owners and not self._has_segments(owner):
+                self._release_owner(owner)
+
+    def _lease(self, request_id: str, segment: Segment) -> None:
+        self._leases[request_id] = segment
+        segment.leased += 1
+
+    def _open_segment(self) -> None:
+        self._seal_current()
+        path = self.path / f"{time_ns():020d}-{self._owner}{self.SUFFIX}"
+        self._current = Segment(path)
+        self._current_fd = path.open("a", encoding="utf-8")
+        self._segments[path] = self._current
+
+    def _seal_current(self) -> None:
+        if self._current is None:
+            return
+        self._current_fd.close()
+        self._current.sealed = True
+        if self._current.done:
+            self._remove_segment(self._current)
+        self._current = None
+        self._current_fd = None
+
+    def _remove_segment(self, segment: Segment) -> None:
+        if segment.ack_fd is not None:
+            segment.ack_fd.close()
+            segment.ack_fd = None
+        segment.path.unlink(missing_ok=True)
+        segment.ack_path.unlink(missing_ok=True)
+        self._segments.pop(segment.path, None)
+        owner = segment.owner
+        if owner != self._owner and owner in self._owners:
+            if not self._has_segments(owner):
+                # all the segments adopted from this owner are done
+                self._release_owner(owner)
+
+    def _read_segment(self, path: Path) -> List[ImpactRow]:
+        rows = []
+        with path.open(encoding="utf-8") as fd:
+            for line in fd:
+                # a partially written last line is ignored
+                try:
+                    rows.append(ImpactRow.model_validate_json(line))
+                except ValueError:
+                    logger.warning(f"Skipping invalid row in {path}")
+        return rows
+
+
+class AckedSet:
+    """
+    Bounded set of the `request_id` of the most recently acknowledged rows,
+    the oldest ones being evicted first. It lets the rows submitted again by
+    a retry or a replay be skipped.
+
+    Args:
+        maxsize (int): Maximum number of request ids kept.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def __contains__(self, request_id: Optional[str]) -> bool:
+        with self._lock:
+            return request_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, request_ids: Iterable[Optional[str]]) -> None:
+        with self._lock:
+            for request_id in request_ids:
+                if request_id is None:
+                    continue
+                self._ids[request_id] = None
+                self._ids.move_to_end(request_id)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def _before_fork(self) -> None:
+        self._lock.acquire()
+
+    def _after_fork_in_parent(self) -> None:
+        self._lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        # the acknowledged rows stay valid in the child
+        self._lock = threading.Lock()
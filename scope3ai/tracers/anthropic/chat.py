@@ -18,6 +18,7 @@ from anthropic.types.raw_message_stream_event import RawMessageStreamEvent
 from typing_extensions import override
 
 from scope3ai.api.types import Scope3AIContext, ImpactRow
+from scope3ai.base_tracer import weighted
 from scope3ai.constants import try_provider_for_client, CLIENTS
 from scope3ai.lib import Scope3AI
 
@@ -63,7 +64,8 @@ class MessageStream(_MessageStream):
                 output_tokens=output_tokens,
                 request_duration_ms=requests_latency * 1000,
             )
-            self.scope3ai = Scope3AI.get_instance().submit_impact(scope3_row)
+            with weighted(self._sample_weight):
+                self.scope3ai = Scope3AI.get_instance().submit_impact(scope3_row)
 
     def __init__(self, parent) -> None:  # noqa: ANN001
         super().__init__(
@@ -71,6 +73,8 @@ class MessageStream(_MessageStream):
             response=parent.response,
             client=parent._client,  # noqa: SLF001
         )
+        # consumed after the sampled call, keep its weight
+        self._sample_weight = Scope3AI._sample_weight.get()
 
 
 class AsyncMessageStream(_AsyncMessageStream):
@@ -106,7 +110,8 @@ class AsyncMessageStream(_AsyncMessageStream):
                 output_tokens=output_tokens,
                 request_duration_ms=requests_latency * 1000,
             )
-            self.scope3ai = await Scope3AI.get_instance().asubmit_impact(scope3_row)
+            with weighted(self._sample_weight):
+                self.scope3ai = await Scope3AI.get_instance().asubmit_impact(scope3_row)
 
     def __init__(self, parent) -> None:  # noqa: ANN001
         super().__init__(
@@ -114,15 +119,19 @@ class AsyncMessageStream(_AsyncMessageStream):
             response=parent.response,
             client=parent._client,  # noqa: SLF001
         )
+        # consumed after the sampled call, keep its weight
+        self._sample_weight = Scope3AI._sample_weight.get()
 
 
 class MessageStreamManager(Generic[MessageStreamT]):
     def __init__(self, api_request: Callable[[], MessageStream]) -> None:
         self.__api_request = api_request
+        self._sample_weight = Scope3AI._sample_weight.get()
 
     def __enter__(self) -> MessageStream:
         self.__stream = self.__api_request()
         self.__stream = MessageStream(self.__stream)
+        self.__stream._sample_weight = self._sample_weight
         return self.__stream
 
     def __exit__(
@@ -138,10 +147,12 @@ class MessageStreamManager(Generic[MessageStreamT]):
 class AsyncMessageStreamManager(Generic[AsyncMessageStreamT]):
     def __init__(self, api_request: Awaitable[AsyncMessageStream]) -> None:
         self.__api_request = api_request
+        self._sample_weight = Scope3AI._sample_weight.get()
 
     async def __aenter__(self) -> AsyncMessageStream:
         self.__stream = await self.__api_request
         self.__stream = AsyncMessageStream(self.__stream)
+        self.__stream._sample_weight = self._sample_weight
         return self.__stream
 
     async def __aexit__(
@@ -177,7 +188,8 @@ class Stream(_Stream[_T]):
             output_tokens=output_tokens,
             request_duration_ms=request_latency * 1000,
         )
-        self.scope3ai = Scope3AI.get_instance().submit_impact(scope3_row)
+        with weighted(self._sample_weight):
+            self.scope3ai = Scope3AI.get_instance().submit_impact(scope3_row)
 
     def __init__(self, parent) -> None:  # noqa: ANN001
         super().__init__(
@@ -185,6 +197,8 @@ class Stream(_Stream[_T]):
             response=parent.response,
             client=parent._client,  # noqa: SLF001
         )
+        # consumed after the sampled call, keep its weight
+        self._sample_weight = Scope3AI._sample_weight.get()
 
 
 class AsyncStream(_AsyncStream[_T]):
@@ -210,7 +224,8 @@ class AsyncStream(_AsyncStream[_T]):
             output_tokens=output_tokens,
             request_duration_ms=request_latency * 1000,
         )
-        self.scope3ai = await Scope3AI.get_instance().asubmit_impact(scope3_row)
+        with weighted(self._sample_weight):
+            self.scope3ai = await Scope3AI.get_instance().asubmit_impact(scope3_row)
 
     def __init__(self, parent) -> None:  # noqa: ANN001
         super().__init__(
@@ -218,6 +233,8 @@ class AsyncStream(_AsyncStream[_T]):
             response=parent.response,
             client=parent._client,  # noqa: SLF001
         )
+        # consumed after the sampled call, keep its weight
+        self._sample_weight = Scope3AI._sample_weight.get()
 
 
 def _anthropic_chat_wrapper(response: Message, request_latency: float) -> Message:
@@ -1,6 +1,6 @@
 from wrapt import wrap_function_wrapper  # type: ignore[import-untyped]
 
-from scope3ai.base_tracer import BaseTracer
+from scope3ai.base_tracer import BaseTracer, sampled
 from .chat import (
     cohere_chat_wrapper,
     cohere_async_chat_wrapper,
@@ -63,5 +63,5 @@ class CohereInstrumentor(BaseTracer):
     def instrument(self) -> None:
         for wrapper in self.wrapped_methods:
             wrap_function_wrapper(
-                wrapper["module"], wrapper["name"], wrapper["wrapper"]
+                wrapper["module"], wrapper["name"], sampled(wrapper["wrapper"])
             )
@@ -1,5 +1,5 @@
 from wrapt import wrap_function_wrapper  # type: ignore[import-untyped]
-from scope3ai.base_tracer import BaseTracer
+from scope3ai.base_tracer import BaseTracer, sampled
 
 from scope3ai.tracers.mistralai.chat import (
     mistralai_v1_chat_wrapper,
@@ -37,5 +37,5 @@ class MistralAIInstrumentor(BaseTracer):
     def instrument(self) -> None:
         for wrapper in self.wrapped_methods:
             wrap_function_wrapper(
-                wrapper["module"], wrapper["name"], wrapper["wrapper"]
+                wrapper["module"], wrapper["name"], sampled(wrapper["wrapper"])
             )
@@ -1,22 +1,271 @@
+import asyncio
 import logging
 import queue
 import threading
+from collections import OrderedDict, deque
 from time import monotonic, sleep
-from typing import Callable, Optional
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
 
 logger = logging.getLogger("scope3ai.worker")
 
 
+# what to do with a new item when the queue is full
+POLICY_BLOCK = "block"  # wait up to `timeout` for room, then drop the new item
+POLICY_DROP_NEWEST = "drop_newest"  # drop the new item
+POLICY_DROP_OLDEST = "drop_oldest"  # evict the oldest queued item
+POLICY_SPILL = "spill"  # hand the new item to the `on_spill` callback
+POLICIES = [POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST, POLICY_SPILL]
+
+
+class LaneQueue(queue.Queue):
+    """
+    FIFO queue with a priority lane, whose items are served first.
+    """
+
+    def _init(self, maxsize: int) -> None:
+        self.queue = deque()
+        self.priority = deque()
+        self._init_copies()
+
+    def _init_copies(self) -> None:
+        # ids of the items in the regular lane, and copies left of the items
+        # queued in both lanes, by id
+        self.members: Set[int] = set()
+        self.copies: Dict[int, int] = {}
+
+    def _qsize(self) -> int:
+        return len(self.queue) + len(self.priority)
+
+    def _put(self, item: Any) -> None:
+        self.queue.append(item)
+        self.members.add(id(item))
+
+    def _get(self) -> Any:
+        if self.priority:
+            return self._taken(self.priority.popleft(), regular=False)
+        return self._taken(self.queue.popleft())
+
+    def _taken(self, item: Any, regular: bool = True) -> Any:
+        if regular:
+            self.members.discard(id(item))
+        if self.copies:
+            left = self.copies.pop(id(item), 1)
+            if left > 1:
+                self.copies[id(item)] = left - 1
+        return item
+
+    def _evicted(self, item: Any) -> Any:
+        # the copy left in the priority lane, if any, is now the only one
+        self.members.discard(id(item))
+        self.copies.pop(id(item), None)
+        return item
+
+    def put_priority(self, item: Any, copy: bool = False) -> None:
+        """
+        Put an item in the priority lane, it never blocks. With `copy`, the
+        item may be in the regular lane too, and it is counted once by
+        `unique_qsize`.
+        """
+        with self.mutex:
+            if copy and id(item) in self.members and id(item) not in self.copies:
+                self.copies[id(item)] = 2
+            self.priority.append(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def unique_qsize(self) -> int:
+        """
+        Return the number of items waiting, an item queued in both lanes
+        counting once, and not at all once one of its copies is taken.
+        """
+        with self.mutex:
+            return self._qsize() - len(self.copies)
+
+    def evict_nowait(self, item: Any = None) -> Any:
+        """
+        Remove and return the oldest item of the regular lane, to make room
+        for `item`.
+        """
+        with self.mutex:
+            if not self.queue:
+                raise queue.Empty
+            oldest = self._evicted(self.queue.popleft())
+            self.not_full.notify()
+            return oldest
+
+
+class FairQueue(LaneQueue):
+    """
+    Queue with a priority lane and one FIFO sub-queue per tenant, served with
+    weighted round-robin: a tenant of weight 2 gets twice as many items as a
+    tenant of weight 1 while both have items waiting, so a busy tenant does
+    not delay the others.
+
+    Args:
+        maxsize (int): Maximum number of items in the queue, 0 for unbounded.
+        key (Callable): Return the tenant of an item.
+        weight (Callable, optional): Return the weight of a tenant, a positive
+            number. Defaults to 1 for all the tenants.
+        tenant_size (int, optional): Maximum number of items of a tenant in the
+            queue, 0 for unbounded. A put over it raises `queue.Full`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        key: Callable[[Any], Hashable] = lambda item: None,
+        weight: Optional[Callable[[Hashable], float]] = None,
+        tenant_size: int = 0,
+    ) -> None:
+        self.key = key
+        self.weight = weight or (lambda tenant: 1.0)
+        self.tenant_size = tenant_size
+        super().__init__(maxsize)
+
+    def _init(self, maxsize: int) -> None:
+        self.priority = deque()
+        # the tenants with items waiting, in their round-robin order
+        self.tenants: "OrderedDict[Hashable, deque]" = OrderedDict()
+        # deficit of the tenants, the number of items they can still take
+        self.credits: Dict[Hashable, float] = {}
+        self.count = 0
+        self._init_copies()
+
+    def _qsize(self) -> int:
+        return self.count + len(self.priority)
+
+    def _put(self, item: Any) -> None:
+        tenant = self.key(item)
+        items = self.tenants.get(tenant)
+        if items is None:
+            items = self.tenants[tenant] = deque()
+        elif self.tenant_size > 0 and len(items) >= self.tenant_size:
+            raise queue.Full
+        items.append(item)
+        self.count += 1
+        self.members.add(id(item))
+
+    def _get(self) -> Any:
+        if self.priority:
+            return self._taken(self.priority.popleft(), regular=False)
+        while True:
+            tenant, items = next(iter(self.tenants.items()))
+            credit = self.credits.get(tenant, 0.0)
+            if credit < 1:
+                credit += self.weight(tenant)
+                if credit < 1:
+                    # a weight below 1 takes several rounds to get an item
+                    self.credits[tenant] = credit
+                    self.tenants.move_to_end(tenant)
+                    continue
+            return self._take(tenant, items, credit - 1)
+
+    def _take(self, tenant: Hashable, items: deque, credit: float) -> Any:
+        item = self._taken(items.popleft())
+        self.count -= 1
+        if not items:
+            # an idle tenant does not keep its credit
+            del self.tenants[tenant]
+            self.credits.pop(tenant, None)
+        else:
+            self.credits[tenant] = credit
+            if credit < 1:
+                self.tenants.move_to_end(tenant)
+        return item
+
+    def evict_nowait(self, item: Any = None) -> Any:
+        """
+        Remove and return the oldest item of the tenant of `item` if it is at
+        its cap, otherwise of the tenant with the most items waiting.
+        """
+        with self.mutex:
+            if not self.tenants:
+                raise queue.Empty
+            tenant = self.key(item)
+            items = self.tenants.get(tenant)
+            if items is None or not (
+                self.tenant_size > 0 and len(items) >= self.tenant_size
+            ):
+                tenant, items = max(self.tenants.items(), key=lambda t: len(t[1]))
+            # the round-robin order is kept
+            oldest = self._evicted(items.popleft())
+            self.count -= 1
+            if not items:
+                del self.tenants[tenant]
+                self.credits.pop(tenant, None)
+            self.not_full.notify()
+            return oldest
+
+
 class BackgroundWorker:
     STOP_WORKER = object()
 
-    def __init__(self, size: int) -> None:
+    def __init__(
+        self,
+        size: int,
+        policy: str = POLICY_DROP_NEWEST,
+        timeout: Optional[float] = None,
+        on_drop: Optional[Callable[[Any], Optional[bool]]] = None,
+        on_spill: Optional[Callable[[Any], None]] = None,
+        tenant_key: Optional[Callable[[Any], Hashable]] = None,
+        tenant_weight: Optional[Callable[[Hashable], float]] = None,
+        tenant_size: int = 0,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        if policy == POLICY_SPILL and on_spill is None:
+            raise ValueError("The spill queue policy requires an on_spill callback")
         self._size = size
-        self._queue = queue.Queue(maxsize=size)
+        self._tenant_key = tenant_key
+        self._tenant_weight = tenant_weight
+        self._tenant_size = tenant_size
+        self._queue = self._new_queue()
         self._lock = threading.Lock()
         self._thread: Optional[threading.Thread] = None
         self._pause_event = threading.Event()
         self._pause_event.set()
+        self._flush_event = threading.Event()
+        self._policy = policy
+        self._timeout = timeout
+        self._on_drop = on_drop
+        self._on_spill = on_spill
+        self._stats_lock = threading.Lock()
+        self._dropped = 0
+        self._spilled = 0
+
+    def _new_queue(self) -> LaneQueue:
+        if self._tenant_key is None:
+            return LaneQueue(maxsize=self._size)
+        tenant_key = self._tenant_key
+
+        def key(item: Any) -> Hashable:
+            # the stop request belongs to no tenant
+            return None if item is self.STOP_WORKER else tenant_key(item)
+
+        return FairQueue(
+            maxsize=self._size,
+            key=key,
+            weight=self._tenant_weight,
+            tenant_size=self._tenant_size,
+        )
+
+    @property
+    def stats(self) -> dict:
+        """
+        Return the counters of the worker queue.
+        """
+        return {
+            # a promoted item is in both lanes, it counts once
+            "queued": self._queue.unique_qsize(),
+            "dropped": self._dropped,
+            "spilled": self._spilled,
+        }
+
+    def has_room(self, count: int = 1) -> bool:
+        """
+        Return True if `count` more items fit in the queue.
+        """
+        return self._size <= 0 or self._queue.qsize() + count <= self._size
 
     @property
     def is_alive(self) -> bool:
@@ -26,13 +275,82 @@ class BackgroundWorker:
         if not self.is_alive:
             self.start()
 
-    def submit(self, callback: Callable[[], None]) -> bool:
+    def submit(self, callback: Callable[[], None], priority: bool = False) -> bool:
+        """
+        Queue an item, applying the queue policy if the queue is full. Priority
+        items are served first, and are never dropped.
+        """
         self._ensure_thread()
+        if priority:
+            self._queue.put_priority(callback)
+            return True
         try:
-            self._queue.put_nowait(callback)
+            if self._policy == POLICY_BLOCK:
+                self._queue.put(callback, timeout=self._timeout)
+            else:
+                self._queue.put_nowait(callback)
             return True
         except queue.Full:
-            return False
+            pass
+
+        if self._policy == POLICY_SPILL:
+            try:
+                self._on_spill(callback)
+            except Exception:
+                logger.error("Failed spilling job", exc_info=True)
+                self._drop(callback)
+                return False
+            with self._stats_lock:
+                self._spilled += 1
+            return True
+        if self._policy == POLICY_DROP_OLDEST:
+            return self._submit_drop_oldest(callback)
+        self._drop(callback)
+        return False
+
+    def promote(self, item: Any) -> None:
+        """
+        Queue again in the priority lane an item already submitted, so it is
+        served first. Its copy left in the regular lane is not counted twice.
+        """
+        self._ensure_thread()
+        self._queue.put_priority(item, copy=True)
+
+    def _submit_drop_oldest(self, callback: Callable[[], None]) -> bool:
+        while True:
+            try:
+                self._queue.put_nowait(callback)
+                return True
+            except queue.Full:
+                pass
+            try:
+                oldest = self._queue.evict_nowait(callback)
+            except queue.Empty:
+                if self.has_room():
+                    continue
+                # the queue is full of priority items
+                self._drop(callback)
+                return False
+            self._queue.task_done()
+            if oldest is self.STOP_WORKER:
+                # never evict a stop request, drop the new item instead
+                self._queue.put_nowait(oldest)
+                self._drop(callback)
+                return False
+            self._drop(oldest)
+
+    def _drop(self, item: Any) -> None:
+        # `on_drop` returns False when the item is not lost, for instance
+        # still queued in the priority lane, it is not counted then
+        dropped = True
+        if self._on_drop is not None:
+            try:
+                dropped = self._on_drop(item) is not False
+            except Exception:
+                logger.error("Failed processing dropped job", exc_info=True)
+        if dropped:
+            with self._stats_lock:
+                self._dropped += 1
 
     def start(self) -> None:
         with self._lock:
@@ -50,45 +368,79 @@ class BackgroundWorker:
                 self._thread = None
 
     def kill(self) -> None:
+        """
+        Stop the worker once the items queued so far are processed. If the
+        queue is full, the items queued are discarded to make room for the
+        stop request, counted as dropped and handed to `on_drop`.
+        """
         logger.debug("Got kill signal")
+        items = []
         with self._lock:
             if not self._thread:
                 return
             try:
-                self._queue.put_nowait(self.STOP_WORKER)
+                try:
+                    self._queue.put_nowait(self.STOP_WORKER)
+                except queue.Full:
+                    items = self.drain()
+                    self._queue.put_nowait(self.STOP_WORKER)
             except queue.Full:
                 logger.debug("Failed to kill worker")
             except queue.ShutDown:
                 logger.debug("Worker already shutdown")
             self._thread = None
-            self._queue = queue.Queue(maxsize=self._size)
+            self._queue = self._new_queue()
+        # the same item can be queued in both lanes
+        unique = {id(item): item for item in items}
+        for item in unique.values():
+            self._drop(item)
+
+    def flush(self, timeout: Optional[float] = 5) -> bool:
+        """
+        Wait up to `timeout` seconds (forever if None) for the queued items
+        to be processed. Batches are sent without lingering meanwhile.
 
-    def flush(self, timeout: float = 5) -> None:
+        Returns:
+            bool: True if all the items were processed.
+        """
         logger.debug("Got flush signal")
         with self._lock:
             if not self.is_alive:
-                return
-            self._wait_flush(timeout)
+                return True
+            self._flush_event.set()
+            try:
+                flushed = self._wait_flush(timeout)
+            finally:
+                self._flush_event.clear()
         logger.debug("Worker flushed")
+        return flushed
 
-    def _wait_flush(self, timeout: float) -> None:
-        initial_timeout = min(0.1, timeout)
+    def _wait_flush(self, timeout: Optional[float]) -> bool:
+        initial_timeout = 0.1 if timeout is None else min(0.1, timeout)
         if not self._timed_queue_join(initial_timeout):
-            pending = self._queue.qsize() + 1
+            pending = self._queue.unfinished_tasks
             logger.debug(f"{pending} event(s) pending on flush")
 
-            if not self._timed_queue_join(timeout - initial_timeout):
-                pending = self._queue.qsize() + 1
-                logger.error(f"flush timed out, dropped {pending} events")
+            if timeout is not None:
+                timeout -= initial_timeout
+            if not self._timed_queue_join(timeout):
+                pending = self._queue.unfinished_tasks
+                logger.error(f"flush timed out, {pending} event(s) pending")
+                return False
+        return True
 
-    def _timed_queue_join(self, timeout: float) -> bool:
-        deadline = monotonic() + timeout
+    def _timed_queue_join(self, timeout: Optional[float]) -> bool:
+        if timeout is not None:
+            deadline = monotonic() + timeout
         queue = self._queue
 
         queue.all_tasks_done.acquire()
 
         try:
             while queue.unfinished_tasks:
+                if timeout is None:
+                    queue.all_tasks_done.wait()
+                    continue
                 delay = deadline - monotonic()
                 if delay <= 0:
                     return False
@@ -98,6 +450,26 @@ class BackgroundWorker:
         finally:
             queue.all_tasks_done.release()
 
+    def drain(self) -> List[Any]:
+        """
+        Remove and return the items waiting in the queue, not processed yet.
+        """
+        items = []
+        stop = False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if item is self.STOP_WORKER:
+                stop = True
+            else:
+                items.append(item)
+        if stop:
+            self._queue.put_nowait(self.STOP_WORKER)
+        return items
+
     def _run(self) -> None:
         q = self._queue
         while True:
@@ -119,3 +491,252 @@ class BackgroundWorker:
 
     def resume(self) -> None:
         self._pause_event.set()
+
+
+class BatchWorker(BackgroundWorker):
+    """
+    Background worker that coalesces queued items into batches.
+
+    Once an item is available, the worker keeps draining the queue until
+    either `batch_size` items are collected or `linger` seconds elapsed,
+    then hands the whole batch to `callback` in a single call.
+
+    If set, `gate` returns the time in seconds to wait before the next batch
+    can be sent (for instance while a circuit breaker is open). The worker
+    waits before draining the queue, so the batch grows meanwhile.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        callback: Callable[[List[Any]], None],
+        batch_size: int = 1000,
+        linger: float = 0.0,
+        gate: Optional[Callable[[], float]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(size, **kwargs)
+        self._callback = callback
+        self._batch_size = batch_size
+        self._linger = linger
+        self._gate = gate
+
+    def _wait_gate(self) -> None:
+        if self._gate is None:
+            return
+        while True:
+            delay = self._gate()
+            if delay <= 0:
+                return
+            sleep(delay)
+
+    def _fill_batch(self, q: queue.Queue, batch: List[Any]) -> bool:
+        # drain the queue into the batch, returns True if a stop was requested
+        # no need to wait for more items when flushing
+        linger = 0.0 if self._flush_event.is_set() else self._linger
+        deadline = monotonic() + linger
+        while len(batch) < self._batch_size:
+            delay = deadline - monotonic()
+            try:
+                if delay > 0:
+                    item = q.get(timeout=delay)
+                else:
+                    item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is self.STOP_WORKER:
+                q.task_done()
+                return True
+            batch.append(item)
+        return False
+
+    def _run(self) -> None:
+        self._run_batches(self._queue, self._process_batch)
+
+    def _run_batches(
+        self,
+        q: queue.Queue,
+        process: Callable[[queue.Queue, List[Any]], None],
+    ) -> None:
+        while True:
+            item = q.get()
+            if item is self.STOP_WORKER:
+                q.task_done()
+                break
+            self._pause_event.wait()
+            self._wait_gate()
+            batch = [item]
+            stop = self._fill_batch(q, batch)
+            process(q, batch)
+            if stop:
+                break
+            sleep(0)
+
+    def _process_batch(self, q: queue.Queue, batch: List[Any]) -> None:
+        try:
+            self._callback(batch)
+        except Exception:
+            logger.error(
+                f"Failed processing batch of {len(batch)} job(s)", exc_info=True
+            )
+        finally:
+            for _ in batch:
+                q.task_done()
+
+
+class AsyncBatchWorker(BatchWorker):
+    """
+    Batch worker that submits batches from a dedicated asyncio event loop.
+
+    Batches are collected like in `BatchWorker`, but `callback` is a coroutine
+    function scheduled on an event loop owned by the worker, with up to
+    `concurrency` batches in flight at once. When all the slots are busy,
+    the worker waits, letting the next batch grow meanwhile.
+
+    If set, `limit` further restricts the batches in flight, it must provide
+    `acquire` and `release` methods, like an `AdaptiveConcurrencyLimit`.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        callback: Callable[[List[Any]], Awaitable[None]],
+        batch_size: int = 1000,
+        linger: float = 0.0,
+        concurrency: int = 8,
+        limit: Optional[Any] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(size, callback, batch_size=batch_size, linger=linger, **kwargs)
+        self._concurrency = concurrency
+        self._limit = limit
+
+    def _run(self) -> None:
+        q = self._queue
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(
+            target=loop.run_forever,
+            name="scope3ai.AsyncBatchWorker.loop",
+            daemon=True,
+        )
+        loop_thread.start()
+        inflight = threading.BoundedSemaphore(self._concurrency)
+
+        def process(q: queue.Queue, batch: List[Any]) -> None:
+            inflight.acquire()
+            if self._limit:
+                self._limit.acquire()
+            future = asyncio.run_coroutine_threadsafe(self._aprocess_batch(batch), loop)
+
+            def done(_future) -> None:
+                if self._limit:
+                    self._limit.release()
+                inflight.release()
+                for _ in batch:
+                    q.task_done()
+
+            future.add_done_callback(done)
+
+        try:
+            self._run_batches(q, process)
+        finally:
+            # wait for the in-flight batches before stopping the loop
+            for _ in range(self._concurrency):
+                inflight.acquire()
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join()
+            loop.close()
+
+    async def _aprocess_batch(self, batch: List[Any]) -> None:
+        try:
+            await self._callback(batch)
+        except Exception:
+            logger.error(
+                f"Failed processing batch of {len(batch)} job(s)", exc_info=True
+            )
+
+
+class EventLoopBatcher:
+    """
+    Batcher of the items submitted by the coroutines of an event loop,
+    processed by background tasks of the same loop, without any thread.
+
+    The items submitted during the same iteration of the loop are handed
+    together to `callback`, in batches of at most `batch_size` items. It must
+    only be used from the thread running the loop.
+
+    If the tasks are cancelled before processing all the items, for instance
+    by `asyncio.run` returning, the items left are handed to `on_cancel`.
+
+    Args:
+        callback (Callable): Coroutine function called with each batch.
+        batch_size (int, optional): Maximum number of items per batch.
+            Defaults to 1000.
+        on_cancel (Callable, optional): Called with the items not processed,
+            including the batch being processed, when a task is cancelled.
+            Defaults to None.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[List[Any]], Awaitable[None]],
+        batch_size: int = 1000,
+        on_cancel: Optional[Callable[[List[Any]], None]] = None,
+    ) -> None:
+        self._callback = callback
+        self._batch_size = batch_size
+        self._on_cancel = on_cancel
+        self._pending: List[Any] = []
+        # the task to take the pending items
+        self._pending_task: Optional[asyncio.Task] = None
+        # keep a reference to the tasks, the loop only has weak ones
+        self._tasks = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, item: Any) -> None:
+        self._pending.append(item)
+        if len(self._pending) == 1:
+            task = asyncio.get_running_loop().create_task(self._run())
+            self._pending_task = task
+            self._tasks.add(task)
+            task.add_done_callback(self._on_done)
+
+    async def flush(self) -> None:
+        """
+        Wait for the items submitted so far to be processed.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        items = []
+        try:
+            # let the other tasks of this loop iteration submit their items
+            await asyncio.sleep(0)
+            items, self._pending = self._pending, []
+            while items:
+                batch = items[: self._batch_size]
+                try:
+                    await self._callback(batch)
+                except Exception:
+                    logger.error(
+                        f"Failed processing batch of {len(batch)} job(s)",
+                        exc_info=True,
+                    )
+                del items[: len(batch)]
+        except asyncio.CancelledError:
+            if items and self._on_cancel is not None:
+                self._on_cancel(items)
+            raise
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        # cancelled before taking the pending items, possibly before it even
+        # started, no other task would process them
+        if task.cancelled() and task is self._pending_task and self._pending:
+            items, self._pending = self._pending, []
+            if self._on_cancel is not None:
+                self._on_cancel(items)
@@ -167,3 +167,23 @@ def fix_vcr_body_read_missing_seek():
     vcr.request.Request.__init__ = _fixed__request_init
     yield
     vcr.request.Request.__init__ = request_init_orig
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    from tests.utils import MockImpactAPI
+
+    api = MockImpactAPI()
+    api.install(monkeypatch)
+    return api
+
+
+@pytest.fixture
+def tracer_mock_init(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[])
+    try:
+        yield scope3
+    finally:
+        scope3.close()
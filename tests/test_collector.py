@@ -0,0 +1,161 @@
+import os
+import threading
+
+import pytest
+
+from scope3ai.api.types import ImpactRow
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="Unix sockets are not available on this platform"
+)
+
+
+@pytest.fixture
+def collector(tmp_path):
+    from scope3ai.api.types import ImpactMetrics, ModeledRow
+    from scope3ai.collector import Collector
+
+    received = []
+
+    def submit(ctx):
+        received.append(ctx.request)
+        metrics = ImpactMetrics(
+            usage_energy_wh=1,
+            usage_emissions_gco2e=2,
+            usage_water_ml=3,
+            embodied_emissions_gco2e=4,
+            embodied_water_ml=5,
+        )
+        ctx.set_impact(ModeledRow(total_impact=metrics))
+
+    # keep the path short, Unix socket paths are limited to ~100 characters
+    path = os.path.join(str(tmp_path), "c.sock")
+    server = Collector(path, submit)
+    server.received = received
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_collector_submit(collector):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], collector=collector.path
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        with scope3.trace() as tracer:
+            contexts = [
+                scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+                for i in range(5)
+            ]
+            scope3._worker.resume()
+            impact = tracer.impact(timeout=2)
+
+        assert impact.total_energy_wh == 5
+        for ctx in contexts:
+            assert ctx.wait_impact(timeout=2).total_impact.usage_energy_wh == 1
+        assert [row.input_tokens for row in collector.received] == list(range(5))
+        assert [row.request_id for row in collector.received] == [
+            ctx.request.request_id for ctx in contexts
+        ]
+    finally:
+        scope3.close()
+
+
+def test_collector_unreachable(tmp_path):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        collector=os.path.join(str(tmp_path), "missing.sock"),
+    )
+    try:
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        impact = ctx.wait_impact(timeout=2)
+        assert impact.error.code == "submission_failed"
+    finally:
+        scope3.close()
+
+
+def test_collector_already_running(collector):
+    from scope3ai.collector import Collector
+
+    with pytest.raises(OSError):
+        Collector(collector.path, lambda ctx: None)
+
+
+def test_collector_ignores_its_own_socket(tmp_path, monkeypatch, mock_api):
+    import signal
+    import sys
+    import time
+    import warnings
+
+    from scope3ai import Scope3AI
+    from scope3ai.collector import run_collector
+
+    # the collector and the processes share the same environment
+    path = os.path.join(str(tmp_path), "c.sock")
+    monkeypatch.setenv("SCOPE3AI_COLLECTOR", path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            run_collector(path, api_key="DUMMY")
+            code = 0
+        finally:
+            sys.stderr.flush()
+            os._exit(code)
+
+    try:
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[])
+        try:
+            assert scope3.collector == path
+            ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+            impact = ctx.wait_impact(timeout=5)
+            assert impact.total_impact.usage_energy_wh == 1
+        finally:
+            scope3.close()
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_collector_socket_private(tmp_path, monkeypatch):
+    import stat
+
+    from scope3ai.collector import Collector, default_socket_path
+
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    path = default_socket_path()
+    assert path == os.path.join(str(tmp_path), "scope3ai.sock")
+    server = Collector(path, lambda ctx: None)
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    finally:
+        server.server_close()
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    path = default_socket_path()
+    runtime_dir = os.path.dirname(path)
+    assert runtime_dir == os.path.join(str(tmp_path), f"scope3ai-{os.getuid()}")
+    assert stat.S_IMODE(os.stat(runtime_dir).st_mode) == 0o700
+
+    # a directory other users can write to is refused
+    os.chmod(runtime_dir, 0o777)
+    with pytest.raises(OSError):
+        default_socket_path()
@@ -0,0 +1,52 @@
+import gzip
+import json
+
+import pytest
+
+
+def test_encode_json_body():
+    from scope3ai.api.compression import encode_json_body
+
+    payload = {"rows": [{"model_id": "gpt_4o", "input_tokens": 100}] * 100}
+    body, headers = encode_json_body(payload)
+    assert headers == {"Content-Type": "application/json"}
+    assert json.loads(body) == payload
+
+    body, headers = encode_json_body(payload, "gzip", threshold=1024)
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == payload
+    assert len(body) < len(json.dumps(payload))
+
+
+def test_encode_json_body_threshold():
+    from scope3ai.api.compression import encode_json_body
+
+    body, headers = encode_json_body({"rows": []}, "gzip", threshold=1024)
+    assert "Content-Encoding" not in headers
+    assert json.loads(body) == {"rows": []}
+
+
+def test_resolve_encoding(monkeypatch):
+    import importlib.util
+
+    from scope3ai.api.compression import resolve_encoding
+
+    assert resolve_encoding(None) is None
+    assert resolve_encoding("gzip") == "gzip"
+    with pytest.raises(ValueError):
+        resolve_encoding("brotli")
+
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+    assert resolve_encoding("zstd") == "gzip"
+
+
+def test_client_compression(mock_api):
+    from scope3ai.api.client import Client
+    from scope3ai.api.types import ImpactRequest, ImpactRow
+
+    client = Client(api_key="DUMMY", compression="gzip", compression_threshold=0)
+    rows = [ImpactRow(model_id="gpt_4o", input_tokens=i) for i in range(10)]
+    response = client.get_impact(ImpactRequest(rows=rows))
+    assert len(response.rows) == 10
+    assert mock_api.headers[0]["Content-Encoding"] == "gzip"
+    assert len(mock_api.requests[0]["rows"]) == 10
@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from scope3ai.api.types import ImpactRow
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import scope3ai.api.concurrency
+
+    now = [100.0]
+    monkeypatch.setattr(scope3ai.api.concurrency, "monotonic", lambda: now[0])
+    return now
+
+
+def test_adaptive_limit_increase(clock):
+    from scope3ai.api.concurrency import AdaptiveConcurrencyLimit
+
+    limit = AdaptiveConcurrencyLimit(max_limit=4)
+    assert limit.limit == 1
+    for _ in range(20):
+        limit.record(0.1)
+    assert limit.limit == 4
+
+
+def test_adaptive_limit_decrease(clock):
+    from scope3ai.api.concurrency import AdaptiveConcurrencyLimit
+
+    limit = AdaptiveConcurrencyLimit(max_limit=16, initial_limit=16)
+    limit.record(0.1)
+    # latency doubled: the limit is cut once per round trip
+    limit.record(0.3)
+    assert limit.limit == 12
+    limit.record(0.3)
+    assert limit.limit == 12
+    clock[0] += 0.5
+    limit.record(0.3)
+    assert limit.limit == 9
+
+    clock[0] += 1
+    limit.record(0.1, overloaded=True)
+    assert limit.limit == 6
+    clock[0] += 1
+    for _ in range(10):
+        limit.record(0.1, overloaded=True)
+        clock[0] += 1
+    assert limit.limit == 1
+
+
+def test_adaptive_limit_acquire():
+    from scope3ai.api.concurrency import AdaptiveConcurrencyLimit
+
+    limit = AdaptiveConcurrencyLimit(max_limit=2, initial_limit=1)
+    limit.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limit.acquire()
+        acquired.set()
+
+    threading.Thread(target=acquire, daemon=True).start()
+    assert not acquired.wait(0.1)
+    limit.release()
+    assert acquired.wait(1)
+    assert limit.inflight == 1
+
+
+def test_adaptive_concurrency_asyncio_submitter(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        submitter="asyncio",
+        batch_size=1,
+        concurrency=4,
+        adaptive_concurrency=True,
+    )
+    try:
+        assert scope3.stats()["concurrency_limit"] == 1
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o")) for _ in range(10)
+        ]
+        for ctx in contexts:
+            assert ctx.wait_impact(timeout=2).error is None
+        scope3._worker.flush()
+        stats = scope3.stats()
+        assert 1 <= stats["concurrency_limit"] <= 4
+        assert stats["inflight"] == 0
+    finally:
+        scope3.close()
+
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency_sync_mode(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        sync_mode=True,
+        adaptive_concurrency=True,
+    )
+    try:
+        ctx = await scope3.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.impact.error is None
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.impact.error is None
+        assert scope3.stats()["inflight"] == 0
+    finally:
+        scope3.close()
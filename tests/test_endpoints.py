@@ -0,0 +1,185 @@
+import httpx
+import pytest
+
+from scope3ai.api.types import ImpactRequest, ImpactRow
+
+IMPACT_RESPONSE = {
+    "rows": [
+        {
+            "total_impact": {
+                "usage_energy_wh": 1,
+                "usage_emissions_gco2e": 2,
+                "usage_water_ml": 3,
+                "embodied_emissions_gco2e": 4,
+                "embodied_water_ml": 5,
+            }
+        }
+    ],
+    "has_errors": False,
+}
+
+PRIMARY = "https://primary.example.com"
+SECONDARY = "https://secondary.example.com"
+
+
+def make_request():
+    return ImpactRequest(rows=[ImpactRow(model_id="gpt_4o", request_id="r")])
+
+
+def test_endpoint_pool_lowest_latency():
+    from scope3ai.api.endpoints import EndpointPool
+
+    pool = EndpointPool([PRIMARY, SECONDARY])
+    # the endpoints are measured first, in order
+    assert pool.select() == PRIMARY
+    pool.record_success(PRIMARY, 0.2)
+    assert pool.select() == SECONDARY
+    pool.record_success(SECONDARY, 0.1)
+    assert pool.select() == SECONDARY
+
+    # the latency is a moving average
+    pool.record_success(SECONDARY, 1.1)
+    assert pool.stats[SECONDARY]["latency"] == pytest.approx(0.3)
+    assert pool.select() == PRIMARY
+
+
+def test_endpoint_pool_failure_cooldown(monkeypatch):
+    from scope3ai.api import endpoints
+    from scope3ai.api.endpoints import EndpointPool
+
+    now = [100.0]
+    monkeypatch.setattr(endpoints, "monotonic", lambda: now[0])
+    pool = EndpointPool([PRIMARY, SECONDARY], cooldown=5, max_cooldown=8)
+    pool.record_success(PRIMARY, 0.1)
+    pool.record_success(SECONDARY, 0.5)
+
+    pool.record_failure(PRIMARY)
+    assert pool.stats[PRIMARY]["up"] is False
+    assert pool.select() == SECONDARY
+    assert pool.can_failover({SECONDARY}) is False
+
+    # the endpoint is tried again once its cooldown is over
+    now[0] += 5
+    assert pool.select() == PRIMARY
+    # the cooldown doubles on consecutive failures, up to the maximum
+    pool.record_failure(PRIMARY)
+    now[0] += 7.9
+    assert pool.select() == SECONDARY
+    now[0] += 0.1
+    assert pool.select() == PRIMARY
+    pool.record_success(PRIMARY, 0.1)
+    assert pool.endpoints[0].failures == 0
+
+
+def test_client_failover():
+    from scope3ai.api.client import Client
+    from scope3ai.api.endpoints import EndpointPool
+
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == "primary.example.com":
+            return httpx.Response(503)
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    pool = EndpointPool([PRIMARY, SECONDARY])
+    client = Client(
+        api_key="DUMMY", transport=httpx.MockTransport(handler), endpoints=pool
+    )
+    # failed over without waiting for a retry
+    response = client.get_impact(make_request())
+    assert len(response.rows) == 1
+    assert hosts == ["primary.example.com", "secondary.example.com"]
+
+    # the primary is not used while it is down
+    hosts.clear()
+    client.get_impact(make_request())
+    assert hosts == ["secondary.example.com"]
+
+
+def test_client_failover_circuit_probe():
+    from scope3ai.api.client import Client
+    from scope3ai.api.endpoints import EndpointPool
+    from scope3ai.api.retry import CircuitBreaker
+
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == "primary.example.com":
+            return httpx.Response(503)
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    # the reset timeout is over, the next request is the probe
+    breaker._opened_at -= 60
+    client = Client(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        endpoints=EndpointPool([PRIMARY, SECONDARY]),
+        circuit_breaker=breaker,
+    )
+    # the probe fails over to the secondary, it is not rejected by itself
+    response = client.get_impact(make_request())
+    assert len(response.rows) == 1
+    assert hosts == ["primary.example.com", "secondary.example.com"]
+    assert breaker.state == breaker.CLOSED
+
+
+def test_client_all_endpoints_down():
+    from scope3ai.api.client import Client
+    from scope3ai.api.endpoints import EndpointPool
+
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        return httpx.Response(503)
+
+    client = Client(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        endpoints=EndpointPool([PRIMARY, SECONDARY]),
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        client.get_impact(make_request())
+    # every endpoint is tried once without a retry policy
+    assert sorted(hosts) == ["primary.example.com", "secondary.example.com"]
+
+
+@pytest.mark.asyncio
+async def test_async_client_failover():
+    from scope3ai.api.client import AsyncClient
+    from scope3ai.api.endpoints import EndpointPool
+
+    hosts = []
+
+    async def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == "primary.example.com":
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    client = AsyncClient(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        endpoints=EndpointPool([PRIMARY, SECONDARY]),
+    )
+    response = await client.get_impact(make_request())
+    assert len(response.rows) == 1
+    assert hosts == ["primary.example.com", "secondary.example.com"]
+
+
+def test_init_api_urls(monkeypatch):
+    from scope3ai import Scope3AI
+
+    monkeypatch.setenv("SCOPE3AI_API_URLS", f"{PRIMARY}, {SECONDARY}")
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[])
+    try:
+        assert scope3.api_url == PRIMARY
+        assert scope3._sync_client.endpoints is scope3._endpoints
+        assert list(scope3.stats()["endpoints"]) == [PRIMARY, SECONDARY]
+    finally:
+        scope3.close()
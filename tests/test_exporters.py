@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from scope3ai.api.types import ImpactMetrics, ImpactRow, ModeledRow
+
+IMPACT = ModeledRow(
+    total_impact=ImpactMetrics(
+        usage_energy_wh=1,
+        usage_emissions_gco2e=2,
+        usage_water_ml=3,
+        embodied_emissions_gco2e=4,
+        embodied_water_ml=5,
+    )
+)
+
+
+def make_rows(count: int):
+    return [
+        ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=str(i))
+        for i in range(count)
+    ]
+
+
+def test_file_exporter_buffers_and_rotates(tmp_path):
+    from scope3ai.exporters import FileExporter
+
+    path = tmp_path / "impacts" / "rows.ndjson"
+    exporter = FileExporter(str(path), max_bytes=200, backup_count=2, buffer_size=100)
+    exporter.export(make_rows(1))
+    # buffered until the buffer is full
+    assert not path.exists()
+    exporter.export(make_rows(2))
+    assert len(path.read_text().splitlines()) == 3
+
+    for _ in range(4):
+        exporter.export(make_rows(2))
+    exporter.close()
+    rotated = sorted(p.name for p in path.parent.iterdir())
+    assert rotated == ["rows.ndjson", "rows.ndjson.1", "rows.ndjson.2"]
+    for name in rotated:
+        for line in (path.parent / name).read_text().splitlines():
+            assert json.loads(line)["model_id"] == "gpt_4o"
+
+
+def test_stdout_exporter():
+    import io
+
+    from scope3ai.exporters import StdoutExporter
+
+    stream = io.StringIO()
+    assert StdoutExporter(stream).export(make_rows(2)) is None
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)["request_id"] for line in lines] == ["0", "1"]
+
+
+def test_memory_exporter():
+    from scope3ai.exporters import MemoryExporter
+
+    exporter = MemoryExporter()
+    assert exporter.export(make_rows(2)) is None
+    assert len(exporter.rows) == 2
+    exporter.clear()
+    assert exporter.rows == []
+    assert MemoryExporter(impact=IMPACT).export(make_rows(2)) == [IMPACT, IMPACT]
+
+
+def test_submit_impact_exported_copies(mock_api):
+    from scope3ai import Scope3AI
+    from scope3ai.exporters import MemoryExporter
+
+    copies = MemoryExporter()
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], exporters=["api", copies]
+    )
+    try:
+        contexts = [scope3.submit_impact(row) for row in make_rows(3)]
+        assert scope3.flush(timeout=2) is True
+        assert all(ctx.impact.error is None for ctx in contexts)
+        assert len(mock_api.requests) == 1
+        assert [row.request_id for row in copies.rows] == ["0", "1", "2"]
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_without_api(mock_api, tmp_path):
+    from scope3ai import Scope3AI
+    from scope3ai.exporters import MemoryExporter
+
+    path = tmp_path / "rows.ndjson"
+    memory = MemoryExporter(impact=IMPACT)
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        exporters=[memory, "file"],
+        export_path=str(path),
+    )
+    try:
+        ctx = scope3.submit_impact(make_rows(1)[0])
+        assert scope3.flush(timeout=2) is True
+        # resolved by the first exporter, without network
+        assert ctx.impact == IMPACT
+        assert mock_api.requests == []
+        assert len(path.read_text().splitlines()) == 1
+    finally:
+        scope3.close()
+
+
+@pytest.mark.asyncio
+async def test_asubmit_impact_exported_without_impact(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], sync_mode=True, exporters=["memory"]
+    )
+    try:
+        ctx = await scope3.asubmit_impact(make_rows(1)[0])
+        assert ctx.impact.error.code == "exported"
+        assert len(scope3._exporter.rows) == 1
+        assert mock_api.requests == []
+    finally:
+        scope3.close()
+
+
+def test_init_file_exporter_requires_export_path():
+    from scope3ai import Scope3AI
+    from scope3ai.lib import Scope3AIError
+
+    with pytest.raises(Scope3AIError):
+        Scope3AI.init(api_key="DUMMY", provider_clients=[], exporters=["file"])
+    Scope3AI._instance = None
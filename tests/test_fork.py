@@ -0,0 +1,122 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+from scope3ai.api.types import ImpactRow
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="fork is not available on this platform"
+)
+
+
+def run_in_child(func) -> int:
+    # run func in a forked child and return its exit code
+    with warnings.catch_warnings():
+        # forking a multi-threaded process is what this test is about
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            code = 0 if func() else 1
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def test_fork_child_submits(tracer_mock_init, mock_api):
+    ctx = tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+    assert ctx.wait_impact(timeout=2) is not None
+    assert tracer_mock_init._worker.is_alive
+    tracer_mock_init._sync_client.client  # open the parent connection pool
+    parent_client = tracer_mock_init._sync_client._client
+
+    def child():
+        scope3 = tracer_mock_init
+        assert scope3._worker is None
+        assert not hasattr(scope3._sync_client, "_client")
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.wait_impact(timeout=2) is not None
+        assert scope3._sync_client._client is not parent_client
+        return True
+
+    assert run_in_child(child) == 0
+
+    # the parent is untouched
+    assert tracer_mock_init._sync_client._client is parent_client
+    ctx = tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+    assert ctx.wait_impact(timeout=2) is not None
+
+
+def test_fork_parent_keeps_queued_rows(tmp_path, mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], spool_path=str(tmp_path), durable=True
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert scope3.stats()["queued"] == 1
+
+        def child():
+            # the queued row is the parent's, the child does not resubmit it
+            assert scope3.stats() == {
+                "queued": 0,
+                "dropped": 0,
+                "spilled": 0,
+                "spooled": 0,
+            }
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+            assert scope3._spool.pending == 1
+            return True
+
+        assert run_in_child(child) == 0
+
+        # the child wrote its own segment next to the parent one
+        assert len(list(tmp_path.glob("*.ndjson"))) == 2
+        scope3._worker.resume()
+        assert ctx.wait_impact(timeout=2) is not None
+        assert len(mock_api.requests) == 1
+    finally:
+        scope3.close()
+
+
+def test_fork_child_segments_adopted(tmp_path, mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], spool_path=str(tmp_path), durable=True
+    )
+    try:
+        scope3._spool.adopt_interval = 0
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+        def child():
+            # the parent is alive, its segment is not replayed by the child
+            assert scope3._spool.has_pending is False
+            scope3._spool.append(ImpactRow(model_id="gpt_4o", request_id="child"))
+            # killed without closing the spool
+            return True
+
+        assert run_in_child(child) == 0
+
+        # the segment of the child gone is adopted by the parent
+        assert scope3._spool.has_pending is True
+        rows = scope3._spool.replay(10)
+        assert [row.request_id for row in rows] == ["child"]
+        scope3._worker.resume()
+    finally:
+        scope3.close()
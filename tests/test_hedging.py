@@ -0,0 +1,161 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from scope3ai.api.types import ImpactRequest, ImpactRow
+
+IMPACT_RESPONSE = {
+    "rows": [
+        {
+            "total_impact": {
+                "usage_energy_wh": 1,
+                "usage_emissions_gco2e": 2,
+                "usage_water_ml": 3,
+                "embodied_emissions_gco2e": 4,
+                "embodied_water_ml": 5,
+            }
+        }
+    ],
+    "has_errors": False,
+}
+
+
+def make_policy(latency=0.01, **kwargs):
+    from scope3ai.api.hedging import HedgingPolicy
+
+    policy = HedgingPolicy(**kwargs)
+    for _ in range(100):
+        policy.record(latency)
+    return policy
+
+
+def make_request():
+    return ImpactRequest(rows=[ImpactRow(model_id="gpt_4o", request_id="r")])
+
+
+def test_hedging_policy_delay():
+    from scope3ai.api.hedging import HedgingPolicy
+
+    policy = HedgingPolicy(percentile=0.9, window=10, min_samples=5)
+    for latency in range(4):
+        policy.record(latency)
+    assert policy.delay() is None
+    for latency in range(4, 20):
+        policy.record(latency)
+    # only the last 10 latencies are considered
+    assert policy.delay() == 19
+
+
+def test_hedging_policy_budget():
+    from scope3ai.api.hedging import HedgingPolicy
+
+    policy = HedgingPolicy(max_ratio=0.25)
+    for _ in range(8):
+        policy.record(0.01)
+    # 8 requests allow 2 hedged requests
+    assert [policy.acquire() for _ in range(3)] == [True, True, False]
+    assert policy.hedged == 2
+
+    # the budget is capped
+    policy = make_policy(max_ratio=0.5)
+    assert sum(policy.acquire() for _ in range(20)) == policy.MAX_BUDGET
+
+
+def test_client_hedged_request():
+    from scope3ai.api.client import Client
+
+    calls = []
+    daemons = []
+    release = threading.Event()
+
+    def handler(request):
+        calls.append(request.headers["Idempotency-Key"])
+        daemons.append(threading.current_thread().daemon)
+        if len(calls) == 1:
+            # the first request hangs
+            release.wait(timeout=2)
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    client = Client(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        hedging=make_policy(),
+    )
+    started = time.monotonic()
+    response = client.get_impact(make_request(), hedge=True)
+    assert time.monotonic() - started < 1
+    assert len(response.rows) == 1
+    # both requests are in flight at once, with the same idempotency key
+    assert len(calls) == 2 and calls[0] == calls[1]
+    # the slow request does not hold up the interpreter exit
+    assert daemons == [True, True]
+    release.set()
+
+    # requests are not hedged unless asked
+    calls.clear()
+    client.hedging = make_policy(latency=0.0)
+    client.get_impact(make_request())
+    assert len(calls) == 1
+
+
+def test_client_hedging_budget_spent():
+    from scope3ai.api.client import Client
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        time.sleep(0.05)
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    client = Client(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        hedging=make_policy(max_ratio=0),
+    )
+    client.get_impact(make_request(), hedge=True)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_client_hedged_request():
+    import asyncio
+
+    from scope3ai.api.client import AsyncClient
+
+    calls = []
+    cancelled = asyncio.Event()
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(2)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return httpx.Response(200, json=IMPACT_RESPONSE)
+
+    client = AsyncClient(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        hedging=make_policy(),
+    )
+    response = await asyncio.wait_for(
+        client.get_impact(make_request(), hedge=True), timeout=1
+    )
+    assert len(response.rows) == 1
+    assert len(calls) == 2
+    # the slow request is cancelled
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_init_hedge_percentile_invalid():
+    from scope3ai import Scope3AI
+    from scope3ai.lib import Scope3AIError
+
+    with pytest.raises(Scope3AIError):
+        Scope3AI.init(api_key="DUMMY", provider_clients=[], hedge_percentile=1.5)
+    Scope3AI._instance = None
@@ -0,0 +1,70 @@
+import pytest
+
+from scope3ai.api.types import ImpactRow, Scope3AIContext
+
+
+def make_ctx(**timestamps) -> Scope3AIContext:
+    ctx = Scope3AIContext(request=ImpactRow(model_id="gpt_4o"))
+    ctx._timestamps.update(timestamps)
+    return ctx
+
+
+def test_stage_durations():
+    from scope3ai.latency import stage_durations
+
+    ctx = make_ctx(built=1.0, enqueued=1.0, dequeued=1.5, sent=1.75)
+    assert stage_durations(ctx) == {"queue": 0.5, "batch": 0.25}
+
+
+def test_latency_histograms():
+    from scope3ai.latency import LatencyHistograms
+
+    histograms = LatencyHistograms()
+    for queued in (0.001, 0.002, 0.003, 0.2):
+        histograms.record(make_ctx(enqueued=10.0, dequeued=10.0 + queued))
+    queue = histograms.snapshot()["queue"]
+    assert queue["count"] == 4
+    assert queue["sum"] == pytest.approx(0.206)
+    assert queue["max"] == pytest.approx(0.2)
+    assert queue["p50"] == 0.0025
+    assert queue["p99"] == pytest.approx(0.2)
+    buckets = dict(queue["buckets"])
+    assert [buckets[bound] for bound in (0.001, 0.0025, 0.005, 0.25)] == [1, 1, 1, 1]
+    assert histograms.snapshot()["request"]["count"] == 0
+
+    histograms.reset()
+    assert histograms.snapshot()["queue"]["count"] == 0
+
+
+def test_submit_impact_timestamps(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], latency_histograms=True
+    )
+    try:
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o", request_duration_ms=50))
+            for _ in range(3)
+        ]
+        assert scope3.flush(timeout=2) is True
+        for ctx in contexts:
+            ctx.wait_impact(timeout=2)
+            timestamps = ctx.timestamps
+            stages = sorted(timestamps, key=timestamps.get)
+            assert stages == [
+                "started",
+                "built",
+                "enqueued",
+                "dequeued",
+                "sent",
+                "received",
+                "resolved",
+            ]
+            assert timestamps["built"] - timestamps["started"] == pytest.approx(0.05)
+
+        latency = scope3.stats()["latency"]
+        assert latency["queue"]["count"] == 3
+        assert latency["pipeline"]["count"] == 3
+    finally:
+        scope3.close()
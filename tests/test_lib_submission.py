@@ -0,0 +1,633 @@
+import pytest
+
+from scope3ai.api.types import ImpactRow
+
+
+def test_submit_impact_batched(tracer_mock_init, mock_api):
+    tracer_mock_init._ensure_worker()
+    tracer_mock_init._worker.pause()
+
+    contexts = [
+        tracer_mock_init.submit_impact(
+            ImpactRow(model_id="gpt_4o", input_tokens=i, output_tokens=i)
+        )
+        for i in range(10)
+    ]
+
+    tracer_mock_init._worker.resume()
+    for ctx in contexts:
+        assert ctx.wait_impact(timeout=2) is not None
+        assert ctx.impact.total_impact.usage_energy_wh == 1
+
+    # all the pending rows were sent in a single request, in order
+    assert len(mock_api.requests) == 1
+    rows = mock_api.requests[0]["rows"]
+    assert [row["input_tokens"] for row in rows] == list(range(10))
+
+
+def test_submit_impact_batched_tracer(tracer_mock_init, mock_api):
+    tracer_mock_init._ensure_worker()
+    tracer_mock_init._worker.pause()
+
+    with tracer_mock_init.trace() as tracer:
+        for i in range(3):
+            tracer_mock_init.submit_impact(
+                ImpactRow(model_id="gpt_4o", input_tokens=i, output_tokens=i)
+            )
+        tracer_mock_init._worker.resume()
+        impact = tracer.impact(timeout=2)
+
+    assert len(impact.rows) == 3
+    assert impact.total_energy_wh == 3
+    assert len(mock_api.requests) == 1
+
+
+def test_submit_impact_sync_mode(tracer_mock_init, mock_api):
+    tracer_mock_init.sync_mode = True
+    ctx = tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+    assert ctx.impact is not None
+    assert len(mock_api.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_asubmit_impact_deferred(mock_api):
+    import asyncio
+
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], sync_mode=True, async_deferred=True
+    )
+    try:
+
+        async def call(i):
+            return await scope3.asubmit_impact(
+                ImpactRow(model_id="gpt_4o", input_tokens=i)
+            )
+
+        # the calls return before the impact is submitted
+        ctx = await call(0)
+        assert ctx.impact is None
+        assert (await ctx.await_impact(timeout=2)).error is None
+
+        contexts = await asyncio.gather(*[call(i) for i in range(5)])
+        for ctx in contexts:
+            assert (await ctx.await_impact(timeout=2)).error is None
+        # the concurrent calls are submitted in a single batch
+        assert len(mock_api.requests) == 2
+        assert len(mock_api.requests[1]["rows"]) == 5
+
+        await scope3.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+        assert await scope3.aflush(timeout=2) is True
+        assert len(mock_api.requests) == 3
+        assert scope3._worker is None
+    finally:
+        scope3.close()
+
+
+def test_asubmit_impact_deferred_loop_closed(mock_api):
+    import asyncio
+
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], sync_mode=True, async_deferred=True
+    )
+    try:
+
+        async def main():
+            return [
+                await scope3.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+                for _ in range(3)
+            ]
+
+        # the loop is closed before the batching task runs, the rows are
+        # submitted by the background worker instead
+        contexts = asyncio.run(main())
+        for ctx in contexts:
+            assert ctx.wait_impact(timeout=2).error is None
+        assert sum(len(request["rows"]) for request in mock_api.requests) == 3
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_asyncio_submitter(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        submitter="asyncio",
+        batch_size=2,
+        concurrency=4,
+    )
+    try:
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+            for i in range(10)
+        ]
+        for ctx in contexts:
+            assert ctx.wait_impact(timeout=2) is not None
+        sent = sorted(
+            row["input_tokens"] for r in mock_api.requests for row in r["rows"]
+        )
+        assert sent == list(range(10))
+        assert all(len(r["rows"]) <= 2 for r in mock_api.requests)
+    finally:
+        scope3.close()
+
+
+def test_init_invalid_submitter():
+    import pytest
+    from scope3ai import Scope3AI
+    from scope3ai.lib import Scope3AIError
+
+    with pytest.raises(Scope3AIError):
+        Scope3AI.init(api_key="DUMMY", provider_clients=[], submitter="invalid")
+    Scope3AI._instance = None
+
+
+def test_submit_impact_queue_full_drop(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        queue_size=1,
+        queue_policy="drop_newest",
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker._ensure_thread = lambda: None
+        ctx1 = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        ctx2 = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+        # the dropped context does not block its waiters
+        assert ctx1.impact is None
+        assert ctx2.wait_impact(timeout=0) is not None
+        assert ctx2.impact.error.code == "queue_full"
+        assert scope3.stats()["dropped"] == 1
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_fair_queueing(mock_api, monkeypatch):
+    from scope3ai import Scope3AI
+
+    monkeypatch.setenv("SCOPE3AI_TENANT_WEIGHTS", "a=2,a/p=3")
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        fair_queueing=True,
+        tenant_queue_size=2,
+    )
+    try:
+        assert scope3._tenant_weight(("a", "p")) == 3
+        assert scope3._tenant_weight(("a", None)) == 2
+        assert scope3._tenant_weight(("b", None)) == 1
+
+        scope3._ensure_worker()
+        scope3._worker._ensure_thread = lambda: None
+        with scope3.trace(client_id="a"):
+            contexts = [
+                scope3.submit_impact(ImpactRow(model_id="gpt_4o")) for _ in range(3)
+            ]
+        with scope3.trace(client_id="b"):
+            other = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+        # only the tenant over its cap has rows dropped
+        assert contexts[2].impact.error.code == "queue_full"
+        assert other.impact is None
+        assert scope3.stats()["queued"] == 3
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_queue_full_spill(mock_api, tmp_path):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        queue_size=1,
+        queue_policy="spill",
+        spool_path=str(tmp_path),
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+            for i in range(3)
+        ]
+        spilled = [ctx for ctx in contexts if ctx.impact is not None]
+        assert len(spilled) >= 1
+        assert all(ctx.impact.error.code == "spilled" for ctx in spilled)
+        assert scope3._spool.has_pending
+
+        # once the worker runs, the spilled rows are submitted too
+        scope3._worker.resume()
+        scope3._worker.flush()
+        assert not scope3._spool.has_pending
+        sent = sorted(
+            row["input_tokens"] for r in mock_api.requests for row in r["rows"]
+        )
+        assert sent == [0, 1, 2]
+    finally:
+        scope3.close()
+
+
+def test_init_spill_requires_spool_path():
+    import pytest
+    from scope3ai import Scope3AI
+    from scope3ai.lib import Scope3AIError
+
+    with pytest.raises(Scope3AIError):
+        Scope3AI.init(api_key="DUMMY", provider_clients=[], queue_policy="spill")
+    Scope3AI._instance = None
+
+
+def test_submit_impact_durable(mock_api, tmp_path):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        spool_path=str(tmp_path),
+        durable=True,
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        for i in range(3):
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+        assert scope3.stats()["spooled"] == 3
+    finally:
+        # simulate a process killed before submitting the rows
+        scope3._spool.close()
+        Scope3AI._instance = None
+
+    # a new process replays the rows left in the spool at init
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        spool_path=str(tmp_path),
+        durable=True,
+    )
+    try:
+        scope3._worker.flush()
+        sent = sorted(
+            row["input_tokens"] for r in mock_api.requests for row in r["rows"]
+        )
+        assert sent == [0, 1, 2]
+        assert scope3.stats()["spooled"] == 0
+    finally:
+        scope3.close()
+
+
+def test_flush(mock_api):
+    import asyncio
+
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[])
+    try:
+        assert scope3.flush() is True
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert asyncio.run(scope3.aflush(timeout=2)) is True
+        assert ctx.impact is not None
+        assert len(mock_api.requests) == 1
+    finally:
+        scope3.close()
+
+
+def test_shutdown_deadline_spills_pending_rows(mock_api, tmp_path):
+    import time
+
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        spool_path=str(tmp_path),
+        shutdown_timeout=0.1,
+    )
+    try:
+        scope3._ensure_worker()
+        scope3._worker.pause()
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+            for i in range(3)
+        ]
+        # the worker holds the first row until resumed
+        while scope3._worker._queue.qsize() > 2:
+            time.sleep(0.01)
+
+        scope3._shutdown(scope3.shutdown_timeout)
+        assert contexts[0].impact is None
+        for ctx in contexts[1:]:
+            assert ctx.impact.error.code == "shutdown"
+        assert scope3.stats()["spooled"] == 2
+        assert mock_api.requests == []
+    finally:
+        scope3.close()
+
+
+def test_close_resolves_pending_rows(mock_api):
+    import time
+
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], shutdown_timeout=0.1)
+    scope3._ensure_worker()
+    scope3._worker.pause()
+    contexts = [
+        scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+        for i in range(3)
+    ]
+    # the worker holds the first row until resumed
+    while scope3._worker._queue.qsize() > 2:
+        time.sleep(0.01)
+
+    scope3.close()
+    for ctx in contexts[1:]:
+        assert ctx.wait_impact(timeout=0).error.code == "shutdown"
+    scope3._worker.resume()
+
+
+def test_submit_impact_skips_acknowledged_rows(tracer_mock_init, mock_api):
+    from scope3ai.api.client import IDEMPOTENCY_KEY_HEADER, idempotency_key
+
+    row = ImpactRow(model_id="gpt_4o", request_id="request-0")
+    ctx = tracer_mock_init.submit_impact(row)
+    assert ctx.wait_impact(timeout=2).error is None
+    assert ctx.request.request_id == "request-0"
+    assert mock_api.headers[0][IDEMPOTENCY_KEY_HEADER] == idempotency_key(
+        {"rows": [{"request_id": "request-0"}]}
+    )
+
+    # the same row submitted again, as by a replay, is not sent
+    again = tracer_mock_init.submit_impact(
+        ImpactRow(model_id="gpt_4o", request_id="request-0")
+    )
+    assert again.wait_impact(timeout=2).error.code == "duplicate"
+    assert len(mock_api.requests) == 1
+
+
+def test_submit_impact_failure_resolves_context(mock_api):
+    import httpx
+
+    from scope3ai import Scope3AI
+
+    def handler(request):
+        return  # a 400 or 422 would quarantine the row as invalid
+        return httpx.Response(403)
+
+    mock_api.handler = handler
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[])
+    try:
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.wait_impact(timeout=2) is not None
+        assert ctx.impact.error.code == "submission_failed"
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_circuit_breaker_holds_batches(mock_api):
+    import httpx
+
+    from scope3ai import Scope3AI
+
+    handle = mock_api.handler
+    healthy = False
+
+    def handler(request):
+        if not healthy:
+            return httpx.Response(503)
+        return handle(request)
+
+    mock_api.handler = handler
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        max_retries=0,
+        circuit_breaker_threshold=1,
+        circuit_breaker_timeout=0.5,
+    )
+    try:
+        failed = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert failed.wait_impact(timeout=2).error.code == "submission_failed"
+        assert scope3._circuit_breaker.state == "open"
+
+        # while the circuit is open, the rows wait in the queue
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        healthy = True
+        assert ctx.wait_impact(timeout=2).error is None
+        assert scope3._circuit_breaker.state == "closed"
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_waited_overtakes_backlog(tracer_mock_init, mock_api):
+    import time
+
+    tracer_mock_init.batch_size = 2
+    tracer_mock_init._ensure_worker()
+    tracer_mock_init._worker.pause()
+
+    contexts = [
+        tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+        for i in range(6)
+    ]
+    urgent = tracer_mock_init.submit_impact(
+        ImpactRow(model_id="gpt_4o", input_tokens=100), priority=True
+    )
+    # the worker takes the first row, then waits for the resume
+    deadline = time.monotonic() + 2
+    while tracer_mock_init.stats()["queued"] > 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tracer_mock_init.stats()["queued"] == 6
+    with pytest.raises(TimeoutError):
+        # waiting promotes the last row of the backlog
+        contexts[-1].wait_impact(timeout=0)
+    # the promoted row is in both lanes of the queue, it is counted once
+    assert tracer_mock_init.stats()["queued"] == 6
+    tracer_mock_init._worker.resume()
+    for ctx in contexts + [urgent]:
+        assert ctx.wait_impact(timeout=2).error is None
+
+    sent = [row["input_tokens"] for req in mock_api.requests for row in req["rows"]]
+    # the first row may have been taken by the worker before it was paused
+    assert set(sent[:3]) == {0, 100, 5}
+    assert sent[3:] == [1, 2, 3, 4]
+
+
+def test_submit_batch_quarantines_invalid_rows(mock_api):
+    import json
+
+    import httpx
+
+    from scope3ai import Scope3AI
+    from scope3ai.api.types import Scope3AIContext
+
+    handler = mock_api.handler
+    rejected = []
+
+    def reject_poison(request):
+        if request.url.path == "/v1/impact":
+            rows = json.loads(request.read())["rows"]
+            if any(row.get("input_tokens") == 13 for row in rows):
+                rejected.append(len(rows))
+                return httpx.Response(422, json={"message": "invalid row"})
+        return handler(request)
+
+    mock_api.handler = reject_poison
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], max_retries=0)
+    try:
+        contexts = [
+            Scope3AIContext(
+                request=ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=str(i))
+            )
+            for i in range(16)
+        ]
+        # not valid against the API schema, never sent
+        contexts[3].request.input_images = ["not-a-size"]
+        scope3._submit_batch(contexts)
+
+        assert contexts[3].impact.error.code == "invalid_row"
+        assert "input_images" in contexts[3].impact.error.message
+        assert contexts[13].impact.error.code == "invalid_row"
+        valid = [ctx for i, ctx in enumerate(contexts) if i not in (3, 13)]
+        assert all(ctx.impact.error is None for ctx in valid)
+        # the poison row is isolated with one rejected request per halving
+        assert rejected == [15, 8, 4, 2, 1]
+        sent = sorted(
+            row["request_id"] for body in mock_api.requests for row in body["rows"]
+        )
+        assert sent == sorted(ctx.request.request_id for ctx in valid)
+    finally:
+        scope3.close()
+
+
+def test_submit_batch_rejected_as_a_whole(mock_api, tmp_path):
+    import httpx
+
+    from scope3ai import Scope3AI
+    from scope3ai.api.types import Scope3AIContext
+
+    handler = mock_api.handler
+    rejected = []
+
+    def reject_all(request):
+        if request.url.path == "/v1/impact":
+            rejected.append(request)
+            return httpx.Response(400, json={"message": "invalid request"})
+        return handler(request)
+
+    mock_api.handler = reject_all
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        max_retries=0,
+        durable=True,
+        spool_path=str(tmp_path),
+    )
+    try:
+        contexts = [
+            Scope3AIContext(
+                request=ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=str(i))
+            )
+            for i in range(16)
+        ]
+        for ctx in contexts:
+            scope3._spool.append(ctx.request, lease=True)
+        with pytest.raises(httpx.HTTPStatusError):
+            scope3._submit_batch(contexts)
+
+        # every row is rejected alone too
+        assert len(rejected) == 31
+        assert all(ctx.impact.error.code == "submission_failed" for ctx in contexts)
+        # the rows are kept in the spool to be replayed, not quarantined
+        assert scope3._spool.pending == 16
+        assert scope3._spool.has_pending
+    finally:
+        scope3.close()
+
+
+def test_submit_batch_quarantines_rows_of_both_halves(mock_api):
+    import json
+
+    import httpx
+
+    from scope3ai import Scope3AI
+    from scope3ai.api.types import Scope3AIContext
+
+    handler = mock_api.handler
+
+    def reject_poison(request):
+        if request.url.path == "/v1/impact":
+            rows = json.loads(request.read())["rows"]
+            if any(row.get("input_tokens") in (2, 12) for row in rows):
+                return httpx.Response(422, json={"message": "invalid row"})
+        return handler(request)
+
+    mock_api.handler = reject_poison
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], max_retries=0)
+    try:
+        contexts = [
+            Scope3AIContext(
+                request=ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=str(i))
+            )
+            for i in range(16)
+        ]
+        scope3._submit_batch(contexts)
+
+        # the invalid rows are in both halves, the others are submitted
+        for i, ctx in enumerate(contexts):
+            if i in (2, 12):
+                assert ctx.impact.error.code == "invalid_row"
+            else:
+                assert ctx.impact.error is None
+    finally:
+        scope3.close()
+
+
+def test_submit_batch_missing_impacts(mock_api, tmp_path):
+    import json
+
+    import httpx
+
+    from scope3ai import Scope3AI
+    from scope3ai.api.types import Scope3AIContext
+
+    handler = mock_api.handler
+
+    def drop_last_row(request):
+        response = handler(request)
+        if request.url.path == "/v1/impact":
+            body = json.loads(response.content)
+            body["rows"] = body["rows"][:-1]
+            return httpx.Response(200, json=body)
+        return response
+
+    mock_api.handler = drop_last_row
+    scope3 = Scope3AI.init(
+        api_key="DUMMY", provider_clients=[], durable=True, spool_path=str(tmp_path)
+    )
+    try:
+        contexts = [
+            Scope3AIContext(
+                request=ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=str(i))
+            )
+            for i in range(4)
+        ]
+        for ctx in contexts:
+            scope3._spool.append(ctx.request, lease=True)
+        scope3._submit_batch(contexts)
+
+        assert all(ctx.impact.error is None for ctx in contexts[:3])
+        # the row without an impact is resolved, and kept to be replayed
+        assert contexts[3].wait_impact(timeout=0).error.code == "submission_failed"
+        assert scope3._spool.pending == 1
+    finally:
+        scope3.close()
@@ -0,0 +1,83 @@
+import httpx
+import pytest
+
+from scope3ai.api.types import ImpactRequest, ImpactRow
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import scope3ai.api.ratelimit
+
+    now = [100.0]
+    monkeypatch.setattr(scope3ai.api.ratelimit, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket(clock):
+    from scope3ai.api.ratelimit import TokenBucket
+
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.retry_after(1) == 0.5
+    # reservations go into debt
+    assert bucket.reserve(1) == 0.5
+    assert bucket.reserve(2) == 1.5
+    clock[0] += 1.5
+    assert bucket.retry_after(1) == 0.5
+    # refill is capped at the capacity
+    clock[0] += 10
+    assert bucket.reserve(2) == 0
+    assert bucket.retry_after(1) == 0.5
+
+
+def test_rate_limiter(clock):
+    from scope3ai.api.ratelimit import RateLimiter
+
+    limiter = RateLimiter(requests_per_second=10, rows_per_second=100)
+    assert limiter.retry_after() == 0
+    assert limiter.reserve(rows=300) == 2
+    assert limiter.retry_after() == pytest.approx(2.01)
+    assert RateLimiter().reserve(rows=1000) == 0
+
+
+def test_client_rate_limited(clock, monkeypatch):
+    import scope3ai.api.client
+    from scope3ai.api.client import Client
+    from scope3ai.api.ratelimit import RateLimiter
+
+    delays = []
+    monkeypatch.setattr(scope3ai.api.client, "sleep", delays.append)
+
+    def handler(request):
+        return httpx.Response(200, json={"rows": [], "has_errors": False})
+
+    client = Client(api_key="DUMMY", rate_limiter=RateLimiter(rows_per_second=10))
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    rows = [ImpactRow(model_id="gpt_4o")] * 15
+    client.get_impact(content=ImpactRequest(rows=rows))
+    client.get_impact(content=ImpactRequest(rows=rows[:5]))
+    assert delays == [0.5, 1.0]
+
+
+def test_worker_batches_while_rate_limited(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], requests_per_second=2)
+    try:
+        # use the tokens of the bucket
+        for _ in range(2):
+            ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+            ctx.wait_impact(timeout=2)
+        assert len(mock_api.requests) == 2
+
+        # the next rows wait for a token in the queue, in a single batch
+        contexts = [
+            scope3.submit_impact(ImpactRow(model_id="gpt_4o")) for _ in range(10)
+        ]
+        for ctx in contexts:
+            assert ctx.wait_impact(timeout=2).error is None
+        assert len(mock_api.requests) == 3
+        assert len(mock_api.requests[2]["rows"]) == 10
+    finally:
+        scope3.close()
@@ -0,0 +1,206 @@
+import httpx
+import pytest
+
+
+def make_status_error(status_code: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://aiapi.scope3.com/v1/impact")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def make_client(handler, **kwargs):
+    from scope3ai.api.client import Client
+
+    client = Client(api_key="DUMMY", api_url="https://aiapi.scope3.com", **kwargs)
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_retry_policy_delay():
+    from scope3ai.api.retry import RetryPolicy
+
+    policy = RetryPolicy(max_retries=3, backoff_base=1, backoff_max=3, jitter=False)
+    assert policy.get_delay(0, make_status_error(503)) == 1
+    assert policy.get_delay(1, make_status_error(500)) == 2
+    assert policy.get_delay(2, make_status_error(502)) == 3
+    assert policy.get_delay(3, make_status_error(502)) is None
+    assert policy.get_delay(0, httpx.ConnectError("error")) == 1
+    # client errors are not retried
+    assert policy.get_delay(0, make_status_error(400)) is None
+    assert policy.get_delay(0, ValueError()) is None
+
+
+def test_retry_policy_jitter():
+    from scope3ai.api.retry import RetryPolicy
+
+    policy = RetryPolicy(backoff_base=1, backoff_max=10)
+    for _ in range(20):
+        assert 0 <= policy.get_delay(2, make_status_error(503)) <= 4
+
+
+def test_retry_policy_retry_after():
+    from scope3ai.api.retry import RetryPolicy
+
+    policy = RetryPolicy(backoff_max=10)
+    assert policy.get_delay(0, make_status_error(429, {"Retry-After": "7"})) == 7
+    assert policy.get_delay(0, make_status_error(429, {"Retry-After": "60"})) == 10
+
+
+def test_circuit_breaker():
+    from scope3ai.api.retry import CircuitBreaker
+    import time
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    assert breaker.allow_request() is True
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow_request() is False
+    assert breaker.retry_after() > 0
+
+    time.sleep(0.2)
+    assert breaker.retry_after() == 0
+    # only one probe is let through
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    assert breaker.state == "half_open"
+
+    # a failed probe opens the circuit again
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.2)
+    assert breaker.allow_request() is True
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request() is True
+
+
+def test_circuit_breaker_lost_probe():
+    from scope3ai.api.retry import CircuitBreaker
+    import time
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    breaker.record_failure()
+    time.sleep(0.2)
+    assert breaker.allow_request() is True
+
+    # a probe given up opens the circuit again
+    breaker.release()
+    assert breaker.state == "open"
+    assert breaker.allow_request() is False
+
+    # a probe never answered is replaced by another one
+    time.sleep(0.2)
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    time.sleep(0.2)
+    assert breaker.retry_after() == 0
+    assert breaker.allow_request() is True
+
+
+def test_client_retry():
+    from scope3ai.api.retry import RetryPolicy
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ready": True})
+
+    client = make_client(handler, retry_policy=RetryPolicy(backoff_base=0.01))
+    assert client.status() is not None
+    assert len(calls) == 3
+
+
+def test_client_no_retry_on_client_error():
+    from scope3ai.api.retry import RetryPolicy
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    client = make_client(handler, retry_policy=RetryPolicy(backoff_base=0.01))
+    with pytest.raises(httpx.HTTPStatusError):
+        client.status()
+    assert len(calls) == 1
+
+
+def test_client_circuit_breaker():
+    from scope3ai.api.client import CircuitOpenError
+    from scope3ai.api.retry import CircuitBreaker
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    client = make_client(
+        handler, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    )
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            client.status()
+    with pytest.raises(CircuitOpenError):
+        client.status()
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_retry():
+    from scope3ai.api.client import AsyncClient
+    from scope3ai.api.retry import RetryPolicy
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 2:
+            raise httpx.ConnectError("error")
+        return httpx.Response(200, json={"ready": True})
+
+    client = AsyncClient(
+        api_key="DUMMY",
+        api_url="https://aiapi.scope3.com",
+        retry_policy=RetryPolicy(backoff_base=0.01),
+    )
+    client.create_client = lambda: httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    )
+    assert await client.status() is not None
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_cancelled_probe():
+    import asyncio
+
+    from scope3ai.api.client import AsyncClient
+    from scope3ai.api.retry import CircuitBreaker
+
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = AsyncClient(
+        api_key="DUMMY", api_url="https://aiapi.scope3.com", circuit_breaker=breaker
+    )
+    client.create_client = lambda: httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    )
+    breaker.record_failure()
+    await asyncio.sleep(0.05)
+
+    task = asyncio.ensure_future(client.status())
+    await asyncio.sleep(0.05)
+    assert breaker.state == "half_open"
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # the probe is released, the next one goes through after the timeout
+    assert breaker.state == "open"
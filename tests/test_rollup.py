@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from scope3ai.api.types import ImpactMetrics, ImpactRow, ModeledRow, Scope3AIContext
+
+
+def make_ctx(**fields) -> Scope3AIContext:
+    fields.setdefault("model_id", "gpt_4o")
+    fields.setdefault("utc_datetime", datetime(2024, 1, 1, 10, 30, tzinfo=timezone.utc))
+    fields.setdefault("request_id", "r")
+    return Scope3AIContext(request=ImpactRow(**fields))
+
+
+def make_impact(energy: float) -> ModeledRow:
+    return ModeledRow(
+        total_impact=ImpactMetrics(
+            usage_energy_wh=energy,
+            usage_emissions_gco2e=energy,
+            usage_water_ml=energy,
+            embodied_emissions_gco2e=0,
+            embodied_water_ml=0,
+        )
+    )
+
+
+def make_rollup(submitted: list, now: datetime):
+    from scope3ai.rollup import Rollup
+
+    # the windows are submitted on flush only, at the time given
+    return Rollup(3600, submitted.append, clock=now.timestamp, background=False)
+
+
+def test_rollup_merges_rows_of_a_window():
+    submitted = []
+    rollup = make_rollup(submitted, datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+    contexts = [
+        make_ctx(input_tokens=10, output_tokens=20, request_duration_ms=100),
+        make_ctx(input_tokens=30, output_tokens=40, request_duration_ms=200),
+        make_ctx(input_tokens=5, client_id="other"),
+        make_ctx(
+            input_tokens=5,
+            utc_datetime=datetime(2024, 1, 1, 11, 5, tzinfo=timezone.utc),
+        ),
+    ]
+    for ctx in contexts:
+        rollup.add(ctx)
+    # the windows of 10:00 and 11:00 are over
+    assert rollup.flush() == 3
+    rollup.close()
+
+    rows = sorted(
+        (ctx.request for ctx in submitted),
+        key=lambda row: (row.utc_datetime, row.client_id or ""),
+    )
+    merged = rows[0]
+    assert merged.input_tokens == 40
+    assert merged.output_tokens == 60
+    assert merged.request_duration_ms == 300
+    assert merged.utc_datetime == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+    assert merged.request_id not in (None, "r")
+    assert rows[1].client_id == "other"
+    assert rows[2].utc_datetime == datetime(2024, 1, 1, 11, tzinfo=timezone.utc)
+    assert rollup.stats == {"rollup_calls": 4, "rollup_rows": 3}
+
+
+def test_rollup_keeps_open_windows():
+    submitted = []
+    rollup = make_rollup(submitted, datetime(2024, 1, 1, 10, 45, tzinfo=timezone.utc))
+    rollup.add(make_ctx())
+    assert rollup.flush() == 0
+    assert rollup.flush(force=True) == 1
+    assert len(submitted) == 1
+    rollup.close()
+
+
+def test_rollup_window_submitted_in_background():
+    import time
+
+    from scope3ai.rollup import Rollup
+
+    submitted = []
+    rollup = Rollup(0.2, submitted.append)
+    rollup.add(make_ctx(utc_datetime=datetime.now(tz=timezone.utc)))
+    deadline = time.monotonic() + 2
+    while not submitted and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(submitted) == 1
+    rollup.close()
+
+
+def test_rollup_splits_rows_above_api_bounds():
+    from scope3ai.rollup import FIELD_MAX
+
+    submitted = []
+    rollup = make_rollup(submitted, datetime(2024, 1, 1, 10, 45, tzinfo=timezone.utc))
+    limit = FIELD_MAX["input_audio_seconds"]
+    for _ in range(3):
+        rollup.add(make_ctx(input_audio_seconds=limit / 2))
+    # the third row does not fit, the first two are submitted early
+    assert len(submitted) == 1
+    assert submitted[0].request.input_audio_seconds == limit
+    rollup.flush(force=True)
+    assert len(submitted) == 2
+    rollup.close()
+
+
+def test_rollup_shares_impact_by_tokens():
+    submitted = []
+    rollup = make_rollup(submitted, datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+    contexts = [
+        make_ctx(input_tokens=10, output_tokens=10),
+        make_ctx(input_tokens=60),
+    ]
+    for ctx in contexts:
+        rollup.add(ctx)
+    rollup.flush()
+    rollup.close()
+
+    submitted[0].set_impact(make_impact(8))
+    energies = [ctx.impact.total_impact.usage_energy_wh for ctx in contexts]
+    assert energies == pytest.approx([2, 6])
+
+
+def test_rollup_invalid_row_fails_its_window_only():
+    submitted = []
+    rollup = make_rollup(submitted, datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+    invalid = make_ctx(input_tokens=10)
+    # not checked when assigned, the rolled up row is not valid
+    invalid.request.input_images = ["not-a-size"]
+    valid = make_ctx(input_tokens=10, client_id="other")
+    rollup.add(invalid)
+    rollup.add(valid)
+    assert rollup.flush() == 2
+    rollup.close()
+
+    assert invalid.wait_impact(timeout=0).error.code == "invalid_row"
+    assert [ctx.request.client_id for ctx in submitted] == ["other"]
+    assert valid.impact is None
+
+
+def test_submit_impact_rollup(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], rollup_window=3600)
+    try:
+        with scope3.trace() as tracer:
+            contexts = [
+                scope3.submit_impact(ImpactRow(model_id="gpt_4o", input_tokens=i))
+                for i in range(1, 4)
+            ]
+            assert scope3.flush(timeout=2) is True
+            impact = tracer.impact(timeout=2)
+
+        assert len(mock_api.requests) == 1
+        (row,) = mock_api.requests[0]["rows"]
+        assert row["input_tokens"] == 6
+        shares = [ctx.impact.total_impact.usage_energy_wh for ctx in contexts]
+        assert shares == pytest.approx([1 / 6, 2 / 6, 3 / 6])
+        assert impact.total_energy_wh == pytest.approx(1)
+        assert scope3.stats()["rollup_calls"] == 3
+    finally:
+        scope3.close()
+
+
+def test_submit_impact_rollup_invalid_row(mock_api):
+    from scope3ai import Scope3AI
+
+    scope3 = Scope3AI.init(api_key="DUMMY", provider_clients=[], rollup_window=3600)
+    try:
+        row = ImpactRow(model_id="gpt_4o", input_tokens=1)
+        row.input_images = ["not-a-size"]
+        # quarantined before it is merged with other rows
+        ctx = scope3.submit_impact(row)
+        assert ctx.wait_impact(timeout=0).error.code == "invalid_row"
+        assert scope3.stats()["rollup_calls"] == 0
+    finally:
+        scope3.close()
@@ -0,0 +1,142 @@
+import pytest
+
+from scope3ai.api.types import ImpactMetrics, ImpactRow, ModeledRow
+
+
+def make_row(energy: float) -> ModeledRow:
+    return ModeledRow(
+        total_impact=ImpactMetrics(
+            usage_energy_wh=energy,
+            usage_emissions_gco2e=energy,
+            usage_water_ml=energy,
+            embodied_emissions_gco2e=0,
+            embodied_water_ml=0,
+        )
+    )
+
+
+def test_tracer_extrapolation(tracer_mock_init):
+    from scope3ai.api.tracer import Tracer
+
+    tracer = Tracer()
+    tracer.add_impact(make_row(1))
+    response = tracer._impact()
+    assert response.total_energy_wh == 1
+    assert response.total_energy_wh_interval is None
+
+    child = Tracer()
+    child._link_parent(tracer)
+    child.add_impact(make_row(2), weight=10)
+    child.add_impact(make_row(3), weight=10)
+    response = tracer._impact()
+    assert response.total_energy_wh == pytest.approx(1 + 20 + 30)
+    # var = sum(w * (w - 1) * y^2) = 90 * (4 + 9)
+    margin = 1.96 * (90 * 13) ** 0.5
+    low, high = response.total_energy_wh_interval
+    assert low == pytest.approx(max(0, 51 - margin))
+    assert high == pytest.approx(51 + margin)
+    assert response.total_gco2e == response.total_energy_wh
+
+
+def test_submit_impact_sample_weight(tracer_mock_init, monkeypatch):
+    import random
+
+    from scope3ai.base_tracer import sampled
+
+    def wrapper(wrapped, instance, args, kwargs):
+        return tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+    submit = sampled(wrapper)
+    monkeypatch.setattr(random, "random", lambda: 0.1)
+    tracer_mock_init.sample_rate = 0.5
+    with tracer_mock_init.trace(sample_rate=0.25) as tracer:
+        with tracer_mock_init.trace() as child:
+            assert child.sample_rate == 0.25
+        ctx = submit(None, None, (), {})
+        assert ctx.sample_weight == 4
+        impact = tracer.impact(timeout=2)
+    assert impact.total_energy_wh == 4
+    assert impact.total_energy_wh_interval is not None
+
+    ctx = submit(None, None, (), {})
+    assert ctx.sample_weight == 2
+
+
+def test_submit_impact_manual_and_sampled(tracer_mock_init, monkeypatch):
+    import random
+
+    from scope3ai.base_tracer import sampled
+
+    def wrapper(wrapped, instance, args, kwargs):
+        return tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+    def stream_wrapper(wrapped, instance, args, kwargs):
+        yield "chunk"
+        tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+
+    monkeypatch.setattr(random, "random", lambda: 0.1)
+    with tracer_mock_init.trace(sample_rate=0.5) as tracer:
+        manual = tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+        ctx = sampled(wrapper)(None, None, (), {})
+        stream = sampled(stream_wrapper)(None, None, (), {})
+        # the weight is not set out of the sampled call
+        after = tracer_mock_init.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert list(stream) == ["chunk"]
+        impact = tracer.impact(timeout=2)
+    assert manual.sample_weight == 1
+    assert after.sample_weight == 1
+    assert ctx.sample_weight == 2
+    assert len(impact.rows) == 4
+    # 2 manual rows of 1 call and 2 sampled rows of 2 calls
+    assert impact.total_energy_wh == 6
+
+
+@pytest.mark.asyncio
+async def test_asubmit_impact_sampled_coroutine(tracer_mock_init, monkeypatch):
+    import random
+
+    from scope3ai.base_tracer import sampled
+
+    async def wrapper(wrapped, instance, args, kwargs):
+        return await tracer_mock_init.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+
+    monkeypatch.setattr(random, "random", lambda: 0.1)
+    with tracer_mock_init.trace(sample_rate=0.25):
+        ctx = await sampled(wrapper)(None, None, (), {})
+        manual = await tracer_mock_init.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+    assert ctx.sample_weight == 4
+    assert manual.sample_weight == 1
+
+
+def test_sampled_wrapper(tracer_mock_init, monkeypatch):
+    import random
+
+    from scope3ai.base_tracer import sampled
+
+    calls = []
+
+    def wrapper(wrapped, instance, args, kwargs):
+        calls.append(args)
+        return wrapped(*args, **kwargs)
+
+    wrapped = sampled(wrapper)
+    assert wrapped(lambda x: x * 2, None, (1,), {}) == 2
+    assert calls == [(1,)]
+
+    tracer_mock_init.sample_rate = 0.1
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    assert wrapped(lambda x: x * 2, None, (2,), {}) == 4
+    assert calls == [(1,)]
+
+    monkeypatch.setattr(random, "random", lambda: 0.05)
+    assert wrapped(lambda x: x * 2, None, (3,), {}) == 6
+    assert calls == [(1,), (3,)]
+
+
+def test_invalid_sample_rate(mock_api):
+    from scope3ai import Scope3AI
+    from scope3ai.lib import Scope3AIError
+
+    with pytest.raises(Scope3AIError):
+        Scope3AI.init(api_key="DUMMY", provider_clients=[], sample_rate=0)
+    Scope3AI._instance = None
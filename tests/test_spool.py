@@ -0,0 +1,110 @@
+from scope3ai.api.types import ImpactRow
+
+
+def make_row(i: int) -> ImpactRow:
+    return ImpactRow(model_id="gpt_4o", input_tokens=i, request_id=f"request-{i}")
+
+
+def test_spool_replay_ack(tmp_path):
+    from scope3ai.spool import Spool
+
+    spool = Spool(str(tmp_path), segment_size=2)
+    assert spool.has_pending is False
+
+    for i in range(3):
+        spool.append(make_row(i))
+    assert spool.has_pending is True
+    assert spool.pending == 3
+
+    rows = spool.replay(10)
+    assert [row.input_tokens for row in rows] == [0, 1, 2]
+    # leased rows are not replayed twice
+    assert spool.has_pending is False
+    assert spool.replay(10) == []
+
+    spool.ack(["request-0", "request-1"])
+    assert spool.pending == 1
+    # the first segment is fully acknowledged and removed
+    assert len(list(tmp_path.glob("*.ndjson"))) == 1
+
+
+def test_spool_lease_release(tmp_path):
+    from scope3ai.spool import Spool
+
+    spool = Spool(str(tmp_path))
+    spool.append(make_row(0), lease=True)
+    assert spool.has_pending is False
+    assert spool.replay(10) == []
+
+    spool.release(["request-0"])
+    assert [row.input_tokens for row in spool.replay(10)] == [0]
+
+
+def test_spool_reopen(tmp_path):
+    from scope3ai.spool import Spool
+
+    spool = Spool(str(tmp_path))
+    for i in range(3):
+        spool.append(make_row(i), lease=True)
+    spool.ack(["request-1"])
+    spool.close()
+
+    # unacknowledged rows survive a new spool instance on the same directory
+    spool = Spool(str(tmp_path))
+    rows = spool.replay(10)
+    assert [row.input_tokens for row in rows] == [0, 2]
+    assert rows[0].model_dump(exclude_unset=True) == {
+        "model_id": "gpt_4o",
+        "input_tokens": 0,
+        "request_id": "request-0",
+    }
+
+    spool.ack(["request-0", "request-2"])
+    spool.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_skip_partial_line(tmp_path):
+    from scope3ai.spool import Spool
+
+    spool = Spool(str(tmp_path))
+    spool.append(make_row(0))
+    spool.close()
+    segment = next(tmp_path.glob("*.ndjson"))
+    with segment.open("a") as fd:
+        fd.write('{"model_id": "gpt')
+
+    assert len(Spool(str(tmp_path)).replay(10)) == 1
+
+
+def test_spool_shared_directory(tmp_path):
+    from scope3ai.spool import Spool
+
+    first = Spool(str(tmp_path))
+    first.append(make_row(0))
+    second = Spool(str(tmp_path), adopt_interval=0)
+    second.append(make_row(1))
+
+    # the segments of a live spool are not replayed by the other one
+    assert [row.input_tokens for row in second.replay(10)] == [1]
+    assert second.has_pending is False
+
+    # once gone, its segments are adopted
+    first.close()
+    assert second.has_pending is True
+    assert [row.input_tokens for row in second.replay(10)] == [0]
+    second.ack(["request-0", "request-1"])
+    second.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_acked_set_evicts_oldest():
+    from scope3ai.spool import AckedSet
+
+    acked = AckedSet(maxsize=2)
+    acked.add(["request-0", "request-1", None])
+    assert "request-0" in acked
+    acked.add(["request-2"])
+    assert "request-0" not in acked
+    assert "request-1" in acked and "request-2" in acked
+    assert len(acked) == 2
@@ -0,0 +1,186 @@
+import httpx
+import pytest
+
+from scope3ai.api.types import ImpactRow
+
+
+def test_client_transport_options():
+    from scope3ai.api.client import AsyncClient, Client
+
+    limits = httpx.Limits(max_connections=4, max_keepalive_connections=2)
+    timeout = httpx.Timeout(10.0, connect=1.0)
+    client = Client(api_key="DUMMY", limits=limits, timeout=timeout)
+    pool = client.client._transport._pool
+    assert pool._max_connections == 4
+    assert pool._max_keepalive_connections == 2
+    assert client.client.timeout == timeout
+
+    async_client = AsyncClient(api_key="DUMMY", http2=True)
+    assert async_client.client._transport._pool._http2
+
+
+def test_async_client_per_event_loop():
+    import asyncio
+
+    from scope3ai.api.client import AsyncClient
+
+    client = AsyncClient(api_key="DUMMY")
+
+    async def get_client():
+        assert client.client is client.client
+        return client.client
+
+    first = asyncio.run(get_client())
+    # closed with its loop
+    assert first.is_closed
+    second = asyncio.run(get_client())
+    assert first is not second
+    assert second.is_closed
+    # the pools of the closed loops are dropped
+    assert not any(loop.is_closed() for loop in client._clients)
+
+    async def close():
+        pool = client.client
+        await client.aclose()
+        return pool
+
+    assert asyncio.run(close()).is_closed
+    assert len(client._clients) == 0
+
+
+def test_client_http2_without_h2(monkeypatch):
+    import importlib.util
+
+    from scope3ai.api.client import Client
+
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+    client = Client(api_key="DUMMY", http2=True)
+    assert client.http2 is False
+
+
+def test_init_transport(monkeypatch):
+    from scope3ai import Scope3AI
+    from tests.utils import MockImpactAPI
+
+    monkeypatch.setenv("SCOPE3AI_CONNECT_TIMEOUT", "2.5")
+    api = MockImpactAPI()
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        max_connections=10,
+        transport=httpx.MockTransport(api.handler),
+    )
+    try:
+        client = scope3._sync_client.client
+        assert client.timeout.connect == 2.5
+        assert client.timeout.read == 30.0
+
+        ctx = scope3.submit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.wait_impact(timeout=2) is not None
+        assert len(api.requests) == 1
+    finally:
+        scope3.close()
+
+
+@pytest.mark.asyncio
+async def test_init_transport_async():
+    from scope3ai import Scope3AI
+    from tests.utils import MockImpactAPI
+
+    api = MockImpactAPI()
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        sync_mode=True,
+        transport=httpx.MockTransport(api.handler),
+    )
+    try:
+        ctx = await scope3.asubmit_impact(ImpactRow(model_id="gpt_4o"))
+        assert ctx.impact is not None
+        assert len(api.requests) == 1
+    finally:
+        scope3.close()
+
+
+def test_connection_warmer():
+    import time
+
+    from scope3ai.api.client import Client, ConnectionWarmer
+
+    pings = []
+
+    def handler(request):
+        pings.append(request.url.path)
+        return httpx.Response(200, json={"ready": True})
+
+    def wait_pings(count):
+        deadline = time.monotonic() + 2
+        while len(pings) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(pings)
+
+    client = Client(api_key="DUMMY", transport=httpx.MockTransport(handler))
+    warmer = ConnectionWarmer(client, connections=2, keepalive_expiry=0.1)
+    warmer.start()
+    try:
+        # opened at start
+        assert wait_pings(2) == 2
+        assert set(pings) == {"/status"}
+        # an idle client is not warmed up again
+        time.sleep(0.3)
+        assert len(pings) == 2
+
+        # opened again once expired after a request, only once
+        client.last_used = time.monotonic()
+        assert wait_pings(4) == 4
+        time.sleep(0.3)
+        assert len(pings) == 4
+    finally:
+        warmer.stop()
+
+
+def test_connection_warmer_endpoints():
+    from scope3ai.api.client import Client, ConnectionWarmer
+    from scope3ai.api.endpoints import EndpointPool
+
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        return httpx.Response(200, json={"ready": True})
+
+    client = Client(
+        api_key="DUMMY",
+        transport=httpx.MockTransport(handler),
+        endpoints=EndpointPool(["https://a.example.com", "https://b.example.com"]),
+    )
+    ConnectionWarmer(client, connections=2, keepalive_expiry=5).warm_up()
+    assert sorted(hosts) == ["a.example.com"] * 2 + ["b.example.com"] * 2
+
+
+def test_init_prewarm_connections():
+    import time
+
+    from scope3ai import Scope3AI
+    from tests.utils import MockImpactAPI
+
+    api = MockImpactAPI()
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        return api.handler(request)
+
+    scope3 = Scope3AI.init(
+        api_key="DUMMY",
+        provider_clients=[],
+        prewarm_connections=2,
+        transport=httpx.MockTransport(handler),
+    )
+    try:
+        deadline = time.monotonic() + 2
+        while len(paths) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert paths[:2] == ["/status", "/status"]
+    finally:
+        scope3.close()
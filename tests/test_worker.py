@@ -103,6 +103,33 @@ def test_background_worker_kill_twice():
     worker.kill()
 
 
+def test_background_worker_kill_full_queue():
+    from scope3ai.worker import BackgroundWorker
+    import time
+
+    dropped = []
+    worker = BackgroundWorker(1, on_drop=dropped.append)
+    worker.pause()
+
+    def task1():
+        pass
+
+    def task2():
+        pass
+
+    assert worker.submit(task1) is True
+    # the worker holds the first task until resumed
+    while worker.stats["queued"]:
+        time.sleep(0.01)
+    assert worker.submit(task2) is True
+
+    # the queue is full, the second task makes room for the stop request
+    worker.kill()
+    assert dropped == [task2]
+    assert worker.stats["dropped"] == 1
+    worker.resume()
+
+
 def test_background_worker_flush():
     from scope3ai.worker import BackgroundWorker
     from threading import Event
@@ -122,6 +149,28 @@ def test_background_worker_flush():
     assert event.is_set() is True
 
 
+def test_background_worker_flush_timeout():
+    from scope3ai.worker import BackgroundWorker
+    import time
+
+    worker = BackgroundWorker(10)
+    worker.pause()
+    tasks = [lambda: None for _ in range(3)]
+    for task in tasks:
+        assert worker.submit(task) is True
+
+    # the worker holds the first item until resumed
+    while worker._queue.qsize() > 2:
+        time.sleep(0.01)
+
+    assert worker.flush(timeout=0.1) is False
+    # the items not processed yet can be taken back
+    assert worker.drain() == tasks[1:]
+    worker.resume()
+    assert worker.flush(timeout=1) is True
+    worker.kill()
+
+
 def test_background_worker_pause_resume():
     from scope3ai.worker import BackgroundWorker
     from threading import Event
@@ -144,3 +193,374 @@ def test_background_worker_pause_resume():
     assert event.is_set() is False
     worker.resume()
     assert event.wait(timeout=2) is True
+
+
+def test_batch_worker():
+    from scope3ai.worker import BatchWorker
+    from threading import Event
+
+    batches = []
+    event = Event()
+
+    def callback(batch):
+        batches.append(batch)
+        if sum(len(b) for b in batches) == 5:
+            event.set()
+
+    worker = BatchWorker(-1, callback, batch_size=10)
+    worker.pause()
+    for i in range(5):
+        assert worker.submit(i) is True
+    worker.resume()
+    assert event.wait(timeout=2) is True
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batch_worker_batch_size():
+    from scope3ai.worker import BatchWorker
+
+    batches = []
+    worker = BatchWorker(-1, batches.append, batch_size=2)
+    worker.pause()
+    for i in range(5):
+        worker.submit(i)
+    worker.resume()
+    worker.flush()
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_batch_worker_linger():
+    from scope3ai.worker import BatchWorker
+    import time
+
+    batches = []
+    worker = BatchWorker(-1, batches.append, batch_size=10, linger=0.5)
+    worker.submit(1)
+    time.sleep(0.1)
+    worker.submit(2)
+    worker.flush()
+    assert batches == [[1, 2]]
+
+
+def test_batch_worker_with_exception():
+    from scope3ai.worker import BatchWorker
+    from threading import Event
+
+    event = Event()
+
+    def callback(batch):
+        if batch == [1]:
+            raise Exception("Batch exception")
+        event.set()
+
+    worker = BatchWorker(-1, callback)
+    worker.submit(1)
+    worker.flush()
+    worker.submit(2)
+    assert event.wait(timeout=2) is True
+
+
+def test_async_batch_worker_concurrency():
+    from scope3ai.worker import AsyncBatchWorker
+    import asyncio
+
+    inflight = max_inflight = 0
+    batches = []
+
+    async def callback(batch):
+        nonlocal inflight, max_inflight
+        inflight += 1
+        max_inflight = max(max_inflight, inflight)
+        await asyncio.sleep(0.2)
+        batches.append(batch)
+        inflight -= 1
+
+    worker = AsyncBatchWorker(-1, callback, batch_size=1, concurrency=4)
+    for i in range(8):
+        worker.submit(i)
+    worker.flush()
+    assert sorted(item for batch in batches for item in batch) == list(range(8))
+    assert max_inflight == 4
+
+
+def test_async_batch_worker_kill():
+    from scope3ai.worker import AsyncBatchWorker
+    from threading import Event
+
+    event = Event()
+
+    async def callback(batch):
+        event.set()
+
+    worker = AsyncBatchWorker(-1, callback)
+    worker.submit(1)
+    assert event.wait(timeout=2) is True
+    worker.kill()
+    event.clear()
+    worker.submit(2)
+    assert event.wait(timeout=2) is True
+
+
+def test_background_worker_drop_newest():
+    from scope3ai.worker import BackgroundWorker
+
+    dropped = []
+    worker = BackgroundWorker(1, policy="drop_newest", on_drop=dropped.append)
+    worker.pause()
+    worker._ensure_thread = lambda: None  # keep the items in the queue
+
+    assert worker.submit(1) is True
+    assert worker.submit(2) is False
+    assert dropped == [2]
+    assert worker.stats["dropped"] == 1
+
+
+def test_background_worker_drop_oldest():
+    from scope3ai.worker import BackgroundWorker
+
+    dropped = []
+    worker = BackgroundWorker(2, policy="drop_oldest", on_drop=dropped.append)
+    worker._ensure_thread = lambda: None
+
+    for i in range(4):
+        assert worker.submit(i) is True
+    assert dropped == [0, 1]
+    assert list(worker._queue.queue) == [2, 3]
+    assert worker.stats["dropped"] == 2
+
+
+def test_background_worker_block():
+    from scope3ai.worker import BackgroundWorker
+    import time
+
+    dropped = []
+    worker = BackgroundWorker(1, policy="block", timeout=0.2, on_drop=dropped.append)
+    worker._ensure_thread = lambda: None
+
+    assert worker.submit(1) is True
+    start = time.monotonic()
+    assert worker.submit(2) is False
+    assert time.monotonic() - start >= 0.2
+    assert dropped == [2]
+
+
+def test_background_worker_spill():
+    from scope3ai.worker import BackgroundWorker
+
+    spilled = []
+    worker = BackgroundWorker(1, policy="spill", on_spill=spilled.append)
+    worker._ensure_thread = lambda: None
+
+    assert worker.submit(1) is True
+    assert worker.submit(2) is True
+    assert spilled == [2]
+    assert worker.stats == {"queued": 1, "dropped": 0, "spilled": 1}
+
+
+def test_background_worker_priority():
+    from scope3ai.worker import BackgroundWorker
+
+    dropped = []
+    worker = BackgroundWorker(3, policy="drop_oldest", on_drop=dropped.append)
+    worker._ensure_thread = lambda: None
+
+    for i in range(3):
+        worker.submit(i)
+    assert worker.submit("p1", priority=True) is True
+    assert worker.submit("p2", priority=True) is True
+    # priority items are served first, and never evicted
+    assert worker._queue.get_nowait() == "p1"
+    assert worker.submit(3) is True
+    assert dropped == [0, 1]
+    assert worker._queue.get_nowait() == "p2"
+    assert [worker._queue.get_nowait() for _ in range(2)] == [2, 3]
+
+
+def test_batch_worker_priority_first():
+    from scope3ai.worker import BatchWorker
+
+    batches = []
+    worker = BatchWorker(0, batches.append, batch_size=3)
+    worker.pause()
+    for i in range(5):
+        worker.submit(i)
+    worker.submit("urgent", priority=True)
+    worker.resume()
+    worker.flush()
+    worker.kill()
+    assert batches == [["urgent", 0, 1], [2, 3, 4]]
+
+
+def test_lane_queue_promoted_copies():
+    from scope3ai.worker import FairQueue, LaneQueue
+
+    for q in (LaneQueue(), FairQueue(key=lambda item: item[0])):
+        for item in ("a0", "a1", "b0"):
+            q.put(item)
+        q.put_priority("a1", copy=True)
+        # not in the regular lane, a single copy
+        q.put_priority("c0", copy=True)
+        assert q.qsize() == 5
+        assert q.unique_qsize() == 4
+        # once a copy is taken, the other one left is not counted
+        assert q.get_nowait() == "a1"
+        assert q.unique_qsize() == 3
+        assert q.get_nowait() == "c0"
+        assert sorted(q.get_nowait() for _ in range(3)) == ["a0", "a1", "b0"]
+        assert q.unique_qsize() == 0
+        assert q.copies == {}
+
+    # the items are matched by identity, not equality
+    q = LaneQueue()
+    q.put(["a0"])
+    q.put_priority(["a0"], copy=True)
+    assert q.unique_qsize() == 2
+
+
+def test_background_worker_drop_not_lost():
+    from scope3ai.worker import BackgroundWorker
+
+    dropped = []
+
+    def on_drop(item):
+        dropped.append(item)
+        # the promoted item is still queued in the priority lane
+        return item != 0
+
+    worker = BackgroundWorker(2, policy="drop_oldest", on_drop=on_drop)
+    worker._ensure_thread = lambda: None
+    for i in range(2):
+        worker.submit(i)
+    worker.promote(0)
+    worker.submit(2)
+    assert dropped == [0, 1]
+    # 0 is not counted, it is still queued
+    assert worker.stats == {"queued": 2, "dropped": 1, "spilled": 0}
+
+
+def test_fair_queue_weighted_round_robin():
+    from scope3ai.worker import FairQueue
+
+    weights = {"a": 2, "c": 0.5}
+    q = FairQueue(key=lambda item: item[0], weight=lambda t: weights.get(t, 1))
+    for i in range(6):
+        q.put(f"a{i}")
+    for i in range(3):
+        q.put(f"b{i}")
+        q.put(f"c{i}")
+    order = [q.get_nowait() for _ in range(12)]
+    # "a" gets two items per round, "c" one every other round
+    assert order == [
+        "a0", "a1", "b0", "a2", "a3", "b1", "c0", "a4", "a5", "b2", "c1", "c2"
+    ]  # fmt: skip
+    assert q.qsize() == 0
+
+
+def test_fair_queue_tenant_size():
+    import queue
+
+    import pytest
+
+    from scope3ai.worker import FairQueue
+
+    q = FairQueue(maxsize=10, key=lambda item: item[0], tenant_size=2)
+    q.put_nowait("a0")
+    q.put_nowait("a1")
+    with pytest.raises(queue.Full):
+        q.put_nowait("a2")
+    q.put_nowait("b0")
+    # the tenant at its cap is evicted first
+    assert q.evict_nowait("a2") == "a0"
+    # otherwise the tenant with the most items
+    assert q.evict_nowait("c0") == "a1"
+    assert q.qsize() == 1
+
+
+def test_background_worker_fair_queueing():
+    import time
+
+    from scope3ai.worker import BatchWorker
+
+    batches = []
+    worker = BatchWorker(
+        0, batches.append, batch_size=4, tenant_key=lambda item: item[0]
+    )
+    worker.pause()
+    worker.submit("a0")
+    # wait for the worker to hold the first item
+    while worker._queue.qsize():
+        time.sleep(0.01)
+    for i in range(1, 6):
+        worker.submit(f"a{i}")
+    worker.submit("b0")
+    worker.submit("b1")
+    worker.resume()
+    assert worker.flush() is True
+    worker.kill()
+    # the items of "b" are not queued behind all the items of "a"
+    assert batches[0] == ["a0", "a1", "b0", "a2"]
+    assert sorted(sum(batches, [])) == ["a0", "a1", "a2", "a3", "a4", "a5", "b0", "b1"]
+
+
+def test_background_worker_fair_queueing_drop_oldest():
+    from scope3ai.worker import BackgroundWorker
+
+    dropped = []
+    worker = BackgroundWorker(
+        0,
+        policy="drop_oldest",
+        on_drop=dropped.append,
+        tenant_key=lambda item: item[0],
+        tenant_size=2,
+    )
+    worker._ensure_thread = lambda: None
+    for item in ["a0", "a1", "b0", "a2"]:
+        assert worker.submit(item) is True
+    # only the tenant over its cap loses items
+    assert dropped == ["a0"]
+    assert [worker._queue.get_nowait() for _ in range(3)] == ["a1", "b0", "a2"]
+
+
+def test_event_loop_batcher():
+    import asyncio
+
+    from scope3ai.worker import EventLoopBatcher
+
+    batches = []
+
+    async def callback(batch):
+        batches.append(batch)
+
+    async def main():
+        batcher = EventLoopBatcher(callback, batch_size=2)
+        for i in range(5):
+            batcher.submit(i)
+        assert batcher.pending == 5
+        await batcher.flush()
+        assert batcher.pending == 0
+
+    asyncio.run(main())
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_event_loop_batcher_cancelled():
+    import asyncio
+
+    from scope3ai.worker import EventLoopBatcher
+
+    left = []
+
+    async def callback(batch):
+        await asyncio.sleep(10)
+
+    async def main():
+        batcher = EventLoopBatcher(callback, batch_size=2, on_cancel=left.extend)
+        for i in range(3):
+            batcher.submit(i)
+        await asyncio.sleep(0.01)
+        # submitted while the first batch is in flight
+        batcher.submit(3)
+
+    # asyncio.run cancels the tasks left once main returns
+    asyncio.run(main())
+    assert sorted(left) == [0, 1, 2, 3]
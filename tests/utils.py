@@ -22,3 +22,59 @@ def load_image_b64(path: Path) -> str:
     b64 = file_as_b64str(path)
     media_type = media_types[path.suffix]
     return f"data:{media_type};base64,{b64}"
+
+
+class MockImpactAPI:
+    """
+    In-process stand-in for the impact API, to be used with `httpx.MockTransport`.
+
+    Every row received is answered with the same impact, and every request
+    body is recorded in `requests` for inspection.
+    """
+
+    def __init__(self) -> None:
+        self.requests = []
+        self.headers = []
+
+    def handler(self, request):
+        import json
+
+        import httpx
+
+        if request.url.path != "/v1/impact":
+            return httpx.Response(200, json={"ready": True})
+        content = request.read()
+        if request.headers.get("Content-Encoding") == "gzip":
+            import gzip
+
+            content = gzip.decompress(content)
+        body = json.loads(content)
+        self.requests.append(body)
+        self.headers.append(request.headers)
+        metric = {
+            "usage_energy_wh": 1,
+            "usage_emissions_gco2e": 2,
+            "usage_water_ml": 3,
+            "embodied_emissions_gco2e": 4,
+            "embodied_water_ml": 5,
+        }
+        rows = [{"total_impact": metric} for _ in body["rows"]]
+        return httpx.Response(200, json={"rows": rows, "has_errors": False})
+
+    def install(self, monkeypatch) -> None:
+        """
+        Make every API client created from now on use this mock.
+        """
+        import httpx
+
+        from scope3ai.api.client import AsyncClient, Client
+
+        transport = httpx.MockTransport(lambda request: self.handler(request))
+        monkeypatch.setattr(
+            Client, "create_client", lambda self: httpx.Client(transport=transport)
+        )
+        monkeypatch.setattr(
+            AsyncClient,
+            "create_client",
+            lambda self: httpx.AsyncClient(transport=transport),
+        )